@@ -0,0 +1,161 @@
+"""
+Measures the overhead of the SDK against a local MockUpholdServer, away from network
+noise: throughput, latency percentiles and peak Python memory of the main calls.
+
+    python benchmarks/bench_client.py [--iterations 200] [--latency 0.002] [--threads 8]
+    python benchmarks/bench_client.py --save baseline.json
+    python benchmarks/bench_client.py --compare baseline.json --tolerance 0.2
+
+With --compare, the run fails (exit status 1) when a scenario's throughput dropped or
+its peak memory grew by more than the tolerance, so that regressions are caught before
+a release. Runs are replayable: payloads are synthetic and throttling is seeded.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import argparse
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from uphold.ratelimit import RateLimiter
+from uphold.testing import MockUpholdServer
+
+
+def scenarios(api, threads):
+    def ticker():
+        api.get_ticker()
+
+    def ticker_pair():
+        api.get_ticker('BTCUSD')
+
+    def cards():
+        api.get_cards()
+
+    def ledger_pages():
+        for entry in api.iter_reserve_ledger(page_size=50):
+            pass
+
+    def ledger_stream():
+        for entry in api.get_reserve_ledger(stream=True):
+            pass
+
+    def transaction_cycle():
+        transaction = api.prepare_txn('00000000-0000-4000-8000-000000000000', 'foo@bar.com', Decimal('1.00'), 'USD')
+        api.execute_txn('00000000-0000-4000-8000-000000000000', transaction)
+
+    executor = ThreadPoolExecutor(max_workers=threads)
+
+    def concurrent_cards():
+        for future in [executor.submit(api.get_cards) for i in range(threads)]:
+            future.result()
+
+    return executor, [
+        ('get_ticker', ticker),
+        ('get_ticker_pair', ticker_pair),
+        ('get_cards', cards),
+        ('iter_reserve_ledger', ledger_pages),
+        ('get_reserve_ledger_stream', ledger_stream),
+        ('prepare_execute_txn', transaction_cycle),
+        ('concurrent_get_cards', concurrent_cards),
+    ]
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def measure(fn, iterations, warmup=3):
+    for i in range(warmup):
+        fn()
+    samples = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        t = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - started
+    # Memory is measured on a separate call, tracemalloc slows everything down.
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'ops_per_second': iterations / elapsed,
+        'p50_ms': percentile(samples, 0.50) * 1000,
+        'p95_ms': percentile(samples, 0.95) * 1000,
+        'p99_ms': percentile(samples, 0.99) * 1000,
+        'peak_memory_kb': peak / 1024.0,
+    }
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if result['ops_per_second'] < before['ops_per_second'] * (1 - tolerance):
+            regressions.append('{}: {:.1f} ops/s, was {:.1f}'.format(name, result['ops_per_second'], before['ops_per_second']))
+        if result['peak_memory_kb'] > before['peak_memory_kb'] * (1 + tolerance) + 64:
+            regressions.append('{}: peak {:.0f} KB, was {:.0f}'.format(name, result['peak_memory_kb'], before['peak_memory_kb']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added by the server to every response')
+    parser.add_argument('--throttle-every', type=int, default=0, help='answer every Nth request with a 429')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--ledger', type=int, default=2000, help='entries in the reserve ledger')
+    parser.add_argument('--only', help='run the scenarios whose name contains this')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='fail on regressions against this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    # A generous rate limit, so that pacing doesn't hide the cost of the SDK; the limiter
+    # is only there to retry the injected 429s.
+    with MockUpholdServer(ledger=args.ledger, latency=args.latency, throttle_every=args.throttle_every,
+                          rate_limit=10 ** 9) as server:
+        api = server.client(pool_maxsize=args.threads, rate_limiter=RateLimiter(backoff=0.001))
+        executor, cases = scenarios(api, args.threads)
+        results = {}
+        print('{:<28} {:>10} {:>9} {:>9} {:>9} {:>12}'.format('scenario', 'ops/s', 'p50 ms', 'p95 ms', 'p99 ms', 'peak KB'))
+        try:
+            for name, fn in cases:
+                if args.only and args.only not in name:
+                    continue
+                iterations = max(1, args.iterations // 20) if 'ledger' in name else args.iterations
+                result = results[name] = measure(fn, iterations)
+                print('{:<28} {:>10.1f} {:>9.2f} {:>9.2f} {:>9.2f} {:>12.0f}'.format(
+                    name, result['ops_per_second'], result['p50_ms'], result['p95_ms'], result['p99_ms'],
+                    result['peak_memory_kb']))
+        finally:
+            executor.shutdown()
+        print('requests served: {}, throttled: {}, connections opened: {}'.format(
+            sum(server.requests.values()), server.throttled, api.transport.stats.new_connections))
+
+    if args.save:
+        with io.open(args.save, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(results, indent=2, sort_keys=True))
+    if args.compare:
+        with io.open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
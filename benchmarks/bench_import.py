@@ -0,0 +1,74 @@
+"""
+Measures how long importing the SDK takes in a fresh interpreter, with
+python -X importtime, for the ways a short-lived process typically starts.
+
+    python benchmarks/bench_import.py [--runs 10] [--top 5]
+
+Times are the median over the runs of the imports done by the statement, leaving out
+those of the interpreter start-up itself.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+SCENARIOS = [
+    ('import uphold', 'import uphold'),
+    ('Uphold()', 'from uphold import Uphold\nUphold()'),
+    ('Uphold(UrllibTransport)', 'from uphold import Uphold\nfrom uphold.transport import UrllibTransport\n'
+                                'Uphold(transport=UrllibTransport())'),
+    ('AsyncUphold', 'from uphold import AsyncUphold'),
+]
+
+
+def import_times(statement):
+    """
+    :rtype:
+      A hash of the cumulative import time in microseconds of every module imported
+      directly by the statement.
+    """
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], cwd=ROOT,
+                             capture_output=True, text=True, check=True)
+    modules = {}
+    started = False
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_time, cumulative, name = line[len('import time:'):].split('|')
+        if name.strip() == 'site' and not name.startswith('  '):
+            # Everything before is the interpreter start-up.
+            started = True
+            continue
+        # Top level imports only: nested ones are included in their cumulative time.
+        if started and not name.startswith('  '):
+            modules[name.strip()] = int(cumulative)
+    return modules
+
+
+def median(values):
+    ordered = sorted(values)
+    return ordered[len(ordered) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=5, help='list the slowest modules of each scenario')
+    args = parser.parse_args()
+
+    for name, statement in SCENARIOS:
+        runs = [import_times(statement) for i in range(args.runs)]
+        total = median([sum(run.values()) for run in runs])
+        print('{:<28} {:>8.1f} ms'.format(name, total / 1000.0))
+        slowest = sorted(runs[-1].items(), key=lambda item: -item[1])[:args.top]
+        for module, cumulative in slowest:
+            print('    {:<24} {:>8.1f} ms'.format(module, cumulative / 1000.0))
+
+
+if __name__ == '__main__':
+    main()
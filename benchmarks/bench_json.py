@@ -0,0 +1,50 @@
+"""
+Compares the JSON backends of uphold.jsonlib on synthetic Uphold payloads, against
+the former json.loads(response.text), in microseconds per decoded body.
+
+    python benchmarks/bench_json.py [--repeat 200] [--size 1000]
+"""
+
+from __future__ import print_function, unicode_literals
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from uphold.jsonlib import BACKENDS, PREFERENCE
+from uphold.testing import synthetic_cards, synthetic_ledger, synthetic_ticker, synthetic_transactions
+
+
+def payloads(size):
+    return [
+        ('ticker', synthetic_ticker()),
+        ('cards', synthetic_cards(max(1, size // 20))),
+        ('transactions', synthetic_transactions(size)),
+        ('ledger', synthetic_ledger(size)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--size', type=int, default=1000, help='entries in the list payloads')
+    args = parser.parse_args()
+
+    decoders = [('text+json', lambda body: json.loads(body.decode('utf-8')))]
+    decoders += [(name, BACKENDS[name].loads) for name in PREFERENCE + ('decimal',) if name in BACKENDS]
+    print('{:<14} {:>10}'.format('payload', 'KB') + ''.join('{:>14}'.format(name) for name, decode in decoders))
+    for name, payload in payloads(args.size):
+        body = json.dumps(payload).encode('utf-8')
+        row = '{:<14} {:>10.1f}'.format(name, len(body) / 1024.0)
+        for decoder, decode in decoders:
+            seconds = min(timeit.repeat(lambda: decode(body), number=args.repeat, repeat=3)) / args.repeat
+            row += '{:>14.1f}'.format(seconds * 1e6)
+        print(row)
+
+
+if __name__ == '__main__':
+    main()
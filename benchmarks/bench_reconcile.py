@@ -0,0 +1,65 @@
+"""
+Measures the throughput of Reconciler, in accounts per second, against a local
+MockUpholdServer running in its own process, for several numbers of worker processes.
+
+    python benchmarks/bench_reconcile.py [--accounts 500] [--processes 0,1,2,4] [--threads 8]
+
+The mock server answers from a single core, so beyond a few worker processes it is the
+bottleneck; --latency stands in for the network round trips a real run waits on.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from uphold.reconcile import Reconciler
+from uphold.testing import MockUpholdServer
+
+
+def serve(address, ready, stop, options):
+    with MockUpholdServer(rate_limit=10 ** 9, **options) as server:
+        address.value = server.url.encode('ascii')
+        ready.set()
+        stop.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--accounts', type=int, default=500)
+    parser.add_argument('--processes', default='0,1,2,4', help='comma separated worker process counts')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--cards', type=int, default=10, help='cards per account')
+    parser.add_argument('--transactions', type=int, default=200, help='transactions per account')
+    parser.add_argument('--latency', type=float, default=0.005, help='seconds added by the server to every response')
+    args = parser.parse_args()
+
+    address = multiprocessing.Array('c', 64)
+    ready = multiprocessing.Event()
+    stop = multiprocessing.Event()
+    options = {'cards': args.cards, 'transactions': args.transactions, 'latency': args.latency}
+    server = multiprocessing.Process(target=serve, args=(address, ready, stop, options))
+    server.start()
+    try:
+        ready.wait()
+        base_url = address.value.decode('ascii')
+        pats = ['bench-{}'.format(i) for i in range(args.accounts)]
+        print('{:>10} {:>10} {:>12} {:>8}'.format('processes', 'seconds', 'accounts/s', 'errors'))
+        for processes in [int(p) for p in args.processes.split(',')]:
+            reconciler = Reconciler(processes=processes, threads=args.threads, client_options={'base_url': base_url})
+            started = time.perf_counter()
+            errors = sum(1 for result in reconciler.run(pats) if result.error)
+            elapsed = time.perf_counter() - started
+            print('{:>10} {:>10.2f} {:>12.1f} {:>8}'.format(processes, elapsed, args.accounts / elapsed, errors))
+    finally:
+        stop.set()
+        server.join()
+
+
+if __name__ == '__main__':
+    main()
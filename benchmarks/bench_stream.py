@@ -0,0 +1,112 @@
+"""
+Compares peak memory and time of decoding a large ledger body in one go
+(json.loads(response.text), as Uphold._get does) against the incremental decoder
+used by the stream=True list endpoints.
+
+    python benchmarks/bench_stream.py [--entries 200000]
+
+Each mode runs in a fresh interpreter so the reported peak RSS is its own.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from uphold.stream import iter_json_array
+
+CHUNK_SIZE = 65536
+
+
+def ledger_entry(i):
+    return {
+        'type': 'liability',
+        'createdAt': '2015-01-01T00:00:00.000Z',
+        'TransactionId': '7c377eba-cb1e-45a2-8c13-{:012d}'.format(i),
+        'in': {'amount': '{}.25'.format(i % 1000), 'currency': 'USD'},
+        'out': None,
+    }
+
+
+def write_body(path, entries):
+    with open(path, 'w') as f:
+        f.write('[')
+        for i in range(entries):
+            if i:
+                f.write(',')
+            json.dump(ledger_entry(i), f)
+        f.write(']')
+
+
+def consume_loads(path):
+    # Mirrors the current path: raw bytes, then the decoded str, then the parsed tree.
+    with open(path, 'rb') as f:
+        content = f.read()
+    text = content.decode('utf-8')
+    count = 0
+    for entry in json.loads(text):
+        count += 1
+    return count
+
+
+def consume_stream(path):
+    with open(path, 'rb') as f:
+        chunks = iter(lambda: f.read(CHUNK_SIZE), b'')
+        count = 0
+        for entry in iter_json_array(chunks):
+            count += 1
+    return count
+
+
+def peak_rss_kb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def run_mode(mode, path):
+    consume = {'loads': consume_loads, 'stream': consume_stream}[mode]
+    baseline = peak_rss_kb()
+    start = time.perf_counter()
+    count = consume(path)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({'mode': mode, 'entries': count, 'seconds': elapsed,
+                      'peak_rss_kb': peak_rss_kb(), 'rss_growth_kb': peak_rss_kb() - baseline}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--entries', type=int, default=200000)
+    parser.add_argument('--mode', choices=['loads', 'stream'])
+    parser.add_argument('--body')
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.body)
+        return
+
+    fd, path = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    try:
+        write_body(path, args.entries)
+        print('body: {} entries, {:.1f} MB'.format(args.entries, os.path.getsize(path) / 1e6))
+        print('{:<8} {:>10} {:>16} {:>16}'.format('mode', 'seconds', 'peak RSS (MB)', 'RSS growth (MB)'))
+        for mode in ('loads', 'stream'):
+            output = subprocess.check_output([sys.executable, __file__, '--mode', mode, '--body', path])
+            result = json.loads(output.decode('utf-8'))
+            print('{:<8} {:>10.3f} {:>16.1f} {:>16.1f}'.format(
+                mode, result['seconds'], result['peak_rss_kb'] / 1024.0, result['rss_growth_kb'] / 1024.0))
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
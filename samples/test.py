@@ -50,7 +50,7 @@ pats = api.get_pats()
 print(pats)
 
 print("\nGetting ledger (first 20 entries)...")
-entries = api.get_reserve_ledger()
+entries = api.iter_reserve_ledger(page_size=20)
 i = 0
 for entry in entries:
     i += 1
@@ -62,7 +62,7 @@ for entry in entries:
         print(str(i) + ". " + entry['type'] + ": -" + entry["in"]["amount"] + " " + entry["in"]["currency"])
 
 print("\nGetting transactions (first 20 entries)...")
-entries = api.get_reserve_chain()
+entries = api.iter_reserve_chain(page_size=20)
 i = 0
 for entry in entries:
     i += 1
@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from distutils.core import setup
+from setuptools import setup
 setup(
   name = 'uphold',
   packages = ['uphold'],
@@ -10,5 +10,23 @@ setup(
   url = 'https://github.com/byrnereese/uphold-python-sdk',
   download_url = 'https://github.com/byrnereese/uphold-python-sdk/tarball/0.1',
   keywords = ['uphold', 'bitreserve', 'currency', 'trading', 'api'],
-  classifiers = [],
+  install_requires = ['requests'],
+  extras_require = {
+    'async': ['aiohttp'],
+    'columnar': ['numpy', 'pyarrow'],
+    'fast': ['orjson'],
+  },
+  entry_points = {
+    'console_scripts': ['uphold = uphold.cli:main'],
+  },
+  python_requires = '>=3.7',
+  classifiers = [
+    'Programming Language :: Python :: 3',
+    'Programming Language :: Python :: 3 :: Only',
+    'Programming Language :: Python :: 3.7',
+    'Programming Language :: Python :: 3.8',
+    'Programming Language :: Python :: 3.9',
+    'Programming Language :: Python :: 3.10',
+    'Programming Language :: Python :: 3.11',
+  ],
 )
@@ -1,2 +1,32 @@
-from .uphold import Uphold
+import importlib
+
 from .version import __version__
+
+# What "from uphold import *" has always bound: the client and its module, for
+# uphold.VerificationRequired and the other exceptions. AsyncUphold is left out, so
+# that a star import doesn't load aiohttp.
+__all__ = ['Uphold', 'uphold', 'version', '__version__']
+
+
+def __getattr__(name):
+    # The clients are imported when first used, so that importing the package (and with
+    # it requests or aiohttp) costs nothing until then.
+    if name == 'Uphold':
+        from .uphold import Uphold as value
+    elif name == 'AsyncUphold':
+        from .aio import AsyncUphold as value
+    else:
+        # Submodules too, as uphold.uphold.RateLimitError worked when the package
+        # imported the client up front.
+        try:
+            value = importlib.import_module('.' + name, __name__)
+        except ModuleNotFoundError as e:
+            if e.name != __name__ + '.' + name:
+                raise
+            raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__) | {'AsyncUphold'})
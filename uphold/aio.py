@@ -0,0 +1,651 @@
+"""
+Uphold Python SDK - asyncio client
+
+AsyncUphold exposes the same methods as Uphold, but every API call is a coroutine
+and all of them share one pooled aiohttp connector.
+
+    api = AsyncUphold(limit=50)
+    api.auth_pat(pat)
+    cards = await api.get_cards()
+    await api.close()
+
+Requires the optional aiohttp dependency (pip install uphold[async]).
+"""
+
+from __future__ import print_function, unicode_literals
+
+import asyncio
+import base64
+import collections
+import time
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from .deadline import check, deadline as deadline_scope, time_left
+from .stream import JSONArrayParser
+from .transport import DEFAULT_TIMEOUT, record_connection_timing, start_connection_timings, stop_connection_timings
+from .uphold import Uphold, DeadlineExceeded, NotSupportedInProduction
+
+
+class AsyncUphold(Uphold):
+    """
+    An asyncio flavour of the Uphold client. Every public method of Uphold returns an
+    awaitable here. Requests share a single aiohttp.ClientSession, so call close() (or
+    use the client as an async context manager) when you are done with it.
+    """
+
+    def __init__(self, sandbox=False, limit=100, limit_per_host=0, max_concurrency=None, ticker_cache=None,
+                 rate_limiter=None, session=None, timeout=DEFAULT_TIMEOUT, instrumentation=None, base_url=None,
+                 http_cache=None, json_backend=None, transaction_cache=None, hedge=None, reserve_mirror=None):
+        """
+        :param Boolean sandbox Talk to the Uphold sandbox rather than production.
+
+        :param Integer limit Maximum number of pooled connections (0 means no limit).
+
+        :param Integer limit_per_host Maximum number of pooled connections per host
+          (0 means no limit).
+
+        :param Integer max_concurrency Maximum number of requests in flight at once.
+          Defaults to no limit beyond the size of the connection pool.
+
+        :param TickerCache ticker_cache (optional) Serve get_ticker() from this cache.
+
+        :param RateLimiter/Boolean rate_limiter (optional) Pace requests to stay within the
+          API's rate limit, see Uphold.
+
+        :param aiohttp.ClientSession session (optional) A session shared with other clients.
+          The limit options are then those of the session's connector, and close() leaves
+          it open.
+
+        :param Float/Tuple timeout Connect and read timeouts in seconds, as a number or a
+          (connect, read) tuple. None waits forever.
+
+        :param Instrumentation instrumentation (optional) Report every request to these
+          hooks, see uphold.instrumentation.
+
+        :param String base_url (optional) Send requests to this server instead.
+
+        :param HTTPCache http_cache (optional) Revalidate GET responses instead of
+          downloading them again, see Uphold.
+
+        :param String/JSONBackend json_backend (optional) Decode responses with this
+          library, see Uphold.
+
+        :param TransactionCache transaction_cache (optional) Answer get_reserve_transaction()
+          from this cache of completed transactions, see Uphold.
+
+        :param HedgePolicy hedge (optional) Send a second copy of GET requests that are
+          slower than usual, see Uphold. The losing copy is cancelled.
+
+        :param ReserveMirror reserve_mirror (optional) Answer get_reserve_transaction() from
+          this local copy of the Reservechain when it holds the transaction in a final
+          status.
+        """
+        if aiohttp is None:
+            raise ImportError('AsyncUphold requires aiohttp: pip install uphold[async]')
+        super(AsyncUphold, self).__init__(sandbox, ticker_cache=ticker_cache, rate_limiter=rate_limiter,
+                                          instrumentation=instrumentation, base_url=base_url,
+                                          http_cache=http_cache, json_backend=json_backend,
+                                          transaction_cache=transaction_cache, hedge=hedge,
+                                          reserve_mirror=reserve_mirror)
+        self.session = session
+        self._owns_session = session is None
+        self.timeout = timeout
+        self.limit_connections = limit
+        self.limit_per_host = limit_per_host
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+        self._parent = None
+        # The GET requests in flight, by credentials and path, see Uphold._get_coalesced.
+        self._in_flight = {}
+
+    def _create_transport(self, **options):
+        # Connections are pooled by the aiohttp session instead.
+        return None
+
+    def _client_timeout(self):
+        if self.timeout is None:
+            return aiohttp.ClientTimeout(total=None)
+        if isinstance(self.timeout, tuple):
+            connect, read = self.timeout
+        else:
+            connect = read = self.timeout
+        return aiohttp.ClientTimeout(total=None, sock_connect=connect, sock_read=read)
+
+    def with_pat(self, pat):
+        """
+        Returns a client authenticating with the given PAT that shares this client's
+        session, connection pool and concurrency limit, see Uphold.with_pat.
+        """
+        client = super(AsyncUphold, self).with_pat(pat)
+        client._parent = self._parent or self
+        client._owns_session = False
+        return client
+
+    def _get_session(self):
+        if self._parent is not None:
+            session = self._parent._get_session()
+            self._semaphore = self._parent._semaphore
+            return session
+        # The session has to be created from within the running event loop.
+        if self.session is None or (self._owns_session and self.session.closed):
+            connector = aiohttp.TCPConnector(limit=self.limit_connections, limit_per_host=self.limit_per_host)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self._client_timeout(),
+                                                 trace_configs=[_connection_trace_config()])
+            self._owns_session = True
+        if self.max_concurrency and self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self.session
+
+    async def close(self):
+        """
+        Closes the pooled connections held by this client, unless its session was
+        handed in by the caller.
+        """
+        if self._owns_session:
+            if self.session is not None and not self.session.closed:
+                await self.session.close()
+            self.session = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def create_pat(self, desc):
+        """
+        Creates a personal access token.
+
+        :param String desc A description for the token
+
+        :rtype:
+          A string representing the Personal Access Token
+        """
+        params = {
+            'description': desc
+        }
+        data = await self._post('/me/tokens', params, headers={'Content-Type': 'application/json'})
+        return data.get('accessToken')
+
+    async def prepare_txn(self, card, to, amount, denom):
+        """
+        Prepares a transaction, see Uphold.prepare_txn.
+
+        :rtype:
+          The id of the prepared transaction.
+        """
+        fields = {
+            'denomination[currency]': denom,
+            'denomination[amount]': str(amount),
+            'destination': to
+        }
+        data = await self._post('/me/cards/' + card + '/transactions', fields)
+        return data['id']
+
+    async def get_reserve_transaction(self, transaction):
+        """
+        Returns a public transaction from the Reservechain, see Uphold.get_reserve_transaction.
+        """
+        data = self._stored_reserve_transaction(transaction)
+        if data is not None:
+            return data
+        return await self._request_reserve_transaction(transaction)
+
+    async def get_reserve_transactions_many(self, transactions, max_workers=8):
+        """
+        Returns several transactions from the Reservechain, see
+        Uphold.get_reserve_transactions_many.
+        """
+        return await self._get_many(self._request_reserve_transaction, transactions, max_workers,
+                                    self._stored_reserve_transaction)
+
+    async def get_cards_many(self, cards, max_workers=8):
+        """
+        Returns several cards of the current user, see Uphold.get_cards_many.
+        """
+        return await self._get_many(self.get_card, cards, max_workers)
+
+    async def get_contacts_many(self, contacts, max_workers=8):
+        """
+        Returns several contacts, see Uphold.get_contacts_many.
+        """
+        return await self._get_many(self.get_contact, contacts, max_workers)
+
+    async def get_ticker(self, t=''):
+        """
+        Returns current market rates, see Uphold.get_ticker.
+        """
+        if self.ticker_cache is not None:
+            return await self.ticker_cache.aget(t, self._get_ticker)
+        return await self._get_ticker(t)
+
+    async def get_portfolio_snapshot(self, max_workers=8, deadline=None, details=True):
+        """
+        Fetches all of the current user's cards and then, concurrently, the details and
+        transactions of each card, see Uphold.get_portfolio_snapshot.
+        """
+        with deadline_scope(deadline):
+            cards = await self.get_cards()
+            limit = asyncio.Semaphore(self._fan_out(max_workers))
+
+            async def bounded(call):
+                async with limit:
+                    return await call
+
+            # The tasks inherit the budget, see uphold.deadline.
+            calls = {}
+            for card in cards:
+                if details:
+                    calls[asyncio.ensure_future(bounded(self.get_card(card['id'])))] = (card['id'], 'card')
+                calls[asyncio.ensure_future(bounded(self.get_card_transactions(card['id'])))] = \
+                    (card['id'], 'transactions')
+            done = set()
+            if calls:
+                left = time_left()
+                done, pending = await asyncio.wait(calls, timeout=None if left is None else max(0, left))
+
+        results = {}
+        for task, call in calls.items():
+            if task in done:
+                error = task.exception()
+                results[call] = (None if error else task.result(), error)
+            else:
+                # Cancelling the task releases its connection right away.
+                task.cancel()
+                results[call] = (None, DeadlineExceeded(call[1]))
+        return self._assemble_snapshot(cards, results)
+
+    async def get_vouchers(self):
+        """
+        Returns a list of all vouchers in one's account, see Uphold.get_vouchers.
+        """
+        if not self.in_sandbox:
+            raise NotSupportedInProduction()
+        return await self._get('/vouchers')
+
+    async def get_voucher(self, id):
+        """
+        Returns a single voucher, see Uphold.get_voucher.
+        """
+        if not self.in_sandbox:
+            raise NotSupportedInProduction()
+        return await self._get('/vouchers/' + id)
+
+    async def redeem_voucher(self, id):
+        """
+        Redeems a voucher, see Uphold.redeem_voucher.
+        """
+        if not self.in_sandbox:
+            raise NotSupportedInProduction()
+        return await self._get('/vouchers/' + id + '/redeem')
+
+    async def revert_voucher(self, id):
+        """
+        Reverts a redeemed voucher, see Uphold.revert_voucher.
+        """
+        if not self.in_sandbox:
+            raise NotSupportedInProduction()
+        return await self._get('/vouchers/' + id + '/revert')
+
+    """
+    HELPER FUNCTIONS
+    """
+    def _basic_auth(self, username, password):
+        credentials = (username + ':' + password).encode('utf-8')
+        return 'Basic ' + base64.b64encode(credentials).decode('ascii')
+
+    def _form_fields(self, params):
+        # aiohttp does not expand list values the way requests does.
+        if params is None:
+            return None
+        fields = []
+        for key, value in params.items():
+            if isinstance(value, (list, tuple)):
+                fields.extend((key, v) for v in value)
+            else:
+                fields.append((key, value))
+        return fields
+
+    async def _get_page(self, uri, start, end):
+        """
+        Requests the items start..end (inclusive) of a list endpoint, see Uphold._get_page.
+        """
+        status, headers, body = await self._send('GET', uri, headers={'Range': 'items={}-{}'.format(start, end)})
+        if status == 416:
+            return [], None
+        data = self._page_items(uri, status, body)
+        return data, self._parse_content_range(headers.get('Content-Range'))
+
+    async def _iter_pages(self, uri, page_size=50, prefetch=False, start=0):
+        """
+        Walks a list endpoint page by page, see Uphold._iter_pages. This is an
+        asynchronous generator; use it with "async for".
+        """
+        ahead = int(prefetch)
+        # (first item, task) of the pages requested ahead, in order.
+        pending = collections.deque()
+        try:
+            page = await self._get_page(uri, start, start + page_size - 1)
+            while True:
+                start, page_size = self._next_page(page, page_size)
+                if start is not None and ahead:
+                    if pending and pending[0][0] != start:
+                        # Requested before the server turned out to return shorter pages.
+                        for first, task in pending:
+                            task.cancel()
+                        pending.clear()
+                    requested = pending[-1][0] + page_size if pending else start
+                    total = page[1][2]
+                    while len(pending) < ahead and (total is None or requested < total):
+                        pending.append((requested, asyncio.ensure_future(
+                            self._get_page(uri, requested, requested + page_size - 1))))
+                        requested += page_size
+                for item in page[0]:
+                    yield item
+                if start is None:
+                    return
+                if pending:
+                    page = await pending.popleft()[1]
+                else:
+                    page = await self._get_page(uri, start, start + page_size - 1)
+        finally:
+            for first, task in pending:
+                task.cancel()
+
+    def _request_headers(self, headers=None):
+        request_headers = super(AsyncUphold, self)._request_headers(headers)
+        auth = self._auth()
+        if auth is not None:
+            request_headers['Authorization'] = self._basic_auth(*auth)
+        return request_headers
+
+    async def _get_stream(self, uri, chunk_size=65536):
+        """
+        Requests a list endpoint and yields its elements as they are decoded, see
+        Uphold._get_stream. This is an asynchronous generator.
+        """
+        url = self.base_url + self._build_url(uri)
+        headers = self._request_headers()
+        session = self._get_session()
+        limiter = self._get_rate_limiter()
+        if limiter is not None:
+            await self._acquire(limiter)
+        if self._semaphore is not None:
+            await self._semaphore.acquire()
+        try:
+            response = await self._open_stream(session, uri, url, headers)
+            try:
+                self._update_rate_limit( response.headers )
+                if limiter is not None:
+                    limiter.update(response.headers)
+                self._check_response( response.status, response.headers )
+                parser = JSONArrayParser()
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    for item in parser.feed(chunk):
+                        yield item
+                for item in parser.close():
+                    yield item
+            finally:
+                response.release()
+        finally:
+            if self._semaphore is not None:
+                self._semaphore.release()
+
+    async def _open_stream(self, session, uri, url, headers):
+        # Instrumented requests are reported once the response headers have arrived.
+        instrumentation = self.instrumentation
+        if instrumentation is None:
+            return await session.get(url, headers=headers)
+        info = instrumentation.request_started('GET', uri, url)
+        timings, token = start_connection_timings()
+        try:
+            response = await session.get(url, headers=headers)
+        except Exception as e:
+            stop_connection_timings(token)
+            instrumentation.request_finished(info, error=e, timings=timings)
+            raise
+        stop_connection_timings(token)
+        instrumentation.request_finished(info, status=response.status, headers=response.headers,
+                                         bytes=response.content_length, timings=timings)
+        return response
+
+    async def _get_coalesced(self, uri):
+        """
+        A GET request shared with the identical ones in flight from other tasks. Callers
+        cancelled while waiting leave the request running for the others.
+        """
+        key = (self.base_url, self.pat, self.username, self.password, uri)
+        task = self._in_flight.get(key)
+        if task is None:
+            task = self._in_flight[key] = asyncio.ensure_future(self._get(uri))
+            task.add_done_callback(lambda done: self._in_flight.pop(key, None) if self._in_flight.get(key) is done
+                                   else None)
+        else:
+            self.single_flight.coalesced += 1
+        return await asyncio.shield(task)
+
+    async def _request_reserve_transaction(self, transaction):
+        data = await self._get_coalesced('/reserve/transactions/{}'.format(transaction))
+        self._store_reserve_transaction(transaction, data)
+        return data
+
+    async def _get_many(self, get, ids, max_workers, stored=None):
+        results = dict((id, None) for id in ids)
+        missing = []
+        for id in results:
+            data = stored(id) if stored is not None else None
+            if data is None:
+                missing.append(id)
+            else:
+                results[id] = data
+        limit = asyncio.Semaphore(self._fan_out(max_workers))
+
+        async def bounded(id):
+            async with limit:
+                return await get(id)
+
+        for id, data in zip(missing, await asyncio.gather(*[bounded(id) for id in missing])):
+            results[id] = data
+        return results
+
+    async def _request(self, method, uri, params=None, headers=None):
+        """
+        Issues an authenticated request against the API and returns the decoded body.
+        """
+        if self.http_cache is not None:
+            return await self._cached_request(method, uri, params, headers)
+        status, response_headers, body = await self._send(method, uri, params, headers)
+        return self.json_backend.loads(body)
+
+    async def _cached_request(self, method, uri, params=None, headers=None):
+        """
+        Issues a request through the HTTP cache, see Uphold._cached_request. The cache
+        stores are synchronous: prefer MemoryStore in front of slow ones.
+        """
+        cache = self.http_cache
+        scope = self._cache_scope()
+        if cache.is_write(method, uri):
+            try:
+                status, response_headers, body = await self._send(method, uri, params, headers)
+            finally:
+                cache.invalidate(scope, uri)
+            return self.json_backend.loads(body)
+        entry = cache.lookup(scope, uri)
+        if entry is not None:
+            headers = dict(headers or {}, **entry.validators())
+        status, response_headers, body = await self._send(method, uri, params, headers)
+        if status == 304 and entry is not None:
+            return cache.revalidated(entry, self.json_backend.loads)
+        return cache.save(scope, uri, status, response_headers, body, self.json_backend.loads)
+
+    async def _send(self, method, uri, params=None, headers=None):
+        """
+        Issues an authenticated request against the API. GETs are hedged when the client
+        has a hedge policy.
+
+        :rtype:
+          A tuple of the response status, headers and body.
+        """
+        if self.hedge is not None and method == 'GET':
+            return await self._send_hedged(uri, headers)
+        return await self._send_once(method, uri, params, headers)
+
+    async def _send_hedged(self, uri, headers=None):
+        """
+        Sends a GET, and a second copy of it when the first is slower than the hedge
+        policy allows, see Uphold._send_hedged. Cancelling the losing copy closes its
+        connection.
+        """
+        from .instrumentation import endpoint_template
+        policy = self.hedge
+        endpoint = endpoint_template(uri)
+        delay = policy.delay(endpoint)
+        left = check(uri)
+        if delay is None or (left is not None and delay >= left):
+            return await self._send_timed(policy, endpoint, uri, headers)
+
+        calls = [asyncio.ensure_future(self._send_timed(policy, endpoint, uri, headers))]
+        try:
+            done, pending = await asyncio.wait(calls, timeout=delay)
+            if not done and policy.allow(self.remaining):
+                calls.append(asyncio.ensure_future(self._send_timed(policy, endpoint, uri, headers)))
+            pending, error = set(calls), None
+            while pending:
+                left = time_left()
+                done, pending = await asyncio.wait(pending, timeout=None if left is None else max(0, left),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise DeadlineExceeded(uri)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not calls[0]:
+                            policy.won()
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in calls:
+                task.cancel()
+
+    async def _send_timed(self, policy, endpoint, uri, headers):
+        started = time.perf_counter()
+        response = await self._send_once('GET', uri, headers=headers)
+        policy.record(endpoint, time.perf_counter() - started)
+        return response
+
+    async def _send_once(self, method, uri, params=None, headers=None):
+        """
+        Sends a request, retrying it when it is rate limited, within the time left by
+        the current deadline, if any.
+        """
+        url = self.base_url + self._build_url(uri)
+        request_headers = self._request_headers(headers)
+
+        session = self._get_session()
+        limiter = self._get_rate_limiter()
+        attempt = 0
+
+        while True:
+            if limiter is not None:
+                await self._acquire(limiter)
+            left = check(uri)
+            transmit = self._transmit(session, method, uri, url, attempt, params, request_headers)
+            if self._semaphore is not None:
+                transmit = self._bounded(transmit)
+            if left is not None:
+                # Cancelled when the budget ends, which closes the connection.
+                transmit = asyncio.wait_for(transmit, left)
+            try:
+                status, response_headers, body = await transmit
+            except aiohttp.ClientSSLError as e:
+                # Handle incorrect certificate error.
+                self._debug("Failed certificate check: " + str(e))
+                exit()
+            except asyncio.TimeoutError:
+                if left is not None and time_left() < 0.01:
+                    raise DeadlineExceeded(uri)
+                raise
+
+            self._update_rate_limit( response_headers )
+            if limiter is not None:
+                limiter.update(response_headers)
+                delay = None
+                if status == 429 and attempt < limiter.max_retries:
+                    delay = limiter.retry_delay(attempt, response_headers)
+                    left = time_left()
+                    if left is not None and delay >= left:
+                        # No time left to retry: the caller gets the RateLimitError.
+                        delay = None
+                if delay is not None:
+                    self._debug("Rate limited, retrying in {:.1f}s".format(delay))
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+
+            self._check_response( status, response_headers )
+            return status, response_headers, body
+
+    async def _bounded(self, transmit):
+        async with self._semaphore:
+            return await transmit
+
+    async def _acquire(self, limiter):
+        while True:
+            delay = limiter.reserve()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+    async def _transmit(self, session, method, uri, url, attempt, params, headers):
+        """
+        Sends one HTTP request, reporting it to the instrumentation hooks if any.
+        """
+        instrumentation = self.instrumentation
+        if instrumentation is None:
+            return await self._fetch(session, method, url, params, headers)
+        info = instrumentation.request_started(method, uri, url, attempt)
+        timings, token = start_connection_timings()
+        try:
+            status, response_headers, body = await self._fetch(session, method, url, params, headers)
+        except Exception as e:
+            stop_connection_timings(token)
+            instrumentation.request_finished(info, error=e, timings=timings)
+            raise
+        stop_connection_timings(token)
+        instrumentation.request_finished(info, status=status, headers=response_headers,
+                                         bytes=len(body), timings=timings)
+        return status, response_headers, body
+
+    async def _fetch(self, session, method, url, params, headers):
+        data = self._form_fields(params)
+        async with session.request(method, url, data=data, headers=headers) as response:
+            return response.status, response.headers, await response.read()
+
+
+def _connection_trace_config():
+    # aiohttp reports DNS lookups and new connections; connect covers TCP and TLS.
+    async def dns_start(session, context, params):
+        context.dns_started = time.perf_counter()
+
+    async def dns_end(session, context, params):
+        context.dns = time.perf_counter() - context.dns_started
+        record_connection_timing('dns', context.dns)
+
+    async def connection_start(session, context, params):
+        context.dns = 0.0
+        context.connection_started = time.perf_counter()
+
+    async def connection_end(session, context, params):
+        record_connection_timing('connect', time.perf_counter() - context.connection_started - context.dns)
+
+    config = aiohttp.TraceConfig()
+    config.on_dns_resolvehost_start.append(dns_start)
+    config.on_dns_resolvehost_end.append(dns_end)
+    config.on_connection_create_start.append(connection_start)
+    config.on_connection_create_end.append(connection_end)
+    return config
@@ -0,0 +1,319 @@
+"""
+Uphold Python SDK - local balance projection
+
+BalanceProjector keeps the balance of every card of the user locally, so reading one
+needs no request. It starts from a get_cards() snapshot and applies the transactions
+seen afterwards: those listed by get_transactions(), those fed by a TransactionWatcher,
+and those returned by its own execute_txn(), so that a balance read right after a
+transfer already reflects it.
+
+    balances = BalanceProjector(api, verify_interval=300)
+    balances.load()
+    balances.execute_txn(card, api.prepare_txn(card, 'foo@bar.com', '10.00', 'USD'))
+    print(balances.available(card))
+    ...
+    balances.sync()
+
+A transaction debits its origin card by origin.amount, fee and commission included, and
+credits its destination card by destination.amount, when those cards are the user's.
+While it is processing, only the available amount of the origin is reduced; the balance
+follows when it completes, and a cancelled or failed one gives the available amount
+back. Every verify_interval seconds, sync() compares the projection with get_cards(),
+reports the differences to on_drift and adopts the server's figures.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from decimal import Decimal
+from itertools import islice
+
+# field is 'available' or 'balance'.
+BalanceDrift = namedtuple('BalanceDrift', ['card', 'field', 'local', 'server'])
+
+# Statuses of a committed transaction whose funds are held but not moved yet. A
+# 'pending' one is only a quote, and moves nothing.
+HELD_STATUSES = ('waiting', 'processing')
+
+
+class _Balance(object):
+    __slots__ = ('available', 'balance', 'currency')
+
+    def __init__(self, card):
+        self.available = Decimal(card.get('available') or 0)
+        self.balance = Decimal(card.get('balance') or 0)
+        self.currency = card.get('currency')
+
+
+class BalanceProjector(object):
+    """
+    Projects the card balances from a snapshot and the transactions since.
+    """
+
+    def __init__(self, api, verify_interval=300.0, on_drift=None, page_size=50, max_tracked=100000,
+                 interval=5.0, clock=time.time):
+        """
+        :param Uphold api The client used to read cards and transactions.
+
+        :param Float verify_interval Seconds between two checks against get_cards() by
+          sync(). 0 checks on every sync, None never.
+
+        :param Callable on_drift (optional) Called with a BalanceDrift for each figure
+          that differed from the server's.
+
+        :param Integer page_size Transactions requested per page by sync(). It reads
+          further pages only when a whole page brings something new.
+
+        :param Integer max_tracked Number of transaction ids remembered so that none is
+          applied twice.
+
+        :param Float interval Seconds between two syncs of the background thread.
+        """
+        self.api = api
+        self.verify_interval = verify_interval
+        self.page_size = page_size
+        self.max_tracked = max_tracked
+        self.interval = interval
+        self._clock = clock
+        self._callbacks = [on_drift] if on_drift is not None else []
+        self._lock = threading.Lock()
+        self._cards = {}
+        # Transaction id -> 'held', 'settled' or 'released', oldest first.
+        self._applied = OrderedDict()
+        self._stop = threading.Event()
+        self._thread = None
+        self.loaded_at = None
+        self.verified_at = None
+        self.applied = 0
+        self.verifications = 0
+        self.drifts = 0
+
+    def load(self):
+        """
+        Starts over from the current cards. The newest page of transactions is taken as
+        already counted in them.
+        """
+        cards = self.api.get_cards()
+        # A transaction made between the two requests is either counted twice or missed;
+        # the next verification corrects it.
+        transactions = self._newest(self.page_size)
+        with self._lock:
+            self._cards = dict((card['id'], _Balance(card)) for card in cards)
+            self._applied.clear()
+            for transaction in transactions:
+                state = self._state(transaction)
+                if state is not None:
+                    self._track(transaction.get('id'), state)
+            self.loaded_at = self.verified_at = self._clock()
+        return self
+
+    def available(self, card):
+        with self._lock:
+            return self._cards[card].available
+
+    def balance(self, card):
+        with self._lock:
+            return self._cards[card].balance
+
+    def balances(self):
+        """
+        :rtype:
+          A hash of the available amount, balance and currency of each card, by card id.
+        """
+        with self._lock:
+            return dict((id, {'available': b.available, 'balance': b.balance, 'currency': b.currency})
+                        for id, b in self._cards.items())
+
+    def apply(self, transaction):
+        """
+        Applies a transaction, or the change of status of one applied before. Applying
+        the same transaction again changes nothing.
+
+        :rtype:
+          Whether any balance changed.
+        """
+        state = self._state(transaction)
+        id = transaction.get('id')
+        if state is None or id is None:
+            return False
+        origin = transaction.get('origin') or {}
+        destination = transaction.get('destination') or {}
+        with self._lock:
+            previous = self._applied.get(id)
+            if previous == state or previous in ('settled', 'released'):
+                return False
+            source = self._cards.get(origin.get('CardId'))
+            target = self._cards.get(destination.get('CardId'))
+            debit = self._amount(origin, 1) if source is not None else None
+            changed = False
+            if source is not None and previous is None and state in ('held', 'settled'):
+                source.available -= debit
+                changed = True
+            if source is not None and previous == 'held' and state == 'released':
+                source.available += debit
+                changed = True
+            if state == 'settled':
+                if source is not None:
+                    source.balance -= debit
+                    changed = True
+                if target is not None:
+                    credit = self._amount(destination, -1)
+                    target.available += credit
+                    target.balance += credit
+                    changed = True
+            self._track(id, state)
+            if changed:
+                self.applied += 1
+        return changed
+
+    def on_event(self, event):
+        """
+        Applies the transaction of a TransactionEvent, so that a TransactionWatcher can
+        keep the projection current: watcher.on_event(balances.on_event).
+        """
+        self.apply(event.transaction)
+
+    def execute_txn(self, card, transaction, message=''):
+        """
+        Executes a transaction with Uphold.execute_txn() and applies the transaction
+        object returned.
+        """
+        data = self.api.execute_txn(card, transaction, message)
+        if isinstance(data, dict):
+            self.apply(data)
+        return data
+
+    def sync(self):
+        """
+        Applies the transactions listed since the last sync, then verifies the projection
+        if verify_interval has elapsed.
+
+        :rtype:
+          The number of transactions that changed a balance.
+        """
+        changed = 0
+        entries = self.api.iter_transactions(page_size=self.page_size)
+        try:
+            for count, transaction in enumerate(entries, 1):
+                if self.apply(transaction):
+                    changed += 1
+                elif count >= self.page_size and self._done(transaction):
+                    # Past the first page, the rest was applied by earlier syncs.
+                    break
+        finally:
+            close = getattr(entries, 'close', None)
+            if close is not None:
+                close()
+        if self.verify_interval is not None and self._clock() - (self.verified_at or 0) >= self.verify_interval:
+            self.verify()
+        return changed
+
+    def verify(self):
+        """
+        Compares the projection with get_cards(), and adopts the server's figures.
+
+        :rtype:
+          The list of BalanceDrift found, also passed to on_drift.
+        """
+        cards = self.api.get_cards()
+        drifts = []
+        with self._lock:
+            for card in cards:
+                server = _Balance(card)
+                local = self._cards.get(card['id'])
+                if local is not None:
+                    for field in ('available', 'balance'):
+                        if getattr(local, field) != getattr(server, field):
+                            drifts.append(BalanceDrift(card['id'], field, getattr(local, field),
+                                                       getattr(server, field)))
+                self._cards[card['id']] = server
+            self.verifications += 1
+            self.drifts += len(drifts)
+            self.verified_at = self._clock()
+        for drift in drifts:
+            for callback in list(self._callbacks):
+                callback(drift)
+        return drifts
+
+    def on_drift(self, callback):
+        self._callbacks.append(callback)
+        return callback
+
+    def start(self):
+        """
+        Syncs in a background thread every interval seconds.
+        """
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'cards': len(self._cards),
+                'tracked': len(self._applied),
+                'applied': self.applied,
+                'verifications': self.verifications,
+                'drifts': self.drifts,
+                'verified_at': self.verified_at,
+            }
+
+    """
+    HELPER FUNCTIONS
+    """
+    def _state(self, transaction):
+        status = transaction.get('status')
+        if status == 'completed':
+            return 'settled'
+        if status in HELD_STATUSES:
+            return 'held'
+        if status in ('cancelled', 'failed'):
+            return 'released'
+        return None
+
+    def _amount(self, side, sign):
+        """
+        The amount leaving the origin (sign 1) or reaching the destination (sign -1).
+        Without an amount, it is worked out from the base, fee and commission.
+        """
+        if side.get('amount') is not None:
+            return Decimal(side['amount'])
+        charges = Decimal(side.get('fee') or 0) + Decimal(side.get('commission') or 0)
+        return Decimal(side.get('base') or 0) + sign * charges
+
+    def _done(self, transaction):
+        return self._applied.get(transaction.get('id')) in ('settled', 'released')
+
+    def _track(self, id, state):
+        self._applied[id] = state
+        self._applied.move_to_end(id)
+        while len(self._applied) > self.max_tracked:
+            self._applied.popitem(last=False)
+
+    def _newest(self, count):
+        entries = self.api.iter_transactions(page_size=count)
+        try:
+            return list(islice(entries, count))
+        finally:
+            close = getattr(entries, 'close', None)
+            if close is not None:
+                close()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sync()
+            except Exception:
+                # The next sync tries again.
+                continue
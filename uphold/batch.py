@@ -0,0 +1,232 @@
+"""
+Uphold Python SDK - bulk transfers
+
+BatchTransfer prepares and commits many transfers concurrently, re-preparing quotes
+that expire before they are committed, and records every step in a journal so that
+re-running a batch after a crash never commits the same row twice.
+
+    batch = BatchTransfer(api, journal='payouts-2015-06.journal', max_workers=8)
+    for result in batch.run(rows):
+        print(result.key, result.id, result.status, result.error)
+
+Each row is a (card, destination, amount, denom[, message]) tuple, or a hash with
+those keys and an optional 'key' identifying the row across runs.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+TransferResult = namedtuple('TransferResult', ['key', 'row', 'id', 'status', 'error'])
+
+PREPARED = 'prepared'
+COMMITTING = 'committing'
+COMMITTED = 'committed'
+FAILED = 'failed'
+
+
+class TransferError(Exception):
+    def __init__(self, value):
+        self.value = value
+    def __str__(self):
+        return repr(self.value)
+
+
+class TransferJournal(object):
+    """
+    An append-only journal of the state of each row of a batch, one JSON document per
+    line. Every entry is flushed to disk before the step it records goes ahead.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}
+        if os.path.exists(path):
+            with io.open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A torn last line from a crash mid-write.
+                        continue
+                    self._entries[entry['key']] = entry
+        self._file = io.open(path, 'a', encoding='utf-8')
+
+    def get(self, key):
+        with self._lock:
+            return self._entries.get(key)
+
+    def record(self, key, state, **fields):
+        entry = dict(fields, key=key, state=state, at=time.time())
+        line = json.dumps(entry, sort_keys=True)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._entries[key] = entry
+        return entry
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class BatchTransfer(object):
+    """
+    Prepares and commits transfers with bounded parallelism and streams back one
+    TransferResult per row, in completion order.
+    """
+
+    # Error codes returned when committing a quote that is no longer valid.
+    expired_codes = ('not_found', 'transaction_expired')
+
+    def __init__(self, api, journal=None, max_workers=8, quote_ttl=30.0, ttl_margin=5.0,
+                 max_reprepares=2, clock=time.time):
+        """
+        :param Uphold api The client used to prepare and commit the transactions.
+
+        :param String/TransferJournal journal (optional) Where to record progress. Without
+          a journal, rows cannot be resumed safely after a crash.
+
+        :param Integer max_workers Maximum number of rows processed at once.
+
+        :param Float quote_ttl How long a prepared transaction stays valid, in seconds.
+
+        :param Float ttl_margin Quotes with less than this many seconds left are
+          prepared again rather than committed.
+
+        :param Integer max_reprepares How many times a row's quote may be renewed.
+        """
+        self.api = api
+        if journal is not None and not isinstance(journal, TransferJournal):
+            journal = TransferJournal(journal)
+        self.journal = journal
+        self.max_workers = max_workers
+        self.quote_ttl = quote_ttl
+        self.ttl_margin = ttl_margin
+        self.max_reprepares = max_reprepares
+        self._clock = clock
+
+    def run(self, rows):
+        """
+        Processes the rows, reading them lazily so that only a bounded number are held
+        in memory at once.
+
+        :param Iterable rows The transfers to make.
+
+        :rtype:
+          An iterator over TransferResult, one per row.
+        """
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        pending = set()
+        try:
+            for index, row in enumerate(rows):
+                row = self._normalize(row)
+                key = row.get('key') or self._row_key(index, row)
+                pending.add(executor.submit(self._transfer, key, row))
+                if len(pending) >= self.max_workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    """
+    HELPER FUNCTIONS
+    """
+    def _normalize(self, row):
+        if isinstance(row, dict):
+            row = dict(row)
+            row.setdefault('message', '')
+            return row
+        card, destination, amount, denom = row[:4]
+        message = row[4] if len(row) > 4 else ''
+        return {'card': card, 'destination': destination, 'amount': amount, 'denom': denom, 'message': message}
+
+    def _row_key(self, index, row):
+        fields = [row['card'], row['destination'], str(row['amount']), row['denom'], row['message'] or '']
+        digest = hashlib.sha256('\0'.join(fields).encode('utf-8')).hexdigest()[:16]
+        return '{}:{}'.format(index, digest)
+
+    def _record(self, key, state, **fields):
+        if self.journal is not None:
+            self.journal.record(key, state, **fields)
+
+    def _transfer(self, key, row):
+        try:
+            entry = self.journal.get(key) if self.journal is not None else None
+            if entry is not None and entry['state'] == COMMITTED:
+                return TransferResult(key, row, entry.get('id'), entry.get('status'), None)
+            if entry is not None and entry['state'] == COMMITTING:
+                # A previous run may or may not have committed this quote: never prepare
+                # a new one, settle the fate of the old one instead.
+                return self._recover(key, row, entry['id'])
+            return self._prepare_and_commit(key, row)
+        except Exception as e:
+            entry = self.journal.get(key) if self.journal is not None else None
+            if entry is not None and entry['state'] == COMMITTING:
+                # The commit may have gone through: keep the row marked as committing so
+                # that the next run checks on this transaction instead of preparing another.
+                self._record(key, COMMITTING, id=entry['id'], error=repr(e))
+                return TransferResult(key, row, entry['id'], None, e)
+            self._record(key, FAILED, error=repr(e))
+            return TransferResult(key, row, None, None, e)
+
+    def _prepare(self, key, row):
+        try:
+            transaction = self.api.prepare_txn(row['card'], row['destination'], row['amount'], row['denom'])
+        except KeyError:
+            raise TransferError('Could not prepare the transaction')
+        self._record(key, PREPARED, id=transaction)
+        return transaction, self._clock()
+
+    def _prepare_and_commit(self, key, row):
+        transaction, prepared_at = self._prepare(key, row)
+        reprepares = 0
+        while True:
+            if self._clock() - prepared_at > self.quote_ttl - self.ttl_margin:
+                if reprepares >= self.max_reprepares:
+                    raise TransferError('Quote expired before it could be committed')
+                reprepares += 1
+                transaction, prepared_at = self._prepare(key, row)
+                continue
+            self._record(key, COMMITTING, id=transaction)
+            data = self.api.execute_txn(row['card'], transaction, row['message'])
+            if data.get('status'):
+                self._record(key, COMMITTED, id=transaction, status=data['status'])
+                return TransferResult(key, row, transaction, data['status'], None)
+            if data.get('code') in self.expired_codes and reprepares < self.max_reprepares:
+                reprepares += 1
+                transaction, prepared_at = self._prepare(key, row)
+                continue
+            # The API refused the commit, so nothing was transferred.
+            error = TransferError(data)
+            self._record(key, FAILED, id=transaction, error=repr(error))
+            return TransferResult(key, row, transaction, None, error)
+
+    def _recover(self, key, row, transaction):
+        data = self.api.execute_txn(row['card'], transaction, row['message'])
+        if not data.get('status'):
+            # Committing twice is refused, so check whether the first attempt went through.
+            data = self.api.get_reserve_transaction(transaction)
+        if data.get('status') and data.get('id', transaction) == transaction:
+            self._record(key, COMMITTED, id=transaction, status=data['status'])
+            return TransferResult(key, row, transaction, data['status'], None)
+        raise TransferError(data)
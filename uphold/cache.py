@@ -0,0 +1,276 @@
+"""
+Uphold Python SDK - in-process caches
+
+TickerCache keeps the ticker table in memory so that repeated get_ticker() calls,
+from any number of threads, cost one upstream request per TTL.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import threading
+import time
+
+
+class SingleFlight(object):
+    """
+    Coalesces concurrent calls for the same key: while a call is in flight, other
+    callers asking for the same key wait for its result instead of starting their own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.coalesced = 0
+
+    def do(self, key, fn, *args):
+        """
+        Calls fn(*args) unless a call for key is already in flight, in which case the
+        result (or exception) of that call is returned instead.
+
+        :rtype:
+          A tuple of the result and whether this caller made the call itself.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return call.wait(), False
+        try:
+            call.result = fn(*args)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, True
+
+    def call(self, key, fn, *args):
+        """
+        Same as do(), returning the result alone.
+        """
+        return self.do(key, fn, *args)[0]
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._calls
+
+
+class _Call(object):
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class TickerCache(object):
+    """
+    A TTL cache for ticker rates that can be shared by several Uphold instances.
+
+    The full ticker table is fetched once per TTL and pair lookups such as
+    get_ticker('BTCUSD') are answered from it. Concurrent misses trigger a single
+    upstream request. With stale_ttl set, an expired table keeps being served for up
+    to stale_ttl more seconds while it is refreshed in the background.
+
+    Cached values are shared between callers and must be treated as read-only.
+    """
+
+    TABLE = ''
+
+    def __init__(self, ttl=5.0, stale_ttl=0.0, clock=time.time):
+        """
+        :param Float ttl Seconds a fetched ticker stays fresh.
+
+        :param Float stale_ttl Seconds past the TTL during which the old value is still
+          served while a background refresh runs. 0 disables stale serving.
+        """
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._pairs = {}
+        self._flight = SingleFlight()
+        self._tasks = {}
+        self._subscribers = []
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.errors = 0
+
+    def get(self, t, fetch):
+        """
+        Returns the ticker for t ('' for the whole table), calling fetch(t) upstream
+        only when the cache cannot answer.
+
+        :param String t A currency or currency pair, or '' for all rates.
+
+        :param Callable fetch Function performing the upstream request for a key.
+        """
+        value, state = self._lookup(t)
+        if state == 'fresh':
+            return value
+        if state == 'stale':
+            self._refresh_in_background(self._key(t), fetch)
+            return value
+
+        key = self._key(t)
+        self._fetch(key, fetch)
+        value, state = self._lookup(t, count=False)
+        if state == 'missing':
+            # The pair is not in the table (or t is a currency): cache it on its own.
+            self._fetch(t, fetch)
+            value, state = self._lookup(t, count=False)
+        return value
+
+    async def aget(self, t, fetch):
+        """
+        The asyncio counterpart of get(): fetch is a coroutine function and concurrent
+        misses in the event loop share one upstream request.
+        """
+        value, state = self._lookup(t)
+        if state == 'fresh':
+            return value
+        if state == 'stale':
+            self._afetch(self._key(t), fetch).add_done_callback(self._consume_error)
+            return value
+
+        await self._afetch(self._key(t), fetch)
+        value, state = self._lookup(t, count=False)
+        if state == 'missing':
+            await self._afetch(t, fetch)
+            value, state = self._lookup(t, count=False)
+        return value
+
+    def subscribe(self, callback):
+        """
+        Registers callback(ticker) to be called with every full ticker table fetched,
+        for instance RateTable.update.
+        """
+        self._subscribers.append(callback)
+
+    def stats(self):
+        """
+        :rtype:
+          A hash with the hit, stale hit, miss, refresh and error counters.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'refreshes': self.refreshes,
+                'errors': self.errors,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._pairs = {}
+
+    def _key(self, t):
+        # Pairs are served from the full table unless it is known not to contain them.
+        if t and t in self._entries:
+            return t
+        return self.TABLE
+
+    def _lookup(self, t, count=True):
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(t)
+            if entry is None and t:
+                table = self._entries.get(self.TABLE)
+                if table is not None and t in self._pairs:
+                    entry = (table[0], self._pairs[t])
+            if entry is None:
+                state, value = 'missing', None
+            else:
+                fetched_at, value = entry
+                age = now - fetched_at
+                if age < self.ttl:
+                    state = 'fresh'
+                elif age < self.ttl + self.stale_ttl:
+                    state = 'stale'
+                else:
+                    state = 'expired'
+            if count:
+                if state == 'fresh':
+                    self.hits += 1
+                elif state == 'stale':
+                    self.stale_hits += 1
+                else:
+                    self.misses += 1
+        return value, state
+
+    def _store(self, key, value):
+        with self._lock:
+            self._entries[key] = (self._clock(), value)
+            if key == self.TABLE and isinstance(value, list):
+                self._pairs = dict((row['pair'], row) for row in value if 'pair' in row)
+            self.refreshes += 1
+        if key == self.TABLE:
+            for callback in self._subscribers:
+                callback(value)
+
+    def _fetch(self, key, fetch):
+        def call():
+            try:
+                value = fetch(key)
+            except Exception:
+                with self._lock:
+                    self.errors += 1
+                raise
+            self._store(key, value)
+            return value
+        return self._flight.do(key, call)[0]
+
+    def _afetch(self, key, fetch):
+        task = self._tasks.get(key)
+        if task is None:
+            import asyncio
+            task = self._tasks[key] = asyncio.ensure_future(self._afetch_and_store(key, fetch))
+        return task
+
+    async def _afetch_and_store(self, key, fetch):
+        try:
+            value = await fetch(key)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            self._tasks.pop(key, None)
+        self._store(key, value)
+        return value
+
+    def _consume_error(self, task):
+        if not task.cancelled():
+            task.exception()
+
+    def _refresh_in_background(self, key, fetch):
+        if self._flight.in_flight(key):
+            return
+        thread = threading.Thread(target=self._refresh_quietly, args=(key, fetch))
+        thread.daemon = True
+        thread.start()
+
+    def _refresh_quietly(self, key, fetch):
+        try:
+            self._fetch(key, fetch)
+        except Exception:
+            # Keep serving the stale value; the error is counted in _fetch.
+            pass
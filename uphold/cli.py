@@ -0,0 +1,349 @@
+"""
+Uphold Python SDK - command line
+
+The uphold command exports long histories without ever holding them in memory:
+
+    uphold export reserve-chain --output chain.ndjson.gz --prefetch 8
+    uphold export ledger --format csv --since 2015-06-01 > ledger.csv
+    UPHOLD_PAT=... uphold export card-transactions --card <id> --output card.ndjson --checkpoint card.ckpt
+
+Entries are written as their page arrives, one JSON document per line (NDJSON) or as
+CSV rows with the columns of uphold.columnar. Pages are requested --prefetch at a time
+and written in order. Gzip output, chosen with --gzip or an output name ending in .gz,
+is compressed on a writer thread so that fetching never waits for it.
+
+Lists are newest first: --since stops the export at the first entry created before the
+given ISO 8601 date or time. With --checkpoint, progress is saved every
+--checkpoint-every entries, and running the same command again after an interruption
+carries on from the last checkpoint; entries added to the list in the meantime are left
+out, as they are newer than the export.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import argparse
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import queue
+import sys
+import threading
+
+from .columnar import LEDGER_SCHEMA, TRANSACTION_SCHEMA, ledger_rows, transaction_rows
+
+# kind: (Uphold method listing the entries, CSV columns, CSV rows of an entry)
+EXPORTS = {
+    'reserve-chain': ('iter_reserve_chain', TRANSACTION_SCHEMA, transaction_rows),
+    'ledger': ('iter_reserve_ledger', LEDGER_SCHEMA, ledger_rows),
+    'transactions': ('iter_transactions', TRANSACTION_SCHEMA, transaction_rows),
+    'card-transactions': ('iter_card_transactions', TRANSACTION_SCHEMA, transaction_rows),
+}
+
+_MARK = object()
+_CLOSE = object()
+
+
+class ExportError(Exception):
+    def __init__(self, value):
+        self.value = value
+    def __str__(self):
+        return repr(self.value)
+
+
+class ExportSink(object):
+    """
+    The output of an export: a file, or stdout for '-'. With compress, the data is
+    gzipped by a writer thread, fed through a bounded queue.
+    """
+
+    def __init__(self, path, compress=False, resume_at=None, max_pending=64):
+        """
+        :param String path The output file, or '-' for stdout.
+
+        :param Boolean compress Gzip the output.
+
+        :param Integer resume_at (optional) Append to the file from this offset, dropping
+          whatever was written past it.
+
+        :param Integer max_pending Chunks queued for the writer thread before write()
+          waits for it.
+        """
+        self.path = path
+        self.compress = compress
+        if path == '-':
+            self._raw = sys.stdout.buffer
+        elif resume_at is not None:
+            self._raw = io.open(path, 'r+b')
+            self._raw.truncate(resume_at)
+            self._raw.seek(resume_at)
+        else:
+            self._raw = io.open(path, 'wb')
+        self._member = None
+        self._error = None
+        self._queue = None
+        self._thread = None
+        if compress:
+            self._queue = queue.Queue(max_pending)
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def write(self, data):
+        if self._queue is None:
+            self._raw.write(data)
+        else:
+            self._put((data, None))
+
+    def mark(self, callback):
+        """
+        Calls callback with the size of the output once everything written so far is
+        on disk. Compressed output is a new gzip member from then on, so that the file
+        can be cut there and appended to.
+        """
+        if self._queue is None:
+            callback(self._sync())
+        else:
+            self._put((_MARK, callback))
+
+    def close(self):
+        if self._queue is not None:
+            self._put((_CLOSE, None))
+            self._thread.join()
+        elif self.path == '-':
+            self._raw.flush()
+        if self.path != '-':
+            self._raw.close()
+        if self._error is not None:
+            raise self._error
+
+    """
+    HELPER FUNCTIONS
+    """
+    def _put(self, item):
+        if self._error is not None:
+            raise self._error
+        self._queue.put(item)
+
+    def _sync(self):
+        if self._member is not None:
+            # Writes the gzip trailer, leaving the file open.
+            self._member.close()
+            self._member = None
+        self._raw.flush()
+        if self.path != '-':
+            os.fsync(self._raw.fileno())
+            return self._raw.tell()
+        return None
+
+    def _run(self):
+        while True:
+            data, callback = self._queue.get()
+            if self._error is not None:
+                # Keep draining, so that the producer never blocks on a dead writer.
+                if data is _CLOSE:
+                    return
+                continue
+            try:
+                if data is _CLOSE:
+                    self._sync()
+                    return
+                if data is _MARK:
+                    callback(self._sync())
+                    continue
+                if self._member is None:
+                    self._member = gzip.GzipFile(fileobj=self._raw, mode='wb', compresslevel=6)
+                self._member.write(data)
+            except Exception as e:
+                self._error = e
+
+
+def export(api, kind, output='-', format='ndjson', since=None, card=None, page_size=50, prefetch=4,
+           checkpoint=None, checkpoint_every=10000, compress=False, chunk_size=65536):
+    """
+    Streams a list endpoint to output.
+
+    :param Uphold api The client to fetch the entries with.
+
+    :param String kind One of EXPORTS: 'reserve-chain', 'ledger', 'transactions' or
+      'card-transactions'.
+
+    :param String format 'ndjson' or 'csv'.
+
+    :param String since (optional) Stop at the first entry created before this ISO 8601
+      date or time.
+
+    :param String card The card to export, for 'card-transactions'.
+
+    :param Integer prefetch Pages requested ahead of the one being written.
+
+    :param String checkpoint (optional) Where to save progress, and resume from.
+
+    :param Boolean compress Gzip the output.
+
+    :rtype:
+      The number of entries written by this run.
+    """
+    method, schema, rows = EXPORTS[kind]
+    args = ()
+    if kind == 'card-transactions':
+        if not card:
+            raise ExportError('card-transactions needs a card')
+        args = (card,)
+    job = {'kind': kind, 'card': card, 'format': format, 'compress': bool(compress), 'since': since}
+    state = _load_checkpoint(checkpoint, job, output)
+    done = state['written'] if state else 0
+    last = state['last'] if state else None
+    sink = ExportSink(output, compress, resume_at=state['bytes'] if state else None)
+    # Entries are only ever added at the head of the list: the last one written is at
+    # its old index, or further down.
+    entries = getattr(api, method)(*args, page_size=page_size, prefetch=prefetch, start=max(0, done - 1))
+    encode = _csv_encoder(rows) if format == 'csv' else _ndjson
+    written = 0
+    previous = last
+    try:
+        chunk = []
+        size = 0
+        if format == 'csv' and state is None:
+            chunk.append(_csv_line([name for name, column in schema]))
+        for entry in entries:
+            if last is not None:
+                if _entry_key(entry) == last:
+                    last = None
+                continue
+            if since and (entry.get('createdAt') or '') < since:
+                break
+            data = encode(entry)
+            chunk.append(data)
+            size += len(data)
+            written += 1
+            previous = entry
+            if size >= chunk_size:
+                sink.write(b''.join(chunk))
+                chunk, size = [], 0
+            if checkpoint and (done + written) % checkpoint_every == 0:
+                sink.write(b''.join(chunk))
+                chunk, size = [], 0
+                sink.mark(_checkpoint_saver(checkpoint, job, done + written, _entry_key(entry)))
+        if last is not None:
+            raise ExportError('the last exported entry is gone from the list, cannot resume')
+        sink.write(b''.join(chunk))
+        if checkpoint:
+            if written:
+                previous = _entry_key(previous)
+            sink.mark(_checkpoint_saver(checkpoint, job, done + written, previous))
+    finally:
+        close = getattr(entries, 'close', None)
+        if close is not None:
+            close()
+        sink.close()
+    return written
+
+
+def main(argv=None):
+    """
+    The uphold console script.
+    """
+    parser = argparse.ArgumentParser(prog='uphold', description='Uphold API command line.')
+    parser.add_argument('--pat', default=os.environ.get('UPHOLD_PAT'),
+                        help='personal access token, defaults to $UPHOLD_PAT')
+    parser.add_argument('--sandbox', action='store_true', help='use the Uphold sandbox')
+    parser.add_argument('--base-url', help='send requests to this server instead')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    command = commands.add_parser('export', help='stream a history to NDJSON or CSV')
+    command.add_argument('kind', choices=sorted(EXPORTS))
+    command.add_argument('--card', help='the card of card-transactions')
+    command.add_argument('--output', '-o', default='-', help='output file, - for stdout (default)')
+    command.add_argument('--format', choices=('ndjson', 'csv'),
+                         help='defaults to csv for a .csv output, ndjson otherwise')
+    command.add_argument('--gzip', action='store_true', default=None,
+                         help='compress the output, the default for a .gz output')
+    command.add_argument('--since', help='stop at entries created before this ISO 8601 date or time')
+    command.add_argument('--page-size', type=int, default=50)
+    command.add_argument('--prefetch', type=int, default=4, help='pages requested ahead, default 4')
+    command.add_argument('--checkpoint', help='save progress to this file, and resume from it')
+    command.add_argument('--checkpoint-every', type=int, default=10000, help='entries between checkpoints')
+    args = parser.parse_args(argv)
+
+    compress = args.gzip if args.gzip is not None else args.output.endswith('.gz')
+    name = args.output[:-len('.gz')] if args.output.endswith('.gz') else args.output
+    format = args.format or ('csv' if name.endswith('.csv') else 'ndjson')
+    if args.kind == 'card-transactions' and not args.card:
+        parser.error('card-transactions needs --card')
+    if args.checkpoint and args.output == '-':
+        parser.error('--checkpoint needs an --output file')
+
+    from .uphold import Uphold
+    api = Uphold(sandbox=args.sandbox, base_url=args.base_url, rate_limiter=True)
+    if args.pat:
+        api.auth_pat(args.pat)
+    try:
+        export(api, args.kind, args.output, format, since=args.since, card=args.card, page_size=args.page_size,
+               prefetch=args.prefetch, checkpoint=args.checkpoint, checkpoint_every=args.checkpoint_every,
+               compress=compress)
+    except BrokenPipeError:
+        # The reader went away, as with "| head": don't complain about stdout at exit.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    except ExportError as e:
+        print('uphold: ' + e.value, file=sys.stderr)
+        return 1
+    return 0
+
+
+"""
+HELPER FUNCTIONS
+"""
+def _ndjson(entry):
+    return json.dumps(entry, separators=(',', ':'), ensure_ascii=False).encode('utf-8') + b'\n'
+
+
+def _csv_line(row):
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerow(row)
+    return buffer.getvalue().encode('utf-8')
+
+
+def _csv_encoder(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+
+    def encode(entry):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows([entry]))
+        return buffer.getvalue().encode('utf-8')
+    return encode
+
+
+def _entry_key(entry):
+    # Ledger entries have no id of their own.
+    return hashlib.sha256(json.dumps(entry, sort_keys=True).encode('utf-8')).hexdigest()[:32]
+
+
+def _load_checkpoint(path, job, output):
+    if not path or not os.path.exists(path):
+        return None
+    with io.open(path, 'r', encoding='utf-8') as f:
+        state = json.load(f)
+    if dict((key, state.get(key)) for key in job) != job:
+        raise ExportError('{} is the checkpoint of another export'.format(path))
+    if not os.path.exists(output) or os.path.getsize(output) < state['bytes']:
+        raise ExportError('{} is shorter than its checkpoint, start over without it'.format(output))
+    return state
+
+
+def _checkpoint_saver(path, job, written, last):
+    def save(size):
+        state = dict(job, written=written, last=last, bytes=size)
+        temporary = path + '.tmp'
+        with io.open(temporary, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(state, sort_keys=True))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+    return save
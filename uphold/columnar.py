@@ -0,0 +1,343 @@
+"""
+Uphold Python SDK - columnar export
+
+Turns transaction histories and the reserve ledger into column batches with typed amount,
+currency, timestamp and status columns, ready for pandas, Parquet or Arrow. Entries are
+consumed lazily, so memory is bounded by batch_size however long the history is.
+
+    batches = transaction_batches(api.iter_transactions(), batch_size=10000)
+    write_parquet(batches, 'transactions.parquet')
+
+    totals = sum_by_currency(ledger_batches(api.iter_reserve_ledger()))
+
+NumPy is needed for to_numpy() and the aggregations, and pyarrow for to_arrow() and the
+writers. Neither is installed with the SDK.
+"""
+
+from __future__ import print_function, unicode_literals
+
+from decimal import Decimal
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+STRING = 'string'
+AMOUNT = 'amount'
+TIMESTAMP = 'timestamp'
+
+TRANSACTION_SCHEMA = (
+    ('id', STRING),
+    ('created_at', TIMESTAMP),
+    ('type', STRING),
+    ('status', STRING),
+    ('amount', AMOUNT),
+    ('currency', STRING),
+    ('origin_card', STRING),
+    ('origin_amount', AMOUNT),
+    ('origin_currency', STRING),
+    ('commission', AMOUNT),
+    ('fee', AMOUNT),
+    ('destination_card', STRING),
+    ('destination_amount', AMOUNT),
+    ('destination_currency', STRING),
+)
+
+# One row per movement: a ledger entry with both 'in' and 'out' gives two rows.
+LEDGER_SCHEMA = (
+    ('transaction_id', STRING),
+    ('created_at', TIMESTAMP),
+    ('type', STRING),
+    ('direction', STRING),
+    ('amount', AMOUNT),
+    ('currency', STRING),
+)
+
+# Amounts are stored in Arrow as decimals, so that Parquet files keep them exactly.
+ARROW_AMOUNT_PRECISION = 38
+ARROW_AMOUNT_SCALE = 18
+
+
+def _require(module, name):
+    if module is None:
+        raise ImportError('{} is required for this, install it with "pip install {}"'.format(name, name))
+    return module
+
+
+class ColumnBatch(object):
+    """
+    A batch of rows stored column by column, as the raw values of the API.
+    """
+
+    def __init__(self, schema, columns):
+        """
+        :param Tuple schema (name, kind) pairs, kind being STRING, AMOUNT or TIMESTAMP.
+
+        :param List columns One list of values per column of the schema.
+        """
+        self.schema = schema
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns[0]) if self.columns else 0
+
+    @property
+    def names(self):
+        return [name for name, kind in self.schema]
+
+    def column(self, name):
+        return self.columns[self.names.index(name)]
+
+    def to_numpy(self):
+        """
+        Converts the batch to a NumPy structured array. Amounts become float64 (NaN when
+        absent), timestamps datetime64[ms] in UTC (NaT when absent) and strings fixed-width
+        unicode.
+        """
+        np = _require(numpy, 'numpy')
+        arrays = [self._numpy_column(np, kind, values) for (name, kind), values in zip(self.schema, self.columns)]
+        array = np.empty(len(self), dtype=[(name, a.dtype) for (name, kind), a in zip(self.schema, arrays)])
+        for (name, kind), a in zip(self.schema, arrays):
+            array[name] = a
+        return array
+
+    def to_arrow(self):
+        """
+        Converts the batch to a pyarrow.RecordBatch. Amounts become decimals and
+        timestamps millisecond timestamps in UTC.
+        """
+        pa = _require(pyarrow, 'pyarrow')
+        arrays = []
+        for (name, kind), values in zip(self.schema, self.columns):
+            if kind == AMOUNT:
+                arrays.append(pa.array([None if v in (None, '') else Decimal(v) for v in values],
+                                       pa.decimal128(ARROW_AMOUNT_PRECISION, ARROW_AMOUNT_SCALE)))
+            elif kind == TIMESTAMP:
+                arrays.append(pa.array(self._numpy_column(_require(numpy, 'numpy'), kind, values),
+                                       pa.timestamp('ms')).cast(pa.timestamp('ms', tz='UTC')))
+            else:
+                arrays.append(pa.array(values, pa.string()))
+        return pa.RecordBatch.from_arrays(arrays, names=self.names)
+
+    """
+    HELPER FUNCTIONS
+    """
+    def _numpy_column(self, np, kind, values):
+        if kind == AMOUNT:
+            return np.array(['nan' if v in (None, '') else v for v in values]).astype('float64')
+        if kind == TIMESTAMP:
+            # numpy parses ISO 8601 itself, but warns about the trailing Z.
+            return np.array([('NaT' if not v else v[:-1] if v.endswith('Z') else v) for v in values],
+                            dtype='datetime64[ms]')
+        values = ['' if v is None else v for v in values]
+        return np.array(values, dtype='U{}'.format(max([1] + [len(v) for v in values])))
+
+
+def _batches(schema, rows, batch_size):
+    columns = [[] for _ in schema]
+    count = 0
+    yielded = False
+    for row in rows:
+        for column, value in zip(columns, row):
+            column.append(value)
+        count += 1
+        if count >= batch_size:
+            yield ColumnBatch(schema, columns)
+            yielded = True
+            columns = [[] for _ in schema]
+            count = 0
+    if count or not yielded:
+        yield ColumnBatch(schema, columns)
+
+
+def transaction_rows(transactions):
+    """
+    Flattens transactions into tuples of the TRANSACTION_SCHEMA columns, amounts and
+    timestamps left as the strings of the API.
+    """
+    for txn in transactions:
+        denomination = txn.get('denomination') or {}
+        origin = txn.get('origin') or {}
+        destination = txn.get('destination') or {}
+        yield (txn.get('id'), txn.get('createdAt'), txn.get('type'), txn.get('status'),
+               denomination.get('amount'), denomination.get('currency'),
+               origin.get('CardId'), origin.get('amount'), origin.get('currency'),
+               origin.get('commission'), origin.get('fee'),
+               destination.get('CardId'), destination.get('amount'), destination.get('currency'))
+
+
+def ledger_rows(entries):
+    """
+    Flattens reserve ledger entries into tuples of the LEDGER_SCHEMA columns, one per
+    movement.
+    """
+    for entry in entries:
+        for direction in ('in', 'out'):
+            movement = entry.get(direction)
+            if movement:
+                yield (entry.get('TransactionId'), entry.get('createdAt'), entry.get('type'), direction,
+                       movement.get('amount'), movement.get('currency'))
+
+
+def transaction_batches(transactions, batch_size=10000):
+    """
+    Groups transactions into column batches.
+
+    :param Iterable transactions Transactions, such as api.iter_transactions(),
+      api.iter_card_transactions(card) or api.iter_reserve_chain().
+
+    :param Integer batch_size Number of rows per batch.
+
+    :rtype:
+      An iterator over ColumnBatch with the TRANSACTION_SCHEMA columns.
+    """
+    return _batches(TRANSACTION_SCHEMA, transaction_rows(transactions), batch_size)
+
+
+def ledger_batches(entries, batch_size=10000):
+    """
+    Groups reserve ledger entries into column batches.
+
+    :param Iterable entries Ledger entries, such as api.iter_reserve_ledger().
+
+    :rtype:
+      An iterator over ColumnBatch with the LEDGER_SCHEMA columns.
+    """
+    return _batches(LEDGER_SCHEMA, ledger_rows(entries), batch_size)
+
+
+def write_parquet(batches, path, **kwargs):
+    """
+    Writes column batches to a Parquet file, one row group per batch. Extra keyword
+    arguments are passed to pyarrow.parquet.ParquetWriter.
+
+    :rtype:
+      The number of rows written.
+    """
+    _require(pyarrow, 'pyarrow')
+    from pyarrow import parquet
+    return _write(batches, lambda schema: parquet.ParquetWriter(path, schema, **kwargs))
+
+
+def write_ipc(batches, path):
+    """
+    Writes column batches to an Arrow IPC (Feather v2) file.
+
+    :rtype:
+      The number of rows written.
+    """
+    pa = _require(pyarrow, 'pyarrow')
+    return _write(batches, lambda schema: pa.ipc.new_file(path, schema))
+
+
+def _write(batches, open_writer):
+    writer = None
+    rows = 0
+    try:
+        for batch in batches:
+            record_batch = batch.to_arrow()
+            if writer is None:
+                writer = open_writer(record_batch.schema)
+            writer.write_batch(record_batch)
+            rows += len(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def sum_by_currency(batches, amount='amount', currency='currency', decimals=8):
+    """
+    Totals an amount column per currency, one vectorised pass per batch. Amounts are
+    added as integers of their smallest decimal place, so totals are exact. Missing
+    amounts count as zero.
+
+    :param Iterable batches ColumnBatch objects or NumPy structured arrays, for instance
+      filtered ones such as a[a['direction'] == 'in'].
+
+    :param Integer decimals Decimal places kept from the float amounts of NumPy arrays.
+      Those are exact up to 15 significant digits; ColumnBatch amounts always are.
+
+    :rtype:
+      A hash of currency to Decimal total.
+    """
+    np = _require(numpy, 'numpy')
+    totals = {}
+    for (currencies,), units, scale in _columns(np, batches, (currency,), amount, decimals):
+        if not len(units):
+            continue
+        keys, index = np.unique(currencies, return_inverse=True)
+        for key, value in zip(keys.tolist(), _group_sums(np, index, units, len(keys))):
+            totals[key] = totals.get(key, 0) + Decimal(value).scaleb(-scale)
+    return totals
+
+
+def sum_by_day(batches, amount='amount', currency='currency', timestamp='created_at', decimals=8):
+    """
+    Totals an amount column per UTC day and currency, exactly as sum_by_currency() does.
+    Rows without a timestamp are left out.
+
+    :rtype:
+      A hash of (datetime.date, currency) to Decimal total.
+    """
+    np = _require(numpy, 'numpy')
+    totals = {}
+    for (timestamps, currencies), units, scale in _columns(np, batches, (timestamp, currency), amount, decimals):
+        present = ~np.isnat(timestamps)
+        timestamps, currencies, units = timestamps[present], currencies[present], units[present]
+        if not len(units):
+            continue
+        days, day_index = np.unique(timestamps.astype('datetime64[D]'), return_inverse=True)
+        keys, currency_index = np.unique(currencies, return_inverse=True)
+        index = day_index * len(keys) + currency_index
+        sums = _group_sums(np, index, units, len(days) * len(keys))
+        for i in np.flatnonzero(np.bincount(index, minlength=len(sums))):
+            key = (days[i // len(keys)].item(), keys[i % len(keys)].item())
+            totals[key] = totals.get(key, 0) + Decimal(sums[i]).scaleb(-scale)
+    return totals
+
+
+def _columns(np, batches, names, amount, decimals):
+    """
+    The named columns of each batch as arrays, and its amounts as integers of 10 ** -scale.
+    """
+    for batch in batches:
+        if isinstance(batch, ColumnBatch):
+            kinds = dict(batch.schema)
+            columns = [batch._numpy_column(np, kinds[name], batch.column(name)) for name in names]
+            units, scale = _minor_units(np, batch.column(amount))
+            yield columns, units, scale
+        else:
+            units = np.round(np.nan_to_num(batch[amount]) * 10 ** decimals).astype(np.int64)
+            yield [batch[name] for name in names], units, decimals
+
+
+def _minor_units(np, values):
+    if not values:
+        return np.zeros(0, dtype=np.int64), 0
+    text = np.array(['0' if v in (None, '') else v for v in values])
+    negative = np.char.startswith(text, '-')
+    parts = np.char.partition(np.char.lstrip(text, '+-'), '.')
+    scale = int(np.char.str_len(parts[:, 2]).max())
+    digits = np.char.add(parts[:, 0], np.char.ljust(parts[:, 2], scale, '0'))
+    digits = np.where(digits == '', '0', digits)
+    if np.char.str_len(digits).max() > 18:
+        # Beyond int64: Python integers, slower but still exact.
+        units = np.array([int(d) for d in digits.tolist()], dtype=object)
+    else:
+        units = digits.astype(np.int64)
+    return np.where(negative, -units, units), scale
+
+
+def _group_sums(np, index, units, size):
+    if units.dtype != object and int(np.abs(units).max()) > np.iinfo(np.int64).max // len(units):
+        units = units.astype(object)
+    sums = np.zeros(size, dtype=units.dtype)
+    np.add.at(sums, index, units)
+    return sums.tolist()
@@ -0,0 +1,99 @@
+"""
+Uphold Python SDK - deadline budgets
+
+A deadline caps the time a call, or a whole operation made of several calls, may take:
+
+    with deadline(0.5):
+        card = api.get_card(card_id)
+
+    with deadline(5):
+        snapshot = api.get_portfolio_snapshot()
+
+Every request made within the block, including those the client sends from its own
+threads and tasks, only gets the time left: its timeouts are cut to fit, and it is not
+sent at all once the budget is spent. The caller then gets DeadlineExceeded, and the
+connection of the abandoned request is closed rather than left waiting. A nested
+deadline can only shorten the budget of the outer one.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import contextvars
+import time
+from contextlib import contextmanager
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, value):
+        self.value = value
+    def __str__(self):
+        return repr(self.value)
+
+
+# When the current budget runs out, in time.monotonic() seconds.
+_expires = contextvars.ContextVar('uphold_deadline', default=None)
+
+
+@contextmanager
+def deadline(seconds):
+    """
+    Runs the block within a budget of this many seconds. None leaves the current budget,
+    if any, as it is.
+    """
+    if seconds is None:
+        yield
+        return
+    expires = time.monotonic() + seconds
+    current = _expires.get()
+    if current is not None:
+        expires = min(expires, current)
+    token = _expires.set(expires)
+    try:
+        yield
+    finally:
+        _expires.reset(token)
+
+
+def time_left():
+    """
+    :rtype:
+      The seconds left in the current budget, or None without one.
+    """
+    expires = _expires.get()
+    return None if expires is None else expires - time.monotonic()
+
+
+def check(what):
+    """
+    Raises DeadlineExceeded(what) when the current budget is spent.
+
+    :rtype:
+      The seconds left, or None without a budget.
+    """
+    left = time_left()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(what)
+    return left
+
+
+def cap_timeout(timeout, left):
+    """
+    Cuts a timeout, a number or a (connect, read) tuple, down to the seconds left.
+    """
+    if left is None:
+        return timeout
+    connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+    return (left if connect is None else min(connect, left), left if read is None else min(read, left))
+
+
+def bind(fn):
+    """
+    Wraps fn so that it runs within the caller's budget from any thread, for work
+    handed to an executor.
+    """
+    context = contextvars.copy_context()
+
+    def call(*args, **kwargs):
+        # A context can only be entered by one thread at a time.
+        return context.copy().run(fn, *args, **kwargs)
+    return call
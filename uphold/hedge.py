@@ -0,0 +1,134 @@
+"""
+Uphold Python SDK - hedged requests
+
+A few slow connections set the tail latency of the calls that are otherwise fast, such
+as get_ticker() or get_card(). With a HedgePolicy, a GET that is still waiting once it
+has taken longer than most recent calls to the same endpoint is sent a second time,
+and whichever response comes first is used; the other is discarded.
+
+    api = Uphold(hedge=HedgePolicy(quantile=0.95, max_ratio=0.05))
+    rates = api.get_ticker('BTCUSD')
+    print(api.hedge.stats())
+
+Only GET requests are hedged, as sending them twice is harmless. Hedges are capped to a
+fraction of the requests, and stop while the rate limit reported by the API has less
+than min_remaining requests left.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import threading
+from collections import deque
+
+
+class HedgePolicy(object):
+    """
+    Learns the latency of each endpoint and decides when a request deserves a hedge.
+    One policy can be shared by several clients.
+    """
+
+    def __init__(self, quantile=0.95, window=200, min_samples=20, min_delay=0.005, max_ratio=0.05,
+                 min_remaining=10, max_workers=32):
+        """
+        :param Float quantile Hedge a request once it has been waiting longer than this
+          quantile of the recent latencies of its endpoint.
+
+        :param Integer window Number of recent latencies kept per endpoint.
+
+        :param Integer min_samples Latencies needed before an endpoint is hedged.
+
+        :param Float min_delay Never hedge sooner than this many seconds.
+
+        :param Float max_ratio Maximum hedges, as a fraction of the requests.
+
+        :param Integer min_remaining No hedges while the API reports fewer requests left
+          in the rate limit window.
+
+        :param Integer max_workers Threads sending the requests of synchronous clients.
+        """
+        self.quantile = quantile
+        self.window = window
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_ratio = max_ratio
+        self.min_remaining = min_remaining
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._latencies = {}
+        self._executor = None
+        self.requests = 0
+        self.hedged = 0
+        self.wins = 0
+        self.denied = 0
+
+    def delay(self, endpoint):
+        """
+        :rtype:
+          How long a request to this endpoint may wait before being hedged, or None
+          while too few of its latencies are known.
+        """
+        with self._lock:
+            self.requests += 1
+            latencies = self._latencies.get(endpoint)
+            if latencies is None or len(latencies) < self.min_samples:
+                return None
+            ordered = sorted(latencies)
+        return max(self.min_delay, ordered[min(len(ordered) - 1, int(self.quantile * len(ordered)))])
+
+    def record(self, endpoint, seconds):
+        with self._lock:
+            latencies = self._latencies.get(endpoint)
+            if latencies is None:
+                latencies = self._latencies[endpoint] = deque(maxlen=self.window)
+            latencies.append(seconds)
+
+    def allow(self, remaining):
+        """
+        Takes a hedge from the budget, if there is room for one.
+
+        :param String/Integer remaining The X-RateLimit-Remaining last reported by the API,
+          or '' when unknown.
+        """
+        try:
+            remaining = int(remaining)
+        except (TypeError, ValueError):
+            remaining = None
+        with self._lock:
+            if (remaining is not None and remaining < self.min_remaining) or \
+                    self.hedged + 1 > self.max_ratio * self.requests:
+                self.denied += 1
+                return False
+            self.hedged += 1
+            return True
+
+    def won(self):
+        with self._lock:
+            self.wins += 1
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats(self):
+        """
+        :rtype:
+          A hash of the requests seen, the hedges sent, allowed and denied, and how many
+          of them answered first.
+        """
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'hedged': self.hedged,
+                'wins': self.wins,
+                'denied': self.denied,
+                'endpoints': dict((endpoint, len(latencies)) for endpoint, latencies in self._latencies.items()),
+            }
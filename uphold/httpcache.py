@@ -0,0 +1,311 @@
+"""
+Uphold Python SDK - conditional request cache
+
+HTTPCache keeps the bodies of GET responses that carry an ETag or a Last-Modified
+header, and revalidates them with If-None-Match / If-Modified-Since on the next call.
+When the API answers 304 Not Modified, the object parsed the first time is returned
+again, so nothing is downloaded or decoded twice.
+
+    api = Uphold(http_cache=HTTPCache(MemoryStore(max_bytes=8 * 1024 * 1024)))
+
+Every request still reaches the API, which keeps checking the credentials; entries are
+also keyed by credential, so clients sharing a cache never see each other's data.
+POST requests (and the voucher redeem/revert calls) invalidate the resources they touch.
+
+Objects returned from the cache are shared between calls: treat them as read-only.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from . import jsonlib
+
+
+class CacheEntry(object):
+    """
+    A cached response: its validators, its body and, once decoded, the parsed body.
+    """
+
+    def __init__(self, etag=None, last_modified=None, body='', data=None, loads=jsonlib.loads):
+        """
+        :param Object data (optional) The body already decoded, with loads.
+        """
+        self.etag = etag
+        self.last_modified = last_modified
+        self.body = body
+        # (loads, parsed body), kept for the JSON backend that decoded it last.
+        self._decoded = (loads, data) if data is not None else None
+
+    @property
+    def data(self):
+        return self.decode(self._decoded[0] if self._decoded else jsonlib.loads)
+
+    def decode(self, loads=jsonlib.loads):
+        """
+        The parsed body, as decoded by loads. Clients with different JSON backends can
+        share a cache: the body is decoded again when the backend changes.
+        """
+        decoded = self._decoded
+        if decoded is None or decoded[0] is not loads:
+            decoded = self._decoded = (loads, loads(self.body))
+        return decoded[1]
+
+    @property
+    def size(self):
+        return len(self.body)
+
+    def validators(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def dumps(self):
+        return json.dumps({'etag': self.etag, 'last_modified': self.last_modified, 'body': self.body})
+
+    @classmethod
+    def loads(cls, text):
+        fields = json.loads(text)
+        return cls(fields.get('etag'), fields.get('last_modified'), fields.get('body', ''))
+
+
+class MemoryStore(object):
+    """
+    An in-process LRU store, evicting the least recently used entries once the cached
+    bodies add up to more than max_bytes.
+    """
+
+    def __init__(self, max_bytes=16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous.size
+            if entry.size > self.max_bytes:
+                return
+            self._entries[key] = entry
+            self.size += entry.size
+            while self.size > self.max_bytes:
+                key, evicted = self._entries.popitem(last=False)
+                self.size -= evicted.size
+
+    def delete(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.size -= entry.size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+class DiskStore(object):
+    """
+    Keeps one file per entry in a directory, so that the cache survives restarts and
+    can be shared by processes on the same machine. Parsed bodies are kept in memory for
+    the entries this process has read.
+    """
+
+    def __init__(self, path, memory=None):
+        """
+        :param String path The directory holding the entries, created if needed.
+
+        :param MemoryStore memory (optional) The in-process layer in front of the disk.
+        """
+        self.path = path
+        self.memory = memory if memory is not None else MemoryStore()
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def get(self, key):
+        try:
+            with io.open(self._file(key), 'r', encoding='utf-8') as f:
+                text = f.read()
+        except (IOError, OSError):
+            return None
+        try:
+            entry = CacheEntry.loads(text)
+        except ValueError:
+            return None
+        cached = self.memory.get(key)
+        if cached is not None and (cached.etag, cached.last_modified, cached.body) == \
+                (entry.etag, entry.last_modified, entry.body):
+            return cached
+        self.memory.set(key, entry)
+        return entry
+
+    def set(self, key, entry):
+        fd, temporary = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        with io.open(fd, 'w', encoding='utf-8') as f:
+            f.write(entry.dumps())
+        os.replace(temporary, self._file(key))
+        self.memory.set(key, entry)
+
+    def delete(self, key):
+        self.memory.delete(key)
+        try:
+            os.remove(self._file(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        self.memory.clear()
+        for name in os.listdir(self.path):
+            if name.endswith('.json'):
+                os.remove(os.path.join(self.path, name))
+
+    def _file(self, key):
+        return os.path.join(self.path, key + '.json')
+
+
+class RedisStore(object):
+    """
+    Keeps entries in Redis, or anything with the get/set/delete methods of a redis-py
+    client, so that the cache is shared by every process talking to it.
+    """
+
+    def __init__(self, client, prefix='uphold:http:', ttl=None, memory=None):
+        """
+        :param Redis client A redis.Redis (or compatible) client.
+
+        :param String prefix Prepended to every key.
+
+        :param Integer ttl (optional) Seconds after which Redis drops an entry.
+
+        :param MemoryStore memory (optional) The in-process layer keeping parsed bodies.
+        """
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.memory = memory if memory is not None else MemoryStore()
+
+    def get(self, key):
+        text = self.client.get(self.prefix + key)
+        if text is None:
+            return None
+        if isinstance(text, bytes):
+            text = text.decode('utf-8')
+        entry = CacheEntry.loads(text)
+        cached = self.memory.get(key)
+        if cached is not None and (cached.etag, cached.last_modified, cached.body) == \
+                (entry.etag, entry.last_modified, entry.body):
+            return cached
+        self.memory.set(key, entry)
+        return entry
+
+    def set(self, key, entry):
+        if self.ttl:
+            self.client.set(self.prefix + key, entry.dumps(), ex=self.ttl)
+        else:
+            self.client.set(self.prefix + key, entry.dumps())
+        self.memory.set(key, entry)
+
+    def delete(self, key):
+        self.memory.delete(key)
+        self.client.delete(self.prefix + key)
+
+
+class HTTPCache(object):
+    """
+    The conditional request logic shared by Uphold and AsyncUphold.
+    """
+
+    # GET endpoints that change state, handled like POSTs.
+    writes = ('/redeem', '/revert')
+
+    def __init__(self, store=None):
+        """
+        :param Store store (optional) Where entries are kept: MemoryStore (the default),
+          DiskStore, RedisStore or any object with get, set and delete methods.
+        """
+        self.store = store if store is not None else MemoryStore()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def is_write(self, method, uri):
+        return method != 'GET' or uri.endswith(self.writes)
+
+    def scope(self, *credentials):
+        """
+        Returns the key prefix of a set of credentials. Secrets only enter it hashed.
+        """
+        return hashlib.sha256('\0'.join(c or '' for c in credentials).encode('utf-8')).hexdigest()[:32]
+
+    def key(self, scope, uri):
+        return scope + '-' + hashlib.sha256(uri.encode('utf-8')).hexdigest()[:32]
+
+    def lookup(self, scope, uri):
+        return self.store.get(self.key(scope, uri))
+
+    def revalidated(self, entry, loads=jsonlib.loads):
+        """
+        :param Callable loads Decodes the body, see uphold.jsonlib.
+        """
+        with self._lock:
+            self.hits += 1
+        return entry.decode(loads)
+
+    def save(self, scope, uri, status, headers, body, loads=jsonlib.loads):
+        """
+        Decodes a response body, keeping it when the response carries validators.
+
+        :param Bytes body The response body.
+
+        :param Callable loads Decodes the body, see uphold.jsonlib.
+        """
+        data = loads(body)
+        with self._lock:
+            self.misses += 1
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if status == 200 and (etag or last_modified) and 'no-store' not in headers.get('Cache-Control', ''):
+            if isinstance(body, bytes):
+                body = body.decode('utf-8')
+            self.store.set(self.key(scope, uri), CacheEntry(etag, last_modified, body, data, loads))
+        return data
+
+    def invalidate(self, scope, uri):
+        """
+        Drops the cached resources a write to uri may have changed: the uri and every
+        path above it, plus the transaction history when a card is written to.
+        """
+        path = uri.split('?', 1)[0]
+        paths = set()
+        while path:
+            paths.add(path)
+            path = path.rsplit('/', 1)[0]
+        if uri.startswith('/me/cards'):
+            paths.add('/me/transactions')
+        for path in paths:
+            self.store.delete(self.key(scope, path))
+        with self._lock:
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'invalidations': self.invalidations}
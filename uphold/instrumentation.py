@@ -0,0 +1,339 @@
+"""
+Uphold Python SDK - request instrumentation
+
+Hooks that see every HTTP request the SDK makes, with latency histograms per endpoint
+and exporters for Prometheus and OpenTelemetry.
+
+    metrics = RequestMetrics()
+    api = Uphold(instrumentation=Instrumentation(metrics, OpenTelemetryHook()))
+    ...
+    print(metrics.quantile(0.99, 'GET', '/me/cards/{card}/transactions'))
+    print(metrics.prometheus())
+
+A hook is any object with a before_request(info) and/or an after_request(info) method.
+Both receive the RequestInfo of the request; after_request is called once the response
+headers (and, unless streaming, the body) have arrived, or the request failed.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import bisect
+import re
+import threading
+import time
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+# The paths requested by the SDK, used to group requests whatever ids they contain.
+ENDPOINTS = (
+    '/me',
+    '/me/tokens',
+    '/me/contacts',
+    '/me/contacts/{contact}',
+    '/me/cards',
+    '/me/cards/{card}',
+    '/me/cards/{card}/transactions',
+    '/me/cards/{card}/transactions/{transaction}/commit',
+    '/me/cards/{card}/transactions/{transaction}/cancel',
+    '/me/cards/{card}/transactions/{transaction}/resend',
+    '/me/phones',
+    '/me/transactions',
+    '/reserve/statistics',
+    '/reserve/ledger',
+    '/reserve/transactions',
+    '/reserve/transactions/{transaction}',
+    '/ticker',
+    '/ticker/{pair}',
+    '/vouchers',
+    '/vouchers/{voucher}',
+    '/vouchers/{voucher}/redeem',
+    '/vouchers/{voucher}/revert',
+)
+
+_ENDPOINT_PATTERNS = [(re.compile('^' + re.sub(r'\\{\w+\\}', '[^/]+', re.escape(e)) + '$'), e) for e in ENDPOINTS]
+
+# Upper bounds in seconds, as used by Prometheus client libraries.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def endpoint_template(uri):
+    """
+    Returns the template of a request path, such as /me/cards/{card}/transactions.
+    Paths the SDK doesn't know are returned without their query string.
+    """
+    path = uri.split('?', 1)[0]
+    for pattern, template in _ENDPOINT_PATTERNS:
+        if pattern.match(path):
+            return template
+    return path
+
+
+class RequestInfo(object):
+    """
+    What is known about one HTTP request. Retries of a rate limited request are
+    separate requests with increasing attempt numbers.
+
+    Timings are in seconds. dns, connect and tls are only set when the request opened a
+    new connection, and stay None when it reused a pooled one or when the transport can't
+    tell them apart: with Uphold, connect includes the DNS lookup; with AsyncUphold and
+    UrllibTransport, connect includes the TLS handshake. total runs until the body arrived, or only the
+    headers when streaming.
+    """
+
+    def __init__(self, method, uri, url, attempt=0):
+        self.method = method
+        self.uri = uri
+        self.url = url
+        self.endpoint = endpoint_template(uri)
+        self.attempt = attempt
+        self.started = time.time()
+        self.status = None
+        self.bytes = None
+        self.error = None
+        self.dns = None
+        self.connect = None
+        self.tls = None
+        self.total = None
+        self.rate_limit = None
+        self.rate_limit_remaining = None
+        # Per-request scratch space for hooks, such as the span opened in before_request.
+        self.context = {}
+        self._clock = time.perf_counter()
+
+    def finish(self, status=None, headers=None, bytes=None, error=None, timings=None):
+        self.total = time.perf_counter() - self._clock
+        self.status = status
+        self.bytes = bytes
+        self.error = error
+        for name, value in (timings or {}).items():
+            setattr(self, name, value)
+        headers = headers or {}
+        try:
+            if 'X-RateLimit-Limit' in headers:
+                self.rate_limit = int(headers['X-RateLimit-Limit'])
+            if 'X-RateLimit-Remaining' in headers:
+                self.rate_limit_remaining = int(headers['X-RateLimit-Remaining'])
+        except ValueError:
+            pass
+
+    def __repr__(self):
+        return '<RequestInfo {} {} status={} total={}>'.format(self.method, self.endpoint, self.status, self.total)
+
+
+class Instrumentation(object):
+    """
+    Dispatches each request to the registered hooks. One Instrumentation can be shared
+    by several clients.
+    """
+
+    def __init__(self, *hooks):
+        self.hooks = list(hooks)
+
+    def add(self, hook):
+        self.hooks.append(hook)
+        return hook
+
+    def request_started(self, method, uri, url, attempt=0):
+        info = RequestInfo(method, uri, url, attempt)
+        for hook in self.hooks:
+            before = getattr(hook, 'before_request', None)
+            if before is not None:
+                before(info)
+        return info
+
+    def request_finished(self, info, **result):
+        info.finish(**result)
+        for hook in self.hooks:
+            after = getattr(hook, 'after_request', None)
+            if after is not None:
+                after(info)
+        return info
+
+
+class LatencyHistogram(object):
+    """
+    A cumulative histogram of latencies, in the layout Prometheus expects.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+
+    def cumulative(self):
+        """
+        :rtype:
+          A list of (upper bound, count of observations at or below it), ending with
+          float('inf').
+        """
+        with self._lock:
+            counts = list(self.counts)
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def quantile(self, q):
+        """
+        Estimates a quantile by linear interpolation within its bucket.
+
+        :rtype:
+          The estimate in seconds, or None without observations. Quantiles falling in
+          the last, unbounded bucket are reported as the largest finite bound.
+        """
+        cumulative = self.cumulative()
+        count = cumulative[-1][1]
+        if not count:
+            return None
+        rank = q * count
+        lower, below = 0.0, 0
+        for bound, total in cumulative:
+            if total >= rank:
+                if bound == float('inf'):
+                    return self.buckets[-1] if self.buckets else None
+                return lower + (bound - lower) * (rank - below) / max(1, total - below)
+            lower, below = bound, total
+        return lower
+
+
+class RequestMetrics(object):
+    """
+    An instrumentation hook keeping, per method and endpoint, a latency histogram and
+    request counts by status, plus the rate limit headroom last reported by the API.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, prefix='uphold'):
+        self.buckets = buckets
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.requests = {}
+        self.bytes = {}
+        self.rate_limit = None
+        self.rate_limit_remaining = None
+
+    def after_request(self, info):
+        key = (info.method, info.endpoint)
+        status = str(info.status) if info.status is not None else 'error'
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = LatencyHistogram(self.buckets)
+            self.requests[key + (status,)] = self.requests.get(key + (status,), 0) + 1
+            if info.bytes:
+                self.bytes[key] = self.bytes.get(key, 0) + info.bytes
+            if info.rate_limit_remaining is not None:
+                self.rate_limit = info.rate_limit
+                self.rate_limit_remaining = info.rate_limit_remaining
+        histogram.observe(info.total)
+
+    def histogram(self, method, endpoint):
+        with self._lock:
+            return self.histograms.get((method, endpoint))
+
+    def quantile(self, q, method, endpoint):
+        histogram = self.histogram(method, endpoint)
+        return histogram.quantile(q) if histogram is not None else None
+
+    def slowest(self, q=0.99):
+        """
+        :rtype:
+          A list of ((method, endpoint), estimated quantile), slowest first.
+        """
+        with self._lock:
+            histograms = list(self.histograms.items())
+        return sorted(((key, h.quantile(q)) for key, h in histograms), key=lambda item: -(item[1] or 0))
+
+    def prometheus(self):
+        """
+        Renders the metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            requests = sorted(self.requests.items())
+            sizes = sorted(self.bytes.items())
+            remaining = self.rate_limit_remaining
+        name = self.prefix + '_request_duration_seconds'
+        lines = ['# HELP {} Latency of Uphold API requests.'.format(name), '# TYPE {} histogram'.format(name)]
+        for (method, endpoint), histogram in histograms:
+            labels = _labels(method=method, endpoint=endpoint)
+            for bound, count in histogram.cumulative():
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                lines.append('{}_bucket{{{},le="{}"}} {}'.format(name, labels, le, count))
+            lines.append('{}_sum{{{}}} {!r}'.format(name, labels, histogram.sum))
+            lines.append('{}_count{{{}}} {}'.format(name, labels, histogram.count))
+        name = self.prefix + '_requests_total'
+        lines += ['# HELP {} Uphold API requests by status.'.format(name), '# TYPE {} counter'.format(name)]
+        for (method, endpoint, status), count in requests:
+            lines.append('{}{{{}}} {}'.format(name, _labels(method=method, endpoint=endpoint, status=status), count))
+        name = self.prefix + '_response_bytes_total'
+        lines += ['# HELP {} Bytes received from the Uphold API.'.format(name), '# TYPE {} counter'.format(name)]
+        for (method, endpoint), size in sizes:
+            lines.append('{}{{{}}} {}'.format(name, _labels(method=method, endpoint=endpoint), size))
+        if remaining is not None:
+            name = self.prefix + '_rate_limit_remaining'
+            lines += ['# HELP {} Requests left in the current rate limit window.'.format(name),
+                      '# TYPE {} gauge'.format(name), '{} {}'.format(name, remaining)]
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(**labels):
+    return ','.join('{}="{}"'.format(k, v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                    for k, v in sorted(labels.items()))
+
+
+class OpenTelemetryHook(object):
+    """
+    An instrumentation hook recording a client span per request.
+
+    :param Tracer tracer (optional) Defaults to the tracer of the globally configured
+      OpenTelemetry provider.
+    """
+
+    def __init__(self, tracer=None):
+        if tracer is None:
+            if otel_trace is None:
+                raise ImportError('OpenTelemetryHook requires opentelemetry-api: pip install opentelemetry-api')
+            tracer = otel_trace.get_tracer('uphold')
+        self.tracer = tracer
+
+    def before_request(self, info):
+        options = {'attributes': {
+            'http.request.method': info.method,
+            'http.route': info.endpoint,
+            'url.full': info.url,
+            'uphold.attempt': info.attempt,
+        }}
+        if otel_trace is not None:
+            options['kind'] = otel_trace.SpanKind.CLIENT
+        info.context['span'] = self.tracer.start_span('{} {}'.format(info.method, info.endpoint), **options)
+
+    def after_request(self, info):
+        span = info.context.pop('span', None)
+        if span is None:
+            return
+        if info.status is not None:
+            span.set_attribute('http.response.status_code', info.status)
+        for name in ('bytes', 'dns', 'connect', 'tls', 'rate_limit_remaining'):
+            value = getattr(info, name)
+            if value is not None:
+                span.set_attribute('uphold.' + name, value)
+        if info.error is not None:
+            span.record_exception(info.error)
+        if info.error is not None or (info.status or 0) >= 500:
+            if otel_trace is not None:
+                span.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR))
+        span.end()
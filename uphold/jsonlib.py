@@ -0,0 +1,92 @@
+"""
+Uphold Python SDK - JSON decoding
+
+Response bodies are decoded straight from the bytes received, with the fastest JSON
+library installed: orjson, then ujson, then the standard library.
+
+    api = Uphold()                          # the fastest available
+    api = Uphold(json_backend='json')       # the standard library, whatever is installed
+
+Uphold sends amounts and rates as strings, which every backend returns untouched, so
+they never go through float: Decimal(txn['origin']['amount']), or the model objects of
+uphold.models, get them exactly. The backends only differ on numbers written with a
+fraction or an exponent, which they decode as float, except 'decimal': the standard
+library with such numbers decoded as Decimal.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import json
+from decimal import Decimal
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+class JSONBackend(object):
+    """
+    A JSON library, decoding documents from bytes or strings.
+    """
+
+    def __init__(self, name, loads):
+        self.name = name
+        self.loads = loads
+
+    def __repr__(self):
+        return '<JSONBackend {}>'.format(self.name)
+
+
+_decimal_decoder = json.JSONDecoder(parse_float=Decimal)
+
+
+def _decimal_loads(data):
+    if isinstance(data, bytes):
+        data = data.decode('utf-8')
+    return _decimal_decoder.decode(data)
+
+
+# json.loads() accepts bytes, and finds out their encoding itself.
+BACKENDS = {
+    'json': JSONBackend('json', json.loads),
+    'decimal': JSONBackend('decimal', _decimal_loads),
+}
+if ujson is not None:
+    BACKENDS['ujson'] = JSONBackend('ujson', ujson.loads)
+if orjson is not None:
+    BACKENDS['orjson'] = JSONBackend('orjson', orjson.loads)
+
+# From the fastest.
+PREFERENCE = ('orjson', 'ujson', 'json')
+
+
+def get_backend(backend=None):
+    """
+    :param String/JSONBackend backend (optional) The name of a library, or a backend.
+      Defaults to the fastest one installed.
+
+    :rtype:
+      A JSONBackend
+    """
+    if isinstance(backend, JSONBackend):
+        return backend
+    if backend is None:
+        return BACKENDS[next(name for name in PREFERENCE if name in BACKENDS)]
+    if backend not in BACKENDS:
+        if backend in PREFERENCE:
+            raise ImportError('The {0} JSON backend is not installed: pip install {0}'.format(backend))
+        raise ValueError('Unknown JSON backend: {}'.format(backend))
+    return BACKENDS[backend]
+
+
+def loads(data):
+    """
+    Decodes a document with the default backend.
+    """
+    return get_backend().loads(data)
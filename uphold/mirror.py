@@ -0,0 +1,265 @@
+"""
+Uphold Python SDK - local Reservechain mirror
+
+ReserveMirror keeps a copy of the Reservechain and of the reserve ledger in a SQLite
+database. The first sync downloads everything. Later syncs only fetch the entries
+added since the previous one, and queries are answered from disk.
+
+    mirror = ReserveMirror('reserve.db')
+    mirror.sync(api)
+    for txn in mirror.transactions(since='2015-06-01', currency='BTC'):
+        ...
+
+The API lists both collections newest first, which is what lets a sync stop as soon
+as it reaches entries it already has.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import hashlib
+import json
+import sqlite3
+import threading
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS reserve_transactions (
+    id TEXT PRIMARY KEY,
+    created_at TEXT,
+    type TEXT,
+    status TEXT,
+    currency TEXT,
+    origin_currency TEXT,
+    destination_currency TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reserve_transactions_created_at ON reserve_transactions (created_at);
+CREATE INDEX IF NOT EXISTS reserve_transactions_type ON reserve_transactions (type);
+CREATE INDEX IF NOT EXISTS reserve_transactions_currency ON reserve_transactions (currency);
+CREATE INDEX IF NOT EXISTS reserve_transactions_origin_currency ON reserve_transactions (origin_currency);
+CREATE INDEX IF NOT EXISTS reserve_transactions_destination_currency ON reserve_transactions (destination_currency);
+
+CREATE TABLE IF NOT EXISTS reserve_ledger (
+    key TEXT PRIMARY KEY,
+    transaction_id TEXT,
+    created_at TEXT,
+    type TEXT,
+    currency TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reserve_ledger_created_at ON reserve_ledger (created_at);
+CREATE INDEX IF NOT EXISTS reserve_ledger_type ON reserve_ledger (type);
+CREATE INDEX IF NOT EXISTS reserve_ledger_currency ON reserve_ledger (currency);
+CREATE INDEX IF NOT EXISTS reserve_ledger_transaction_id ON reserve_ledger (transaction_id);
+
+CREATE TABLE IF NOT EXISTS checkpoints (
+    name TEXT PRIMARY KEY,
+    newest TEXT,
+    complete INTEGER NOT NULL DEFAULT 0
+);
+'''
+
+
+class ReserveMirror(object):
+    """
+    A SQLite copy of the Reservechain and reserve ledger, kept up to date incrementally.
+    The mirror can be used from several threads.
+    """
+
+    def __init__(self, path, page_size=50):
+        """
+        :param String path The SQLite database file (':memory:' for a throwaway mirror).
+
+        :param Integer page_size The number of entries requested per page when syncing.
+        """
+        self.path = path
+        self.page_size = page_size
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        if path != ':memory:':
+            self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def sync(self, api):
+        """
+        Brings both the Reservechain and the ledger up to date.
+
+        :rtype:
+          A hash with the number of new transactions and ledger entries.
+        """
+        return {
+            'transactions': self.sync_chain(api),
+            'ledger': self.sync_ledger(api),
+        }
+
+    def sync_chain(self, api):
+        """
+        Fetches the Reservechain transactions added since the last sync.
+
+        :rtype:
+          The number of new transactions stored.
+        """
+        return self._sync('transactions', api.iter_reserve_chain(self.page_size), self._store_transactions)
+
+    def sync_ledger(self, api):
+        """
+        Fetches the ledger entries added since the last sync.
+
+        :rtype:
+          The number of new entries stored.
+        """
+        return self._sync('ledger', api.iter_reserve_ledger(self.page_size), self._store_ledger)
+
+    def transaction(self, id):
+        """
+        Returns a stored Reservechain transaction, or None.
+        """
+        with self._lock:
+            row = self._db.execute('SELECT data FROM reserve_transactions WHERE id = ?', (id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def store_transaction(self, transaction):
+        """
+        Stores a single Reservechain transaction, for instance one fetched on its own.
+        """
+        with self._lock, self._db:
+            self._store_transactions([transaction])
+
+    def transactions(self, since=None, until=None, currency=None, type=None, status=None):
+        """
+        Queries the stored Reservechain, newest first.
+
+        :param String since (optional) Only transactions created at or after this ISO 8601 time.
+
+        :param String until (optional) Only transactions created before this ISO 8601 time.
+
+        :param String currency (optional) Only transactions involving this currency, as
+          denomination, origin or destination.
+
+        :param String type (optional) Only transactions of this type.
+
+        :param String status (optional) Only transactions with this status.
+
+        :rtype:
+          A list of transactions.
+        """
+        clauses, args = self._range(since, until)
+        if currency:
+            clauses.append('(currency = ? OR origin_currency = ? OR destination_currency = ?)')
+            args.extend([currency] * 3)
+        if type:
+            clauses.append('type = ?')
+            args.append(type)
+        if status:
+            clauses.append('status = ?')
+            args.append(status)
+        return self._query('reserve_transactions', clauses, args)
+
+    def ledger(self, since=None, until=None, currency=None, type=None, transaction=None):
+        """
+        Queries the stored ledger, newest first.
+
+        :param String transaction (optional) Only the entries of this transaction id.
+
+        :rtype:
+          A list of ledger entries.
+        """
+        clauses, args = self._range(since, until)
+        if currency:
+            clauses.append('currency = ?')
+            args.append(currency)
+        if type:
+            clauses.append('type = ?')
+            args.append(type)
+        if transaction:
+            clauses.append('transaction_id = ?')
+            args.append(transaction)
+        return self._query('reserve_ledger', clauses, args)
+
+    """
+    HELPER FUNCTIONS
+    """
+    def _sync(self, name, entries, store):
+        with self._lock:
+            row = self._db.execute('SELECT newest, complete FROM checkpoints WHERE name = ?', (name,)).fetchone()
+        newest, complete = row if row else (None, 0)
+        added = 0
+        first = None
+        page = []
+        try:
+            for entry in entries:
+                created_at = entry.get('createdAt')
+                if first is None:
+                    first = created_at
+                # Once a full download has completed, everything older than its newest
+                # entry is already stored. Until then, keep walking and skip known entries.
+                if complete and newest and created_at and created_at < newest:
+                    break
+                page.append(entry)
+                if len(page) >= self.page_size:
+                    added += self._store_page(store, page)
+                    page = []
+        finally:
+            entries.close()
+        added += self._store_page(store, page)
+        with self._lock, self._db:
+            self._db.execute('INSERT OR REPLACE INTO checkpoints (name, newest, complete) VALUES (?, ?, 1)',
+                             (name, max(first or '', newest or '') or None))
+        return added
+
+    def _store_page(self, store, page):
+        if not page:
+            return 0
+        with self._lock, self._db:
+            before = self._db.total_changes
+            store(page)
+            return self._db.total_changes - before
+
+    def _store_transactions(self, transactions):
+        rows = [(t.get('createdAt'), t.get('type'), t.get('status'),
+                 (t.get('denomination') or {}).get('currency'),
+                 (t.get('origin') or {}).get('currency'),
+                 (t.get('destination') or {}).get('currency'),
+                 json.dumps(t), t['id']) for t in transactions if 'id' in t]
+        # A transaction stored while pending is updated as its status moves on; rows
+        # left unchanged don't count as changes.
+        self._db.executemany(
+            'UPDATE reserve_transactions SET created_at = ?, type = ?, status = ?, currency = ?, '
+            'origin_currency = ?, destination_currency = ?, data = ?7 WHERE id = ?8 AND data != ?7', rows)
+        self._db.executemany(
+            'INSERT OR IGNORE INTO reserve_transactions '
+            '(created_at, type, status, currency, origin_currency, destination_currency, data, id) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def _store_ledger(self, entries):
+        rows = []
+        for entry in entries:
+            data = json.dumps(entry, sort_keys=True)
+            movement = entry.get('in') or entry.get('out') or {}
+            rows.append((hashlib.sha1(data.encode('utf-8')).hexdigest(), entry.get('TransactionId'),
+                         entry.get('createdAt'), entry.get('type'), movement.get('currency'), data))
+        self._db.executemany(
+            'INSERT OR IGNORE INTO reserve_ledger (key, transaction_id, created_at, type, currency, data) '
+            'VALUES (?, ?, ?, ?, ?, ?)', rows)
+
+    def _range(self, since, until):
+        clauses, args = [], []
+        if since:
+            clauses.append('created_at >= ?')
+            args.append(since)
+        if until:
+            clauses.append('created_at < ?')
+            args.append(until)
+        return clauses, args
+
+    def _query(self, table, clauses, args):
+        sql = 'SELECT data FROM ' + table
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += ' ORDER BY created_at DESC'
+        with self._lock:
+            rows = self._db.execute(sql, args).fetchall()
+        return [json.loads(row[0]) for row in rows]
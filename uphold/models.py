@@ -0,0 +1,329 @@
+"""
+Uphold Python SDK - model objects
+
+Optional, compact alternatives to the hashes returned by the API. Models keep the
+values exactly as received, use __slots__ instead of a per-object dict, and only parse
+amounts (into Decimal) and timestamps (into datetime) the first time they are read.
+
+    txns = Transaction.from_json(response_bytes)
+    txns[0].origin.amount        # Decimal('0.1'), parsed once then cached
+    txns[0]['origin']['amount']  # '0.1', as in the original hash
+    txns[0].to_dict()            # the original hash
+
+Models also wrap the iterators of the SDK:
+
+    for txn in Transaction.wrap(api.iter_transactions()):
+        ...
+"""
+
+from __future__ import print_function, unicode_literals
+
+from datetime import datetime, timedelta, tzinfo
+from decimal import Decimal
+
+from . import jsonlib
+
+
+class _Sentinel(object):
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+    def __reduce__(self):
+        # Unpickle to the module's own instance, models test for it by identity.
+        return '_' + self.name
+
+_MISSING = _Sentinel('MISSING')
+_UNPARSED = _Sentinel('UNPARSED')
+
+
+class _UTC(tzinfo):
+    def utcoffset(self, dt):
+        return timedelta(0)
+
+    def tzname(self, dt):
+        return 'UTC'
+
+    def dst(self, dt):
+        return timedelta(0)
+
+UTC = _UTC()
+
+
+def parse_timestamp(value):
+    """
+    Parses the ISO 8601 timestamps used by the API, such as 2014-08-27T00:01:11.616Z.
+    """
+    for layout in ('%Y-%m-%dT%H:%M:%S.%fZ', '%Y-%m-%dT%H:%M:%SZ'):
+        try:
+            return datetime.strptime(value, layout).replace(tzinfo=UTC)
+        except ValueError:
+            pass
+    raise ValueError('Unsupported timestamp: {!r}'.format(value))
+
+
+class _Field(object):
+    """
+    Exposes a field of a model. The raw value lives in one slot and, for parsed fields,
+    the parsed value is cached in another.
+    """
+
+    def __init__(self, key, raw, cache=None, parse=None):
+        self.key = key
+        self.raw = raw
+        self.cache = cache
+        self.parse = parse
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self
+        value = getattr(obj, self.raw)
+        if value is _MISSING:
+            return None
+        if self.parse is None or value is None:
+            return value
+        parsed = getattr(obj, self.cache)
+        if parsed is _UNPARSED:
+            parsed = self.parse(value)
+            setattr(obj, self.cache, parsed)
+        return parsed
+
+
+def _slots(fields):
+    slots = ['_extra']
+    for key, attr, kind in fields:
+        slots.append('_' + attr)
+        if kind in (Decimal, datetime):
+            slots.append('_' + attr + '_parsed')
+    return tuple(slots)
+
+
+class Model(object):
+    """
+    Base class of the models. Subclasses list their fields in _fields as tuples of
+    (key in the API payload, attribute name, kind), where kind is None for values kept
+    as they are, Decimal or datetime for lazily parsed values, or a Model subclass for
+    nested objects. Keys not listed are kept aside and returned by to_dict().
+    """
+
+    __slots__ = ()
+    _fields = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super(Model, cls).__init_subclass__(**kwargs)
+        cls._by_key = {}
+        for key, attr, kind in cls._fields:
+            if kind is Decimal:
+                field = _Field(key, '_' + attr, '_' + attr + '_parsed', Decimal)
+            elif kind is datetime:
+                field = _Field(key, '_' + attr, '_' + attr + '_parsed', parse_timestamp)
+            else:
+                field = _Field(key, '_' + attr)
+            setattr(cls, attr, field)
+            cls._by_key[key] = (field, kind)
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Builds a model from a hash returned by the API.
+        """
+        obj = cls.__new__(cls)
+        extra = None
+        for key, attr, kind in cls._fields:
+            value = data.get(key, _MISSING)
+            if isinstance(kind, type) and issubclass(kind, Model) and isinstance(value, dict):
+                value = kind.from_dict(value)
+            setattr(obj, '_' + attr, value)
+            if kind in (Decimal, datetime):
+                setattr(obj, '_' + attr + '_parsed', _UNPARSED)
+        for key in data:
+            if key not in cls._by_key:
+                if extra is None:
+                    extra = {}
+                extra[key] = data[key]
+        obj._extra = extra
+        return obj
+
+    @classmethod
+    def from_json(cls, data):
+        """
+        Builds models straight from a response body.
+
+        :param Bytes/String data A JSON object or array.
+
+        :rtype:
+          A model, or a list of models for an array.
+        """
+        value = jsonlib.loads(data)
+        if isinstance(value, list):
+            return [cls.from_dict(item) for item in value]
+        return cls.from_dict(value)
+
+    @classmethod
+    def wrap(cls, items):
+        """
+        Wraps an iterable of hashes, such as the iter_* methods of the client.
+
+        :rtype:
+          An iterator over models.
+        """
+        for item in items:
+            yield cls.from_dict(item)
+
+    def to_dict(self):
+        """
+        Returns the hash this model was built from.
+        """
+        data = {}
+        for key, attr, kind in self._fields:
+            value = getattr(self, '_' + attr)
+            if value is _MISSING:
+                continue
+            if isinstance(value, Model):
+                value = value.to_dict()
+            data[key] = value
+        if self._extra:
+            data.update(self._extra)
+        return data
+
+    def __getitem__(self, key):
+        # Hash-style access returns raw values, as the SDK's methods do.
+        if key in self._by_key:
+            value = getattr(self, self._by_key[key][0].raw)
+            if value is _MISSING:
+                raise KeyError(key)
+            return value
+        if self._extra and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __eq__(self, other):
+        if isinstance(other, Model):
+            return type(self) is type(other) and self.to_dict() == other.to_dict()
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, self.to_dict())
+
+
+class Denomination(Model):
+    _fields = (
+        ('amount', 'amount', Decimal),
+        ('currency', 'currency', None),
+        ('pair', 'pair', None),
+        ('rate', 'rate', Decimal),
+    )
+    __slots__ = _slots(_fields)
+
+
+class Party(Model):
+    """
+    The origin or destination of a transaction.
+    """
+    _fields = (
+        ('CardId', 'card_id', None),
+        ('amount', 'amount', Decimal),
+        ('base', 'base', Decimal),
+        ('commission', 'commission', Decimal),
+        ('fee', 'fee', Decimal),
+        ('rate', 'rate', Decimal),
+        ('currency', 'currency', None),
+        ('description', 'description', None),
+        ('type', 'type', None),
+        ('username', 'username', None),
+    )
+    __slots__ = _slots(_fields)
+
+
+class Transaction(Model):
+    _fields = (
+        ('id', 'id', None),
+        ('type', 'type', None),
+        ('message', 'message', None),
+        ('status', 'status', None),
+        ('RefundedById', 'refunded_by_id', None),
+        ('createdAt', 'created_at', datetime),
+        ('denomination', 'denomination', Denomination),
+        ('origin', 'origin', Party),
+        ('destination', 'destination', Party),
+        ('params', 'params', None),
+    )
+    __slots__ = _slots(_fields)
+
+
+class Card(Model):
+    _fields = (
+        ('id', 'id', None),
+        ('label', 'label', None),
+        ('currency', 'currency', None),
+        ('available', 'available', Decimal),
+        ('balance', 'balance', Decimal),
+        ('lastTransactionAt', 'last_transaction_at', datetime),
+        ('address', 'address', None),
+        ('settings', 'settings', None),
+    )
+    __slots__ = _slots(_fields)
+
+
+class Contact(Model):
+    _fields = (
+        ('id', 'id', None),
+        ('firstName', 'first_name', None),
+        ('lastName', 'last_name', None),
+        ('company', 'company', None),
+        ('name', 'name', None),
+        ('emails', 'emails', None),
+        ('addresses', 'addresses', None),
+    )
+    __slots__ = _slots(_fields)
+
+
+class Rate(Model):
+    """
+    A row of the ticker.
+    """
+    _fields = (
+        ('pair', 'pair', None),
+        ('currency', 'currency', None),
+        ('ask', 'ask', Decimal),
+        ('bid', 'bid', Decimal),
+    )
+    __slots__ = _slots(_fields)
+
+
+class Movement(Model):
+    """
+    The amount entering or leaving the reserve in a ledger entry.
+    """
+    _fields = (
+        ('amount', 'amount', Decimal),
+        ('currency', 'currency', None),
+    )
+    __slots__ = _slots(_fields)
+
+
+class LedgerEntry(Model):
+    _fields = (
+        ('type', 'type', None),
+        ('TransactionId', 'transaction_id', None),
+        ('createdAt', 'created_at', datetime),
+        ('in', 'in_', Movement),
+        ('out', 'out', Movement),
+    )
+    __slots__ = _slots(_fields)
@@ -0,0 +1,72 @@
+"""
+Uphold Python SDK - request coalescing and the completed transaction cache
+
+Concurrent identical requests share a single trip to the API through
+uphold.cache.SingleFlight: the first caller sends it, the others wait for its result.
+TransactionCache keeps the Reservechain transactions that reached a final status, which
+never change again, so looking them up a second time needs no request at all.
+
+    api = Uphold(transaction_cache=TransactionCache(max_entries=100000))
+    transactions = api.get_reserve_transactions_many(ids)
+
+Objects returned from the cache, or shared between coalesced callers, are the same
+hash for everyone: treat them as read-only.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import threading
+from collections import OrderedDict
+
+# Statuses after which a transaction no longer changes.
+TERMINAL_STATUSES = ('completed', 'cancelled', 'failed')
+
+
+class TransactionCache(object):
+    """
+    A bounded LRU of transactions in a terminal status, keyed by id. Transactions still
+    pending are never stored, so what the cache returns is always current.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, id):
+        with self._lock:
+            transaction = self._entries.get(id)
+            if transaction is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(id)
+            self.hits += 1
+            return transaction
+
+    def put(self, transaction):
+        """
+        Stores a transaction if it reached a terminal status.
+
+        :rtype:
+          Whether it was stored.
+        """
+        if not isinstance(transaction, dict) or transaction.get('status') not in TERMINAL_STATUSES:
+            return False
+        id = transaction.get('id')
+        if id is None:
+            return False
+        with self._lock:
+            self._entries[id] = transaction
+            self._entries.move_to_end(id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return True
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,289 @@
+"""
+Uphold Python SDK - warm quote pool
+
+A transfer normally takes two round trips: prepare_txn() for a quote, then
+execute_txn(). QuotePool keeps quotes prepared in advance for the transfers an
+application makes over and over, renewing them before they expire, so that such a
+transfer only waits for execute_txn().
+
+    quotes = QuotePool(api, max_rate=0.5)
+    quotes.warm(card, 'payroll@example.com', Decimal('25.00'), 'USD')
+    quotes.start()
+    ...
+    transaction = quotes.send(card, 'payroll@example.com', Decimal('25.00'), 'USD')
+    ...
+    quotes.close()
+
+A quote is bound to its card, destination, amount and currency, so only a transfer
+matching all four can use it; the others are prepared and executed as usual. With
+learn_after, combinations sent that many times become warm on their own. Quotes the
+pool no longer needs are cancelled.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+
+
+class _Quote(object):
+    __slots__ = ('id', 'prepared_at')
+
+    def __init__(self, id, prepared_at):
+        self.id = id
+        self.prepared_at = prepared_at
+
+
+class QuotePool(object):
+    """
+    Keeps one quote ready for each warm (card, destination, amount, currency).
+    """
+
+    # Error codes returned when committing a quote that is no longer valid.
+    expired_codes = ('not_found', 'transaction_expired')
+
+    def __init__(self, api, quote_ttl=30.0, refresh_margin=5.0, max_rate=1.0, max_quotes=50, learn_after=0,
+                 interval=1.0, clock=time.time):
+        """
+        :param Uphold api The client used to prepare, execute and cancel transactions.
+
+        :param Float quote_ttl How long a prepared transaction stays valid, in seconds.
+
+        :param Float refresh_margin Quotes with less than this many seconds left are
+          replaced, and never used.
+
+        :param Float max_rate Maximum quotes prepared per second by the pool, so that
+          keeping them warm leaves room in the rate limit for everything else. 0 for no
+          limit.
+
+        :param Integer max_quotes Maximum number of warm combinations. Beyond it, the
+          least recently used one is dropped.
+
+        :param Integer learn_after Warm up the combinations sent this many times. 0
+          leaves it to warm().
+
+        :param Float interval Seconds between two refreshes of the background thread.
+        """
+        self.api = api
+        self.quote_ttl = quote_ttl
+        self.refresh_margin = refresh_margin
+        self.max_rate = max_rate
+        self.max_quotes = max_quotes
+        self.learn_after = learn_after
+        self.interval = interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        # Warm combinations, least recently used first, with their quote or None.
+        self._warm = OrderedDict()
+        self._sends = {}
+        self._next_prepare = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        self.hits = 0
+        self.misses = 0
+        self.prepared = 0
+        self.cancelled = 0
+        self.expired = 0
+        self.prepare_latency = None
+
+    def warm(self, card, to, amount, denom):
+        """
+        Keeps a quote ready for this transfer. It is prepared by the next refresh.
+        """
+        key = self._key(card, to, amount, denom)
+        dropped = []
+        with self._lock:
+            if key in self._warm:
+                self._warm.move_to_end(key)
+                return
+            self._warm[key] = None
+            while len(self._warm) > self.max_quotes:
+                dropped.append(self._warm.popitem(last=False))
+        for old_key, quote in dropped:
+            self._cancel(old_key, quote)
+
+    def unwarm(self, card, to, amount, denom):
+        """
+        Stops keeping a quote ready for this transfer, and cancels the one prepared.
+        """
+        key = self._key(card, to, amount, denom)
+        with self._lock:
+            quote = self._warm.pop(key, None)
+        self._cancel(key, quote)
+
+    def send(self, card, to, amount, denom, message=''):
+        """
+        Makes a transfer, with a warm quote when there is one.
+
+        :rtype:
+          The transaction object returned by execute_txn().
+        """
+        key = self._key(card, to, amount, denom)
+        quote = self._take(key)
+        if quote is not None:
+            data = self.api.execute_txn(card, quote.id, message)
+            if data.get('code') not in self.expired_codes:
+                with self._lock:
+                    self.hits += 1
+                return data
+            with self._lock:
+                self.expired += 1
+        with self._lock:
+            self.misses += 1
+        transaction = self._prepare(card, to, amount, denom)
+        return self.api.execute_txn(card, transaction, message)
+
+    def refresh(self):
+        """
+        Prepares the missing quotes and replaces those about to expire, the most urgent
+        first, as far as max_rate allows. The background thread calls it every interval.
+
+        :rtype:
+          The number of quotes prepared.
+        """
+        now = self._clock()
+        with self._lock:
+            due = [(quote.prepared_at if quote is not None else 0.0, key, quote)
+                   for key, quote in self._warm.items() if not self._usable(quote, now)]
+        prepared = 0
+        for prepared_at, key, quote in sorted(due, key=lambda item: item[0]):
+            if not self._reserve():
+                break
+            # The quote's life started before the request reached the API.
+            started = self._clock()
+            try:
+                fresh = _Quote(self._prepare(*key), started)
+            except Exception:
+                continue
+            prepared += 1
+            unwanted = fresh
+            with self._lock:
+                current = self._warm.get(key)
+                if key in self._warm and not self._usable(current, self._clock()):
+                    self._warm[key] = fresh
+                    unwanted = current
+            # Either the quote replaced, or the new one if the combination was dropped
+            # meanwhile.
+            self._cancel(key, unwanted)
+        return prepared
+
+    def start(self):
+        """
+        Refreshes the quotes in a background thread.
+        """
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        """
+        Stops refreshing and cancels every warm quote.
+        """
+        self.stop()
+        with self._lock:
+            warm = list(self._warm.items())
+            self._warm.clear()
+        for key, quote in warm:
+            self._cancel(key, quote)
+
+    def stats(self):
+        """
+        :rtype:
+          A hash of the quote hits and misses, the hit rate, and the seconds of
+          prepare_txn() saved by the hits, estimated from the measured prepare latency.
+        """
+        with self._lock:
+            sends = self.hits + self.misses
+            return {
+                'warm': len(self._warm),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / float(sends) if sends else None,
+                'prepared': self.prepared,
+                'cancelled': self.cancelled,
+                'expired': self.expired,
+                'prepare_latency': self.prepare_latency,
+                'saved_seconds': self.hits * (self.prepare_latency or 0.0),
+            }
+
+    """
+    HELPER FUNCTIONS
+    """
+    def _key(self, card, to, amount, denom):
+        # 25, '25.0' and Decimal('25.00') are the same transfer.
+        amount = '{:f}'.format(Decimal(str(amount)).normalize())
+        return card, to, amount, denom
+
+    def _usable(self, quote, now):
+        return quote is not None and now - quote.prepared_at < self.quote_ttl - self.refresh_margin
+
+    def _take(self, key):
+        """
+        Removes and returns the usable quote of a combination, counting the send toward
+        learn_after.
+        """
+        with self._lock:
+            learn = False
+            if key in self._warm:
+                self._warm.move_to_end(key)
+                quote, self._warm[key] = self._warm[key], None
+                if self._usable(quote, self._clock()):
+                    return quote
+                stale = quote
+            else:
+                stale = None
+                self._sends[key] = self._sends.get(key, 0) + 1
+                learn = self.learn_after and self._sends[key] >= self.learn_after
+        self._cancel(key, stale)
+        if learn:
+            with self._lock:
+                self._sends.pop(key, None)
+            self.warm(*key)
+        return None
+
+    def _reserve(self):
+        now = self._clock()
+        with self._lock:
+            if self.max_rate and now < self._next_prepare:
+                return False
+            if self.max_rate:
+                self._next_prepare = max(now, self._next_prepare) + 1.0 / self.max_rate
+            return True
+
+    def _prepare(self, card, to, amount, denom):
+        started = time.perf_counter()
+        transaction = self.api.prepare_txn(card, to, amount, denom)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.prepared += 1
+            if self.prepare_latency is None:
+                self.prepare_latency = elapsed
+            else:
+                self.prepare_latency += 0.1 * (elapsed - self.prepare_latency)
+        return transaction
+
+    def _cancel(self, key, quote):
+        if quote is None:
+            return
+        try:
+            self.api.cancel_txn(key[0], quote.id)
+        except Exception:
+            # An expired quote is gone anyway.
+            return
+        with self._lock:
+            self.cancelled += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.refresh()
@@ -0,0 +1,194 @@
+"""
+Uphold Python SDK - client-side rate limiting
+
+RateLimiter paces outgoing requests using the X-RateLimit-* headers returned by the
+API, so that a busy client stays just under its allowance instead of running into
+429 responses, and retries the requests that are rate limited anyway.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import hashlib
+import random
+import threading
+import time
+from collections import OrderedDict
+
+
+class RateLimiter(object):
+    """
+    A token bucket shared by every request made with the same credentials.
+
+    The bucket is sized from X-RateLimit-Limit and refills evenly over the rate limit
+    window. Whenever the API reports the budget as exhausted, requests wait until
+    X-RateLimit-Reset. Requests that still receive a 429 are retried up to max_retries
+    times, after the delay given by Retry-After or an exponential backoff with jitter.
+
+    Until the first response tells it the limit, the bucket does not hold requests back.
+    """
+
+    # Shared limiters, least recently used first.
+    _registry = OrderedDict()
+    _registry_lock = threading.Lock()
+    # Sets of credentials whose limiter is kept by for_credentials().
+    registry_size = 10000
+
+    def __init__(self, window=300.0, max_retries=3, backoff=1.0, max_backoff=60.0,
+                 clock=time.time, sleep=time.sleep):
+        """
+        :param Float window Length in seconds of the API's rate limit window.
+
+        :param Integer max_retries How many times a request answered with 429 is retried
+          before RateLimitError is raised.
+
+        :param Float backoff Base delay in seconds for retries without Retry-After.
+
+        :param Float max_backoff Upper bound for the retry delay.
+        """
+        self.window = window
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self.limit = None
+        self.tokens = 0.0
+        self.reset = None
+        self._refilled_at = clock()
+        self.waits = 0
+        self.retries = 0
+
+    @classmethod
+    def for_credentials(cls, *credentials, **kwargs):
+        """
+        Returns the limiter shared by every client using these credentials, creating
+        it with the given options the first time. Beyond registry_size sets of
+        credentials, the least recently used limiter is forgotten.
+        """
+        digest = hashlib.sha256('\0'.join(c or '' for c in credentials).encode('utf-8')).hexdigest()
+        with cls._registry_lock:
+            limiter = cls._registry.get(digest)
+            if limiter is None:
+                limiter = cls._registry[digest] = cls(**kwargs)
+                while len(cls._registry) > cls.registry_size:
+                    cls._registry.popitem(last=False)
+            else:
+                cls._registry.move_to_end(digest)
+            return limiter
+
+    def acquire(self):
+        """
+        Blocks until the budget allows one more request, then takes it.
+        """
+        while True:
+            delay = self.reserve()
+            if delay <= 0:
+                return
+            self.sleep(delay)
+
+    def reserve(self):
+        """
+        Takes a token if one is available.
+
+        :rtype:
+          0 when the request may go ahead, otherwise the number of seconds to wait
+          before asking again.
+        """
+        with self._lock:
+            if self.limit is None:
+                return 0
+            now = self._clock()
+            if self.reset is not None and self.tokens < 1:
+                if now < self.reset:
+                    self.waits += 1
+                    return self.reset - now
+                # The window has rolled over: the whole allowance is available again.
+                self.tokens = float(self.limit)
+                self.reset = None
+                self._refilled_at = now
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            self.waits += 1
+            return (1 - self.tokens) * self.window / self.limit
+
+    def update(self, headers):
+        """
+        Synchronises the bucket with the X-RateLimit-* headers of a response.
+        """
+        if 'X-RateLimit-Limit' not in headers:
+            return
+        try:
+            limit = int(headers['X-RateLimit-Limit'])
+            remaining = int(headers.get('X-RateLimit-Remaining', limit))
+            reset = self._parse_reset(headers.get('X-RateLimit-Reset'))
+        except ValueError:
+            return
+        with self._lock:
+            now = self._clock()
+            if self.limit is None:
+                self.tokens = float(remaining)
+                self._refilled_at = now
+            self.limit = limit
+            self._refill(now)
+            # The server's count is authoritative, it also sees our other clients.
+            self.tokens = min(self.tokens, float(remaining))
+            self.reset = reset if remaining <= 0 else None
+
+    def retry_delay(self, attempt, headers):
+        """
+        Returns how long to wait before retrying a request that got a 429.
+
+        :param Integer attempt The number of retries already made for this request.
+        """
+        with self._lock:
+            self.retries += 1
+        retry_after = self._parse_retry_after(headers.get('Retry-After'))
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.backoff)
+        cap = min(self.max_backoff, self.backoff * (2 ** attempt))
+        return cap / 2 + random.uniform(0, cap / 2)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'limit': self.limit,
+                'tokens': self.tokens,
+                'waits': self.waits,
+                'retries': self.retries,
+            }
+
+    """
+    HELPER FUNCTIONS
+    """
+    def _refill(self, now):
+        if self.limit:
+            elapsed = max(0.0, now - self._refilled_at)
+            self.tokens = min(float(self.limit), self.tokens + elapsed * self.limit / self.window)
+        self._refilled_at = now
+
+    def _parse_reset(self, value):
+        if value in (None, ''):
+            return None
+        reset = float(value)
+        # Epoch seconds, or a number of seconds from now for small values.
+        if reset < 1e9:
+            reset += self._clock()
+        return reset
+
+    def _parse_retry_after(self, value):
+        if value in (None, ''):
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        # An HTTP date, rare enough not to import email.utils up front.
+        from email.utils import parsedate_to_datetime
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, when.timestamp() - self._clock())
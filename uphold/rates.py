@@ -0,0 +1,185 @@
+"""
+Uphold Python SDK - local rate table
+
+RateTable turns the payload of get_ticker() into an index of parsed rates, so that
+amounts can be quoted locally, including cross rates that go through one or more
+intermediate currencies (GBP -> USD -> JPY, for instance).
+
+    table = RateTable(api.get_ticker())
+    table.convert(Decimal('100'), 'GBP', 'JPY')
+
+A table can follow a TickerCache, in which case it is reloaded whenever the cache
+fetches a new ticker table:
+
+    cache.subscribe(table.update)
+
+These rates do not include Uphold's commission; use them for previews, not as a
+substitute for the quote returned by prepare_txn.
+"""
+
+from __future__ import print_function, unicode_literals
+
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+
+PairRate = namedtuple('PairRate', ['pair', 'base', 'quote', 'bid', 'ask'])
+
+Conversion = namedtuple('Conversion', ['rate', 'path'])
+
+_ONE = Decimal(1)
+
+
+class UnknownConversion(Exception):
+    def __init__(self, value):
+        self.value = value
+    def __str__(self):
+        return repr(self.value)
+
+
+class RateTable(object):
+    """
+    An in-memory index of ticker rates and of the best conversion between every pair
+    of currencies.
+
+    Selling the base currency of a pair converts at its bid, buying it converts at
+    1/ask. For currencies without a direct pair, the best rate over paths of at most
+    max_hops conversions is used. All rates are computed when the table is (re)loaded,
+    so lookups and conversions are dictionary accesses.
+    """
+
+    def __init__(self, ticker=None, max_hops=2):
+        """
+        :param List ticker (optional) The payload of Uphold.get_ticker().
+
+        :param Integer max_hops The maximum number of conversions in a cross rate.
+        """
+        self.max_hops = max_hops
+        self._rates = {}
+        self._conversions = {}
+        if ticker is not None:
+            self.update(ticker)
+
+    @classmethod
+    def from_ticker(cls, ticker, max_hops=2):
+        return cls(ticker, max_hops)
+
+    def update(self, ticker):
+        """
+        Reloads the table in place from a new ticker payload. Readers keep seeing the
+        previous rates until the new ones are fully computed.
+
+        :param List ticker The payload of Uphold.get_ticker().
+        """
+        rates = {}
+        edges = {}
+        for row in ticker:
+            rate = self._parse(row)
+            if rate is None:
+                continue
+            rates[rate.pair] = rate
+            if rate.bid > 0:
+                self._add_edge(edges, rate.base, rate.quote, rate.bid)
+            if rate.ask > 0:
+                self._add_edge(edges, rate.quote, rate.base, _ONE / rate.ask)
+        conversions = dict((currency, self._best_paths(edges, currency)) for currency in edges)
+        self._rates, self._conversions = rates, conversions
+
+    @property
+    def currencies(self):
+        return sorted(self._conversions)
+
+    def pair(self, pair):
+        """
+        Returns the parsed ticker row for a currency pair, such as 'BTCUSD'.
+
+        :rtype:
+          A PairRate with Decimal bid and ask.
+        """
+        try:
+            return self._rates[pair]
+        except KeyError:
+            raise UnknownConversion(pair)
+
+    def conversion(self, from_currency, to_currency):
+        """
+        :rtype:
+          A Conversion holding the best rate and the list of currencies it goes through.
+        """
+        if from_currency == to_currency:
+            return Conversion(_ONE, [from_currency])
+        try:
+            return self._conversions[from_currency][to_currency]
+        except KeyError:
+            raise UnknownConversion(from_currency + to_currency)
+
+    def rate(self, from_currency, to_currency):
+        """
+        Returns how many units of to_currency one unit of from_currency buys.
+        """
+        return self.conversion(from_currency, to_currency).rate
+
+    def convert(self, amount, from_currency, to_currency):
+        """
+        Converts an amount at the best available rate.
+
+        :param Decimal/String amount The amount to convert.
+
+        :rtype:
+          A Decimal amount of to_currency.
+        """
+        return Decimal(amount) * self.rate(from_currency, to_currency)
+
+    def convert_many(self, amounts, from_currency, to_currency):
+        """
+        Converts a batch of amounts between the same two currencies. The rate is looked
+        up once for the whole batch.
+
+        :param Iterable amounts The amounts to convert.
+
+        :rtype:
+          A list of Decimal amounts of to_currency.
+        """
+        rate = self.rate(from_currency, to_currency)
+        return [Decimal(amount) * rate for amount in amounts]
+
+    """
+    HELPER FUNCTIONS
+    """
+    def _parse(self, row):
+        pair = row.get('pair')
+        quote = row.get('currency')
+        if not pair or not quote or not pair.endswith(quote) or pair == quote:
+            return None
+        try:
+            bid = Decimal(row.get('bid') or 0)
+            ask = Decimal(row.get('ask') or 0)
+        except InvalidOperation:
+            return None
+        return PairRate(pair, pair[:-len(quote)], quote, bid, ask)
+
+    def _add_edge(self, edges, source, target, rate):
+        targets = edges.setdefault(source, {})
+        if rate > targets.get(target, 0):
+            targets[target] = rate
+        edges.setdefault(target, {})
+
+    def _best_paths(self, edges, source):
+        # Hop-limited Bellman-Ford maximising the product of the rates along the path.
+        best = {source: Conversion(_ONE, [source])}
+        frontier = best
+        for hop in range(self.max_hops):
+            improved = {}
+            for currency, conversion in frontier.items():
+                for target, rate in edges[currency].items():
+                    if target in conversion.path:
+                        continue
+                    candidate = conversion.rate * rate
+                    current = improved.get(target) or best.get(target)
+                    if current is None or candidate > current.rate:
+                        improved[target] = Conversion(candidate, conversion.path + [target])
+            if not improved:
+                break
+            best.update(improved)
+            frontier = improved
+        del best[source]
+        return best
@@ -0,0 +1,257 @@
+"""
+Uphold Python SDK - multi-process reconciliation
+
+Reconciler runs a task against many accounts, one PAT each, spreading them over a pool
+of worker processes. Every process keeps one client, whose connection pool is shared
+by a few threads working on different accounts, while requests made with a PAT are
+paced by the rate limiter of that PAT. Decoding the JSON of thousands of accounts
+then uses every core instead of one.
+
+    reconciler = Reconciler(processes=8, threads=16, checkpoint='reconcile-2015-06.journal')
+    for result in reconciler.run(pats):
+        print(result.key, result.data, result.error)
+
+The task is a module level function taking a client and returning what should be
+reported for its account, account_summary() by default. Results come back as each
+chunk of accounts completes, so they can be processed while the others are running.
+With a checkpoint, the accounts completed by a previous run are not queried again and
+their recorded results are returned instead.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from .batch import TransferJournal
+from .uphold import Uphold
+
+# error is the repr() of the exception raised by the task, or None.
+ReconcileResult = namedtuple('ReconcileResult', ['key', 'data', 'error'])
+
+# total is None when the accounts were given as an iterator of unknown length.
+ReconcileProgress = namedtuple('ReconcileProgress', ['done', 'failed', 'skipped', 'total', 'elapsed', 'rate'])
+
+DONE = 'done'
+FAILED = 'failed'
+
+
+def account_summary(api):
+    """
+    The default reconciliation task: the number of cards and their total balance per
+    currency, with the number of transactions of the account and the date of the last.
+    """
+    balances = {}
+    cards = api.get_cards()
+    for card in cards:
+        balances[card['currency']] = balances.get(card['currency'], Decimal('0')) + Decimal(card['balance'])
+    transactions = 0
+    last_transaction_at = None
+    for transaction in api.iter_transactions():
+        transactions += 1
+        if transaction.get('createdAt', '') > (last_transaction_at or ''):
+            last_transaction_at = transaction['createdAt']
+    return {
+        'cards': len(cards),
+        'balances': dict((currency, str(total)) for currency, total in balances.items()),
+        'transactions': transactions,
+        'last_transaction_at': last_transaction_at,
+    }
+
+
+def pat_key(pat):
+    """
+    Identifies an account by a digest of its PAT, so that the PAT itself never ends up
+    in a checkpoint or a report.
+    """
+    return hashlib.sha256(pat.encode('utf-8')).hexdigest()[:16]
+
+
+class ReconcileCheckpoint(TransferJournal):
+    """
+    A journal of the completed accounts. The results of a chunk are written together,
+    with a single flush to disk.
+    """
+
+    def record_many(self, results):
+        lines = []
+        entries = []
+        for result in results:
+            state = FAILED if result.error else DONE
+            entry = {'key': result.key, 'state': state, 'data': result.data, 'error': result.error, 'at': time.time()}
+            lines.append(json.dumps(entry, sort_keys=True, default=str))
+            entries.append(entry)
+        with self._lock:
+            self._file.write(''.join(line + '\n' for line in lines))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            for entry in entries:
+                self._entries[entry['key']] = entry
+
+
+class Reconciler(object):
+    """
+    Runs a task for every account and streams back one ReconcileResult per account, in
+    completion order.
+    """
+
+    def __init__(self, task=account_summary, processes=None, threads=8, chunk_size=None, checkpoint=None,
+                 client_options=None, on_progress=None, mp_context=None):
+        """
+        :param Callable task Called with an Uphold client authenticated with the PAT of an
+          account. It must be defined at module level, so that worker processes can
+          import it, and return something that can be pickled (and, with a checkpoint,
+          encoded as JSON).
+
+        :param Integer processes Number of worker processes, the number of cores by
+          default. 0 runs everything in the calling process.
+
+        :param Integer threads Accounts processed at once by each worker process.
+
+        :param Integer chunk_size Accounts handed to a worker at a time, and the
+          granularity of results, progress and checkpoints. Defaults to threads.
+
+        :param String/ReconcileCheckpoint checkpoint (optional) Where completed accounts
+          are recorded, so that an interrupted run can be resumed.
+
+        :param Dict client_options (optional) Keyword arguments of the Uphold client of
+          each worker, such as sandbox or timeout. Rate limiting per PAT is on unless
+          rate_limiter is given.
+
+        :param Callable on_progress (optional) Called with a ReconcileProgress after each
+          chunk.
+
+        :param String mp_context (optional) The multiprocessing start method: 'fork',
+          'spawn' or 'forkserver'.
+        """
+        self.task = task
+        self.processes = multiprocessing.cpu_count() if processes is None else processes
+        self.threads = threads
+        self.chunk_size = chunk_size or threads
+        if checkpoint is not None and not isinstance(checkpoint, ReconcileCheckpoint):
+            checkpoint = ReconcileCheckpoint(checkpoint)
+        self.checkpoint = checkpoint
+        self.client_options = dict(client_options or {})
+        self.on_progress = on_progress
+        self.mp_context = mp_context
+
+    def run(self, pats):
+        """
+        :param Iterable pats The PATs of the accounts, or (key, pat) tuples to choose how
+          accounts are identified in results and checkpoints. Read lazily.
+
+        :rtype:
+          An iterator over ReconcileResult, one per account.
+        """
+        try:
+            total = len(pats)
+        except TypeError:
+            total = None
+        self._started = time.time()
+        self._counts = {'done': 0, 'failed': 0, 'skipped': 0}
+        resumed = []
+        chunks = self._chunks(pats, resumed)
+        if self.processes:
+            context = multiprocessing.get_context(self.mp_context)
+            pool = context.Pool(self.processes, _init_worker, (self.task, self.threads, self.client_options))
+            try:
+                for results in pool.imap_unordered(_run_chunk, chunks):
+                    for result in self._completed(results, resumed, total):
+                        yield result
+            finally:
+                pool.terminate()
+                pool.join()
+        else:
+            worker = _Worker(self.task, self.threads, self.client_options)
+            try:
+                for chunk in chunks:
+                    for result in self._completed(worker.run(chunk), resumed, total):
+                        yield result
+            finally:
+                worker.close()
+        # Accounts read after the last chunk was handed out.
+        for result in self._completed([], resumed, total):
+            yield result
+
+    """
+    HELPER FUNCTIONS
+    """
+    def _chunks(self, pats, resumed):
+        chunk = []
+        for item in pats:
+            key, pat = item if isinstance(item, tuple) else (pat_key(item), item)
+            entry = self.checkpoint.get(key) if self.checkpoint is not None else None
+            if entry is not None and entry['state'] == DONE:
+                resumed.append(ReconcileResult(key, entry.get('data'), None))
+                continue
+            chunk.append((key, pat))
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _completed(self, results, resumed, total):
+        # Pool.imap_unordered reads the accounts from another thread, list.pop is atomic.
+        while resumed:
+            self._counts['skipped'] += 1
+            yield resumed.pop(0)
+        results = [ReconcileResult(*result) for result in results]
+        if not results:
+            return
+        if self.checkpoint is not None:
+            self.checkpoint.record_many(results)
+        for result in results:
+            self._counts['failed' if result.error else 'done'] += 1
+            yield result
+        if self.on_progress is not None:
+            elapsed = time.time() - self._started
+            done = self._counts['done'] + self._counts['failed']
+            self.on_progress(ReconcileProgress(self._counts['done'], self._counts['failed'], self._counts['skipped'],
+                                               total, elapsed, done / elapsed if elapsed else 0.0))
+
+
+class _Worker(object):
+    """
+    The client and threads of one worker process.
+    """
+
+    def __init__(self, task, threads, client_options):
+        options = dict(client_options)
+        options.setdefault('rate_limiter', True)
+        options.setdefault('pool_maxsize', threads)
+        self.api = Uphold(**options)
+        self.task = task
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+
+    def run(self, chunk):
+        # Plain tuples travel back to the parent process, the smallest pickle.
+        return list(self.executor.map(self._reconcile, chunk))
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    def _reconcile(self, item):
+        key, pat = item
+        try:
+            return key, self.task(self.api.with_pat(pat)), None
+        except Exception as e:
+            return key, None, repr(e)
+
+
+_worker = None
+
+
+def _init_worker(task, threads, client_options):
+    global _worker
+    _worker = _Worker(task, threads, client_options)
+
+
+def _run_chunk(chunk):
+    return _worker.run(chunk)
@@ -0,0 +1,128 @@
+"""
+Uphold Python SDK - incremental JSON decoding
+
+The list endpoints return a single JSON array that can be very large. The helpers in
+this module decode such an array element by element as the bytes arrive, so only the
+element being parsed (plus one network chunk) is held in memory at any time.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import codecs
+import json
+
+_WHITESPACE = ' \t\n\r'
+
+_START, _FIRST, _VALUE, _AFTER_VALUE, _DONE, _SCALAR = range(6)
+
+
+class JSONArrayParser(object):
+    """
+    Incrementally parses a JSON array fed to it in chunks of bytes.
+
+    Each call to feed() returns the elements completed by that chunk. If the document
+    turns out not to be an array (an error payload, for instance) the whole value is
+    decoded once the input is exhausted and returned as the only element.
+    """
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._state = _START
+
+    def feed(self, data):
+        """
+        Feeds the next chunk of the response body to the parser.
+
+        :param Bytes data The next chunk of the body.
+
+        :rtype:
+          A list of the array elements completed by this chunk.
+        """
+        self._buffer += self._utf8.decode(data)
+        return self._parse(final=False)
+
+    def close(self):
+        """
+        Signals the end of the body.
+
+        :rtype:
+          A list of any remaining elements.
+        """
+        self._buffer += self._utf8.decode(b'', final=True)
+        items = self._parse(final=True)
+        if self._state == _SCALAR:
+            items.append(json.loads(self._buffer))
+            self._buffer = ''
+            self._state = _DONE
+        if self._state != _DONE:
+            raise ValueError('Truncated JSON array')
+        return items
+
+    def _skip_whitespace(self, pos):
+        buf = self._buffer
+        while pos < len(buf) and buf[pos] in _WHITESPACE:
+            pos += 1
+        return pos
+
+    def _parse(self, final):
+        items = []
+        buf = self._buffer
+        pos = 0
+        while self._state not in (_DONE, _SCALAR):
+            pos = self._skip_whitespace(pos)
+            if pos == len(buf):
+                break
+            char = buf[pos]
+            if self._state == _START:
+                if char != '[':
+                    self._state = _SCALAR
+                    break
+                self._state = _FIRST
+                pos += 1
+            elif self._state == _FIRST and char == ']':
+                self._state = _DONE
+                pos += 1
+            elif self._state == _AFTER_VALUE:
+                if char == ',':
+                    self._state = _VALUE
+                elif char == ']':
+                    self._state = _DONE
+                else:
+                    raise ValueError('Expecting , or ] at position {}'.format(pos))
+                pos += 1
+            else:
+                try:
+                    item, end = self._decoder.raw_decode(buf, pos)
+                except ValueError:
+                    if final:
+                        raise
+                    break
+                if end == len(buf) and not final:
+                    # A number at the very end of the buffer may continue in the
+                    # next chunk, so wait until we see what follows it.
+                    break
+                items.append(item)
+                self._state = _AFTER_VALUE
+                pos = end
+        if self._state != _SCALAR:
+            self._buffer = buf[pos:]
+        return items
+
+
+def iter_json_array(chunks):
+    """
+    Yields the elements of a JSON array read from an iterable of byte chunks.
+
+    :param Iterable chunks The body of the response, for instance response.iter_content().
+
+    :rtype:
+      An iterator over the array elements.
+    """
+    parser = JSONArrayParser()
+    for chunk in chunks:
+        for item in parser.feed(chunk):
+            yield item
+    for item in parser.close():
+        yield item
@@ -0,0 +1,358 @@
+"""
+Uphold Python SDK - local stand-in for the Uphold API
+
+MockUpholdServer answers the requests the SDK makes from synthetic or recorded payloads,
+on a local port, with optional latency and 429 responses. It is meant for tests and
+benchmarks that must not depend on the network.
+
+    with MockUpholdServer(ledger=100000, latency=0.005, throttle_every=50) as server:
+        api = server.client(rate_limiter=RateLimiter(backoff=0.01))
+        for entry in api.iter_reserve_ledger():
+            ...
+
+Payloads are keyed by endpoint template (see uphold.instrumentation.ENDPOINTS) and can
+be replaced through server.routes or loaded from a JSON file with server.load(path).
+List payloads honour the Range header the way the API does. Full responses carry an
+ETag, and requests with a matching If-None-Match get a 304. Single cards, contacts,
+Reservechain transactions and ticker pairs are looked up in the corresponding lists unless routes
+has a payload for them.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import hashlib
+import io
+import json
+import random
+import re
+import threading
+import time
+import uuid
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+from .instrumentation import endpoint_template
+
+CURRENCIES = ('USD', 'EUR', 'GBP', 'BTC', 'XAU')
+
+
+def synthetic_cards(count):
+    return [{
+        'id': '00000000-0000-4000-8000-{:012d}'.format(i),
+        'label': 'Card {}'.format(i),
+        'currency': CURRENCIES[i % len(CURRENCIES)],
+        'available': '{}.{:02d}'.format(i * 13 % 1000, i % 100),
+        'balance': '{}.{:02d}'.format(i * 13 % 1000, i % 100),
+        'lastTransactionAt': '2015-06-01T00:00:00.000Z',
+        'addresses': [],
+        'settings': {'position': i, 'starred': False},
+    } for i in range(count)]
+
+
+def synthetic_transactions(count):
+    transactions = []
+    for i in range(count):
+        currency = CURRENCIES[i % len(CURRENCIES)]
+        amount = '{}.{:02d}'.format(i % 500, i % 100)
+        transactions.append({
+            'id': '7c377eba-cb1e-45a2-8c13-{:012d}'.format(i),
+            'type': 'transfer',
+            'message': None,
+            'status': 'completed',
+            'RefundedById': None,
+            # Newest first, as the API lists them.
+            'createdAt': time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime(1433116800 - i * 60)),
+            'denomination': {'amount': amount, 'currency': currency, 'pair': currency + currency, 'rate': '1.00'},
+            'origin': {'CardId': '00000000-0000-4000-8000-000000000000', 'amount': amount, 'base': amount,
+                       'commission': '0.00', 'currency': currency, 'description': 'Sender', 'fee': '0.00',
+                       'rate': '1.00', 'type': 'card', 'username': 'sender'},
+            'destination': {'amount': amount, 'base': amount, 'commission': '0.00', 'currency': currency,
+                            'description': 'foo@bar.com', 'fee': '0.00', 'rate': '1.00', 'type': 'email'},
+            'params': {'currency': currency, 'margin': '0.00', 'pair': currency + currency, 'rate': '1.00',
+                       'ttl': 18000, 'type': 'internal'},
+        })
+    return transactions
+
+
+def synthetic_ledger(count):
+    return [{
+        'type': 'liability',
+        'TransactionId': '7c377eba-cb1e-45a2-8c13-{:012d}'.format(i),
+        'createdAt': time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime(1433116800 - i * 60)),
+        'in': {'amount': '{}.25'.format(i % 1000), 'currency': CURRENCIES[i % len(CURRENCIES)]},
+        'out': None,
+    } for i in range(count)]
+
+
+def synthetic_ticker(currencies=CURRENCIES):
+    rows = []
+    for i, base in enumerate(currencies):
+        for j, quote in enumerate(currencies):
+            if base != quote:
+                mid = (i + 1.0) / (j + 1.0)
+                rows.append({'pair': base + quote, 'currency': quote,
+                             'ask': '{:.8f}'.format(mid * 1.001), 'bid': '{:.8f}'.format(mid * 0.999)})
+    return rows
+
+
+class _Payload(object):
+    # Items are encoded once so that serving a page costs a join, not a dump.
+    def __init__(self, data):
+        self.data = data
+        if isinstance(data, list):
+            self.items = [json.dumps(item).encode('utf-8') for item in data]
+        else:
+            self.body = json.dumps(data).encode('utf-8')
+
+    def render(self, range_header):
+        if not isinstance(self.data, list):
+            return 200, {}, self.body
+        total = len(self.items)
+        match = re.match(r'items=(\d+)-(\d+)', range_header or '')
+        if not match:
+            return 200, {}, b'[' + b','.join(self.items) + b']'
+        start, end = int(match.group(1)), min(int(match.group(2)), total - 1)
+        if start >= total:
+            return 416, {'Content-Range': 'items */{}'.format(total)}, b'[]'
+        headers = {'Content-Range': 'items {}-{}/{}'.format(start, end, total)}
+        return 206, headers, b'[' + b','.join(self.items[start:end + 1]) + b']'
+
+
+class MockUpholdServer(object):
+    """
+    A threaded HTTP/1.1 server with keep-alive that mimics the Uphold API.
+    """
+
+    def __init__(self, cards=10, transactions=200, ledger=1000, reserve_transactions=1000, ticker=None,
+                 latency=0.0, throttle_every=0, throttle_rate=0.0, retry_after=0, rate_limit=300, seed=0,
+                 host='127.0.0.1', port=0):
+        """
+        :param Integer cards/transactions/ledger/reserve_transactions Sizes of the
+          synthetic payloads.
+
+        :param List ticker (optional) The ticker rows, synthetic_ticker() by default.
+
+        :param Float/Tuple/Callable latency Seconds added to every response, a (low, high)
+          range to draw them from, or a function returning them.
+
+        :param Integer throttle_every Answer every Nth request with a 429.
+
+        :param Float throttle_rate Answer this fraction of requests with a 429, at random.
+
+        :param Integer retry_after The Retry-After header of the 429 responses.
+
+        :param Integer rate_limit The X-RateLimit-Limit reported on every response.
+
+        :param Integer seed Seeds the latency and throttling draws, for replayable runs.
+        """
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.rate_limit = rate_limit
+        self.requests = {}
+        self.throttled = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._count = 0
+        self._payloads = {}
+        self._pending = {}
+        self.routes = {
+            '/me': {'username': 'mock', 'email': 'mock@example.com', 'firstName': 'Mock', 'lastName': 'User'},
+            '/me/cards': synthetic_cards(cards),
+            '/me/cards/{card}/transactions': synthetic_transactions(transactions),
+            '/me/transactions': synthetic_transactions(transactions),
+            '/me/contacts': [],
+            '/me/phones': [],
+            '/reserve/statistics': [],
+            '/reserve/ledger': synthetic_ledger(ledger),
+            '/reserve/transactions': synthetic_transactions(reserve_transactions),
+            '/ticker': ticker if ticker is not None else synthetic_ticker(),
+            '/vouchers': [],
+        }
+        server = self
+        class Handler(_Handler):
+            mock = server
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def load(self, path):
+        """
+        Replaces payloads with recorded ones from a JSON file mapping endpoint templates
+        to response bodies.
+        """
+        with io.open(path, 'r', encoding='utf-8') as f:
+            self.routes.update(json.load(f))
+        with self._lock:
+            self._payloads.clear()
+
+    def client(self, **kwargs):
+        """
+        Returns an Uphold client pointed at this server, authenticated with a dummy PAT.
+        """
+        from .uphold import Uphold
+        api = Uphold(base_url=self.url, **kwargs)
+        api.auth_pat('mock-token')
+        return api
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, kwargs={'poll_interval': 0.05})
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    """
+    HELPER FUNCTIONS
+    """
+    def _admit(self, endpoint):
+        with self._lock:
+            self._count += 1
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            throttle = (self.throttle_every and self._count % self.throttle_every == 0) or \
+                (self.throttle_rate and self._random.random() < self.throttle_rate)
+            if throttle:
+                self.throttled += 1
+            latency = self.latency
+            if isinstance(latency, tuple):
+                latency = self._random.uniform(*latency)
+            elif callable(latency):
+                latency = latency()
+            remaining = self.rate_limit - self._count % self.rate_limit
+        return bool(throttle), latency, remaining
+
+    def _payload(self, endpoint, path):
+        with self._lock:
+            if endpoint not in self.routes:
+                return self._lookup(endpoint, path)
+            payload = self._payloads.get(endpoint)
+            if payload is None or payload.data is not self.routes[endpoint]:
+                payload = self._payloads[endpoint] = _Payload(self.routes[endpoint])
+            return payload
+
+    def _lookup(self, endpoint, path):
+        key = path.rsplit('/', 1)[-1]
+        if endpoint == '/me/cards/{card}':
+            found = [card for card in self.routes.get('/me/cards', ()) if card.get('id') == key]
+        elif endpoint == '/me/contacts/{contact}':
+            found = [contact for contact in self.routes.get('/me/contacts', ()) if contact.get('id') == key]
+        elif endpoint == '/reserve/transactions/{transaction}':
+            found = [txn for txn in self.routes.get('/reserve/transactions', ()) if txn.get('id') == key]
+        elif endpoint == '/ticker/{pair}':
+            rows = self.routes.get('/ticker', ())
+            found = [row for row in rows if row.get('pair') == key]
+            if not found:
+                # A currency code lists every pair quoted in it.
+                found = [[row for row in rows if row.get('currency') == key]]
+        else:
+            return None
+        return _Payload(found[0]) if found else None
+
+    def _post(self, endpoint, path, fields):
+        if endpoint == '/me/cards/{card}/transactions':
+            transaction = dict(synthetic_transactions(1)[0], id=str(uuid.uuid4()), status='pending')
+            amount, currency = fields.get('denomination[amount]', ''), fields.get('denomination[currency]', '')
+            transaction['denomination'] = dict(transaction['denomination'], amount=amount, currency=currency)
+            # Same currency on both ends, no fees: the card is debited exactly the amount.
+            transaction['origin'] = dict(transaction['origin'], CardId=path.split('/')[-2], amount=amount,
+                                         base=amount, currency=currency)
+            transaction['destination'] = dict(transaction['destination'], amount=amount, base=amount,
+                                              currency=currency, description=fields.get('destination', ''))
+            with self._lock:
+                self._pending[transaction['id']] = transaction
+            return 200, transaction
+        if endpoint in ('/me/cards/{card}/transactions/{transaction}/commit',
+                        '/me/cards/{card}/transactions/{transaction}/cancel'):
+            id = path.split('/')[-2]
+            with self._lock:
+                transaction = self._pending.pop(id, None)
+            if transaction is None:
+                return 404, {'code': 'not_found'}
+            status = 'completed' if endpoint.endswith('commit') else 'cancelled'
+            return 200, dict(transaction, status=status, message=fields.get('message'))
+        if endpoint in self.routes:
+            return 200, self.routes[endpoint]
+        return 404, {'code': 'not_found'}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Send small responses in one write and large ones without Nagle's algorithm:
+    # otherwise, on a kept-alive connection, the body waits ~40ms for the client's
+    # delayed ACK of the headers.
+    wbufsize = -1
+    disable_nagle_algorithm = True
+    mock = None
+
+    def do_GET(self):
+        path, endpoint = self._route()
+        throttled, latency, remaining = self.mock._admit(endpoint)
+        if latency:
+            time.sleep(latency)
+        if throttled:
+            return self._send(429, {'Retry-After': str(self.mock.retry_after)}, b'{"code":"too_many_requests"}', remaining)
+        payload = self.mock._payload(endpoint, path)
+        if payload is None:
+            return self._send(404, {}, b'{"code":"not_found"}', remaining)
+        status, headers, body = payload.render(self.headers.get('Range'))
+        if status == 200:
+            headers = dict(headers, ETag='"{}"'.format(hashlib.sha1(body).hexdigest()[:16]))
+            if self.headers.get('If-None-Match') == headers['ETag']:
+                return self._send(304, headers, b'', remaining)
+        self._send(status, headers, body, remaining)
+
+    def do_POST(self):
+        path, endpoint = self._route()
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode('utf-8') if length else ''
+        throttled, latency, remaining = self.mock._admit(endpoint)
+        if latency:
+            time.sleep(latency)
+        if throttled:
+            return self._send(429, {'Retry-After': str(self.mock.retry_after)}, b'{"code":"too_many_requests"}', remaining)
+        if self.headers.get('Content-Type', '').startswith('application/json'):
+            fields = json.loads(body or '{}')
+        else:
+            fields = dict(parse_qsl(body))
+        status, data = self.mock._post(endpoint, path, fields)
+        self._send(status, {}, json.dumps(data).encode('utf-8'), remaining)
+
+    def _route(self):
+        path = self.path.split('?', 1)[0]
+        if path.startswith('/v0/'):
+            path = path[3:]
+        return path, endpoint_template(path)
+
+    def _send(self, status, headers, body, remaining):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('X-RateLimit-Limit', str(self.mock.rate_limit))
+        self.send_header('X-RateLimit-Remaining', str(remaining))
+        self.send_header('X-RateLimit-Reset', '300')
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
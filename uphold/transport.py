@@ -0,0 +1,313 @@
+"""
+Uphold Python SDK - HTTP transport
+
+A Transport owns the requests.Session and connection pool used by Uphold clients. One
+Transport can be handed to many clients (one per customer PAT, for instance) so that
+they all reuse the same warm keep-alive connections instead of each paying for new
+TCP and TLS handshakes.
+
+UrllibTransport is a lighter alternative for processes that only make a few calls,
+such as a serverless function checking a price: it is built on the standard library,
+so requests and urllib3 are never imported.
+
+    api = Uphold(transport=UrllibTransport())
+    api.get_ticker('BTCUSD')
+
+requests is only imported once a Transport is created.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import base64
+import contextvars
+import threading
+import time
+
+# Connect and read timeouts in seconds.
+DEFAULT_TIMEOUT = (10, 60)
+
+
+class ConnectionStats(object):
+    """
+    Counts requests sent and connections opened, from which connection reuse follows.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+
+    def request_sent(self):
+        with self._lock:
+            self.requests += 1
+
+    def connection_opened(self):
+        with self._lock:
+            self.new_connections += 1
+
+    @property
+    def reused_connections(self):
+        return max(0, self.requests - self.new_connections)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'new_connections': self.new_connections,
+                'reused_connections': max(0, self.requests - self.new_connections),
+            }
+
+
+# The connection timings of the request in progress, when instrumentation asked for them.
+_connection_timings = contextvars.ContextVar('uphold_connection_timings', default=None)
+
+
+def start_connection_timings():
+    """
+    Starts collecting the set-up times of connections opened by the current thread or
+    task, into the returned hash.
+    """
+    timings = {}
+    return timings, _connection_timings.set(timings)
+
+
+def stop_connection_timings(token):
+    _connection_timings.reset(token)
+
+
+def record_connection_timing(name, seconds):
+    timings = _connection_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+def _timed_connection(base, tls):
+    class TimedConnection(base):
+        def _new_conn(self):
+            # Resolves the host and opens the TCP connection.
+            started = time.perf_counter()
+            sock = base._new_conn(self)
+            self.connect_time = time.perf_counter() - started
+            record_connection_timing('connect', self.connect_time)
+            return sock
+
+        if tls:
+            def connect(self):
+                self.connect_time = 0.0
+                started = time.perf_counter()
+                base.connect(self)
+                record_connection_timing('tls', time.perf_counter() - started - self.connect_time)
+    return TimedConnection
+
+
+def _counting_pool(base, stats, tls):
+    class CountingConnectionPool(base):
+        ConnectionCls = _timed_connection(base.ConnectionCls, tls)
+
+        def _new_conn(self):
+            stats.connection_opened()
+            return base._new_conn(self)
+    return CountingConnectionPool
+
+
+def _counting_adapter():
+    from requests.adapters import HTTPAdapter
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    class CountingHTTPAdapter(HTTPAdapter):
+        """
+        An HTTPAdapter that records how many requests it sends and connections it opens,
+        and how long opening them takes.
+        """
+
+        def __init__(self, stats, **kwargs):
+            self.stats = stats
+            super(CountingHTTPAdapter, self).__init__(**kwargs)
+
+        def init_poolmanager(self, *args, **kwargs):
+            super(CountingHTTPAdapter, self).init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = {
+                'http': _counting_pool(HTTPConnectionPool, self.stats, False),
+                'https': _counting_pool(HTTPSConnectionPool, self.stats, True),
+            }
+
+        def send(self, request, **kwargs):
+            self.stats.request_sent()
+            return super(CountingHTTPAdapter, self).send(request, **kwargs)
+
+        def __getstate__(self):
+            state = super(CountingHTTPAdapter, self).__getstate__()
+            state['stats'] = ConnectionStats()
+            return state
+    return CountingHTTPAdapter
+
+
+_lazy = {}
+
+
+def __getattr__(name):
+    # The classes that need requests are only built when first used.
+    if name == 'CountingHTTPAdapter':
+        if name not in _lazy:
+            _lazy[name] = _counting_adapter()
+        return _lazy[name]
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+
+class Transport(object):
+    """
+    A pooled, keep-alive HTTP session that can be shared between Uphold clients.
+
+    requests speaks HTTP/1.1 only, so concurrency comes from the size of the pool.
+    Size pool_maxsize to the number of threads that share the transport, and set
+    pool_block so that extra threads wait for a free connection rather than opening
+    throwaway ones (urllib3's "connection pool is full" warning).
+    """
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, pool_block=False, max_retries=0,
+                 timeout=DEFAULT_TIMEOUT):
+        """
+        :param Integer pool_connections Number of hosts to keep connection pools for.
+
+        :param Integer pool_maxsize Maximum number of connections kept open per host.
+
+        :param Boolean pool_block Wait for a free connection when the pool is exhausted
+          instead of opening one that is discarded after use.
+
+        :param Integer max_retries How many times urllib3 retries failed connections.
+          Requests that reached the server are never retried.
+
+        :param Float/Tuple timeout Connect and read timeouts in seconds, as a number or a
+          (connect, read) tuple. None waits forever.
+        """
+        import requests
+        self.timeout = timeout
+        self.stats = ConnectionStats()
+        self.session = requests.Session()
+        adapter = __getattr__('CountingHTTPAdapter')(self.stats, pool_connections=pool_connections,
+                                                     pool_maxsize=pool_maxsize, pool_block=pool_block,
+                                                     max_retries=max_retries)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # Raised for failed certificate checks, and for connect or read timeouts.
+        self.SSLError = requests.exceptions.SSLError
+        self.Timeout = requests.exceptions.Timeout
+
+    def close(self):
+        """
+        Closes every pooled connection.
+        """
+        self.session.close()
+
+
+class UrllibTransport(object):
+    """
+    A transport built on http.client, opening one connection per request. It has no
+    pool to warm up and nothing to import beyond the standard library, which is what
+    a process making a single call needs; for anything busier, use Transport.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        """
+        :param Float/Tuple timeout Connect and read timeouts in seconds, as a number or a
+          (connect, read) tuple. None waits forever.
+        """
+        import socket
+        import ssl
+        self.timeout = timeout
+        self.stats = ConnectionStats()
+        self.session = _UrllibSession(self.stats)
+        self.SSLError = ssl.SSLError
+        self.Timeout = socket.timeout
+
+    def close(self):
+        pass
+
+
+class _UrllibSession(object):
+    """
+    The subset of requests.Session used by the Uphold client.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+        self._context = None
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def request(self, method, url, data=None, headers=None, auth=None, stream=False, timeout=None):
+        import http.client
+        from urllib.parse import urlencode, urlsplit
+        parts = urlsplit(url)
+        connect_timeout, read_timeout = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        if parts.scheme == 'https':
+            if self._context is None:
+                import ssl
+                self._context = ssl.create_default_context()
+            connection = http.client.HTTPSConnection(parts.netloc, timeout=connect_timeout, context=self._context)
+        else:
+            connection = http.client.HTTPConnection(parts.netloc, timeout=connect_timeout)
+        headers = dict(headers or {})
+        if auth is not None:
+            credentials = '{}:{}'.format(*auth).encode('utf-8')
+            headers['Authorization'] = 'Basic ' + base64.b64encode(credentials).decode('ascii')
+        body = None
+        if data:
+            body = urlencode(data, doseq=True).encode('utf-8')
+        headers['Connection'] = 'close'
+        self.stats.request_sent()
+        self.stats.connection_opened()
+        try:
+            started = time.perf_counter()
+            # Includes the TLS handshake, which http.client doesn't time separately.
+            connection.connect()
+            record_connection_timing('connect', time.perf_counter() - started)
+            connection.sock.settimeout(read_timeout)
+            connection.request(method, parts.path + ('?' + parts.query if parts.query else ''), body, headers)
+            response = connection.getresponse()
+        except Exception:
+            connection.close()
+            raise
+        return _UrllibResponse(connection, response, stream)
+
+
+class _UrllibResponse(object):
+    """
+    The subset of requests.Response used by the Uphold client.
+    """
+
+    def __init__(self, connection, response, stream):
+        self.status_code = response.status
+        # An email.message.Message: lookups ignore case, as with requests.
+        self.headers = response.headers
+        self._connection = connection
+        self._response = response
+        self._content = None
+        if not stream:
+            self._content = response.read()
+            self.close()
+
+    @property
+    def content(self):
+        if self._content is None:
+            self._content = self._response.read()
+            self.close()
+        return self._content
+
+    def iter_content(self, chunk_size=65536):
+        if self._content is not None:
+            yield self._content
+            return
+        while True:
+            chunk = self._response.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self):
+        self._response.close()
+        self._connection.close()
@@ -19,10 +19,16 @@ url = 'https://api.uphold.com/v1/reserve/transactions/a97bb994-6e24-4a89-b653-e0
 
 from __future__ import print_function, unicode_literals
 
-import urllib3
-import requests
-import json
-import ssl
+import copy
+import re
+import time
+from .cache import SingleFlight
+from .deadline import DeadlineExceeded, bind, cap_timeout, check, deadline as deadline_scope, time_left
+from .jsonlib import get_backend
+from .multiget import TERMINAL_STATUSES
+from .ratelimit import RateLimiter
+from .stream import iter_json_array
+from .transport import Transport, DEFAULT_TIMEOUT, start_connection_timings, stop_connection_timings
 from .version import __version__
 
 class VerificationRequired(Exception):
@@ -43,26 +49,105 @@ class NotSupportedInProduction(Exception):
     def __str__(self):
         return repr(self.value)
 
+class APIError(Exception):
+    def __init__(self, value):
+        self.value = value
+    def __str__(self):
+        return repr(self.value)
+
 class Uphold(object):
     """
     Use this SDK to simplify interaction with the Uphold API
     """
     
-    def __init__(self, sandbox=False):
+    def __init__(self, sandbox=False, ticker_cache=None, rate_limiter=None, transport=None,
+                 timeout=DEFAULT_TIMEOUT, pool_connections=10, pool_maxsize=10, pool_block=False,
+                 reserve_mirror=None, instrumentation=None, base_url=None, http_cache=None,
+                 json_backend=None, transaction_cache=None, hedge=None):
+        """
+        :param Boolean sandbox Talk to the Uphold sandbox rather than production.
+
+        :param TickerCache ticker_cache (optional) Serve get_ticker() from this cache. The
+          same cache can be shared by several clients.
+
+        :param RateLimiter/Boolean rate_limiter (optional) Pace requests to stay within the
+          API's rate limit and retry the ones that are rate limited. True shares one
+          limiter between every client using the same credentials.
+
+        :param Transport transport (optional) A connection pool shared with other clients.
+          When given, the timeout and pool options below are those of the transport.
+
+        :param Float/Tuple timeout Connect and read timeouts in seconds, as a number or a
+          (connect, read) tuple. None waits forever.
+
+        :param Integer pool_connections Number of hosts to keep connection pools for.
+
+        :param Integer pool_maxsize Maximum number of connections kept open per host.
+          Size it to the number of threads sharing the client.
+
+        :param Boolean pool_block Make threads wait for a free pooled connection rather
+          than open a connection that is thrown away after use.
+
+        :param ReserveMirror reserve_mirror (optional) Answer get_reserve_transaction() from
+          this local copy of the Reservechain when it holds the transaction in a final
+          status.
+
+        :param Instrumentation instrumentation (optional) Report every request to these
+          hooks, see uphold.instrumentation.
+
+        :param String base_url (optional) Send requests to this server instead, such as a
+          uphold.testing.MockUpholdServer.
+
+        :param HTTPCache http_cache (optional) Revalidate GET responses with their ETag or
+          Last-Modified instead of downloading them again, see uphold.httpcache.
+
+        :param String/JSONBackend json_backend (optional) Decode responses with this
+          library: 'orjson', 'ujson', 'json' or 'decimal'. Defaults to the fastest one
+          installed, see uphold.jsonlib.
+
+        :param TransactionCache transaction_cache (optional) Keep the Reservechain
+          transactions that reached a final status, and answer get_reserve_transaction()
+          from it, see uphold.multiget. The same cache can be shared by several clients.
+
+        :param HedgePolicy hedge (optional) Send a second copy of GET requests that are
+          slower than usual and use the first response, see uphold.hedge.
+        """
         if sandbox:
             self.host = 'api-sandbox.uphold.com'
         else:
             self.host = 'api.uphold.com'
+        self.base_url = base_url.rstrip('/') if base_url else 'https://' + self.host
         self.in_sandbox = sandbox
         self.debug   = False
         self.version = 0
-        self.session = requests.Session()
+        if transport is None:
+            transport = self._create_transport(timeout=timeout, pool_connections=pool_connections,
+                                               pool_maxsize=pool_maxsize, pool_block=pool_block)
+        self.transport = transport
+        self.session = transport.session if transport is not None else None
         self.headers = {
             'Content-type': 'application/x-www-form-urlencoded',
             'User-Agent': 'uphold-python-sdk/' + __version__
             }
+        self.username = None
+        self.password = None
         self.pat = None
         self.otp = None
+        # The rate limit headers of the last response, "" until one arrives.
+        self.limit = self.remaining = self.reset = ""
+        self.ticker_cache = ticker_cache
+        self.rate_limiter = rate_limiter
+        self.reserve_mirror = reserve_mirror
+        self.instrumentation = instrumentation
+        self.http_cache = http_cache
+        self.json_backend = get_backend(json_backend)
+        self.transaction_cache = transaction_cache
+        self.hedge = hedge
+        # Shared with the clients made by with_pat(): requests are keyed by credentials.
+        self.single_flight = SingleFlight()
+
+    def _create_transport(self, **options):
+        return Transport(**options)
 
     def _debug(self, s):
         if self.debug:
@@ -97,6 +182,24 @@ class Uphold(object):
         self.password = None
         self.pat = pat
 
+    def with_pat(self, pat):
+        """
+        Returns a client that authenticates with the given PAT and shares everything else
+        (connection pool, caches, options) with this one. This is cheap enough to do for
+        every call, so a single client can serve many users:
+
+            api.with_pat(customer_pat).get_cards()
+
+        :param String pat The personal access token
+
+        :rtype:
+          An Uphold client
+        """
+        client = copy.copy(self)
+        client.headers = dict(self.headers)
+        client.auth_pat(pat)
+        return client
+
     def create_pat(self, desc):
         """
         Creates a personal access token.
@@ -109,8 +212,7 @@ class Uphold(object):
         params = {
             'description': desc
         }
-        self.headers['Content-Type'] = 'application/json'
-        data = self._post('/me/tokens', params)
+        data = self._post('/me/tokens', params, headers={'Content-Type': 'application/json'})
         return data.get('accessToken')
 
     def get_pats(self):
@@ -120,8 +222,7 @@ class Uphold(object):
         :rtype:
           A list of personal access tokens
         """
-        self.headers['Content-Type'] = 'application/json'
-        data = self._get('/me/tokens')
+        data = self._get('/me/tokens', headers={'Content-Type': 'application/json'})
         return data
 
     def get_me(self):
@@ -145,12 +246,27 @@ class Uphold(object):
 
     def get_contact(self, contact):
         """
-        Returns the contact associated with the contact id.
+        Returns the contact associated with the contact id. Concurrent requests for the
+        same contact are sent only once.
 
         :rtype:
           An hash containing the contact requested.
         """
-        return self._get('/me/contacts/{}'.format(contact))
+        return self._get_coalesced('/me/contacts/{}'.format(contact))
+
+    def get_contacts_many(self, contacts, max_workers=8):
+        """
+        Returns several contacts, requesting them concurrently. Each id is requested
+        once, however many times it is listed.
+
+        :param Iterable contacts The contact ids.
+
+        :param Integer max_workers The maximum number of requests in flight.
+
+        :rtype:
+          A hash of the contacts by id, in the order of the ids.
+        """
+        return self._get_many(self.get_contact, contacts, max_workers)
 
     def create_contact(self, first_name, last_name, company, emails=[], bitcoin_addresses=[]):
         fields = {
@@ -180,7 +296,17 @@ class Uphold(object):
         :rtype:
           An array of hashes containing all the cards of the current user.
         """
-        return self._get('/me/cards/' + c)
+        return self._get_coalesced('/me/cards/' + c)
+
+    def get_cards_many(self, cards, max_workers=8):
+        """
+        Returns several cards of the current user, requesting them concurrently, see
+        get_contacts_many.
+
+        :rtype:
+          A hash of the cards by id, in the order of the ids.
+        """
+        return self._get_many(self.get_card, cards, max_workers)
 
     def get_card_transactions(self, card):
         """
@@ -191,6 +317,72 @@ class Uphold(object):
         """
         return self._get('/me/cards/{}/transactions'.format(card))
 
+    def iter_card_transactions(self, card, page_size=50, prefetch=False, start=0):
+        """
+        Iterates over the transactions associated with a specific card, fetching them
+        one page at a time.
+
+        :param String card The card ID.
+
+        :param Integer page_size The number of transactions requested per page.
+
+        :param Boolean/Integer prefetch Request the next page, or this many pages, while the
+          current one is consumed.
+
+        :param Integer start Index of the first transaction returned, to carry on an earlier
+          walk.
+
+        :rtype:
+          An iterator over the card transactions.
+        """
+        return self._iter_pages('/me/cards/{}/transactions'.format(card), page_size, prefetch, start)
+
+    def get_portfolio_snapshot(self, max_workers=8, deadline=None, details=True):
+        """
+        Fetches all of the current user's cards and then, concurrently, the details and
+        transactions of each card.
+
+        :param Integer max_workers The maximum number of requests in flight. It is also
+          capped by the remaining rate limit budget, when known.
+
+        :param Float deadline (optional) Seconds after which the snapshot is returned with
+          whatever has arrived. Requests still pending are abandoned and reported as
+          DeadlineExceeded. A shorter deadline() around the call applies as well.
+
+        :param Boolean details Also fetch each card with get_card(). Otherwise the entries
+          returned by get_cards() are used.
+
+        :rtype:
+          A hash with the list of cards, each holding 'card', 'transactions' and the
+          'errors' raised by its requests, and whether the snapshot is 'complete'.
+        """
+        from concurrent.futures import ThreadPoolExecutor, wait
+        with deadline_scope(deadline):
+            cards = self.get_cards()
+            calls = {}
+            # The requests sent from the pool share the budget, and give up when it ends.
+            get_card, get_card_transactions = bind(self.get_card), bind(self.get_card_transactions)
+            executor = ThreadPoolExecutor(max_workers=self._fan_out(max_workers))
+            try:
+                for card in cards:
+                    if details:
+                        calls[executor.submit(get_card, card['id'])] = (card['id'], 'card')
+                    calls[executor.submit(get_card_transactions, card['id'])] = (card['id'], 'transactions')
+                left = time_left()
+                done, not_done = wait(calls, timeout=None if left is None else max(0, left))
+            finally:
+                executor.shutdown(wait=False)
+
+        results = {}
+        for future, call in calls.items():
+            if future in done:
+                error = future.exception()
+                results[call] = (None if error else future.result(), error)
+            else:
+                future.cancel()
+                results[call] = (None, DeadlineExceeded(call[1]))
+        return self._assemble_snapshot(cards, results)
+
     def get_phones(self):
         """
         Returns all of the phone numbers associated with the current user.
@@ -203,44 +395,128 @@ class Uphold(object):
     def get_reserve_statistics(self):
         return self._get('/reserve/statistics')
 
-    def get_reserve_ledger(self):
+    def get_reserve_ledger(self, stream=False):
         """
         Returns all the rows belowing to the ledger. Each row documents a change in
         the reserve's assets or its liabilities.
 
+        :param Boolean stream Decode the response incrementally and return an iterator
+          over its elements instead of a list.
+
         :rtype:
           An array of ledger entries.
         """
+        if stream:
+            return self._get_stream('/reserve/ledger')
         return self._get('/reserve/ledger')
 
-    def get_reserve_chain(self):
+    def iter_reserve_ledger(self, page_size=50, prefetch=False, start=0):
+        """
+        Iterates over the rows of the ledger, fetching them one page at a time.
+
+        :param Integer page_size The number of rows requested per page.
+
+        :param Boolean/Integer prefetch Request the next page, or this many pages, while the
+          current one is consumed.
+
+        :param Integer start Index of the first row returned, to carry on an earlier
+          walk.
+
+        :rtype:
+          An iterator over ledger entries.
+        """
+        return self._iter_pages('/reserve/ledger', page_size, prefetch, start)
+
+    def get_reserve_chain(self, stream=False):
         """
         Returns the entire Reservechain consisting of all of the transactions conducted
         by its members. These transactions are 100% anonymous.
 
+        :param Boolean stream Decode the response incrementally and return an iterator
+          over its elements instead of a list.
+
         :rtype:
           An array of transactions.
         """
+        if stream:
+            return self._get_stream('/reserve/transactions')
         return self._get('/reserve/transactions')
 
+    def iter_reserve_chain(self, page_size=50, prefetch=False, start=0):
+        """
+        Iterates over the Reservechain, fetching its transactions one page at a time.
+
+        :param Integer page_size The number of transactions requested per page.
+
+        :param Boolean/Integer prefetch Request the next page, or this many pages, while the
+          current one is consumed.
+
+        :param Integer start Index of the first transaction returned, to carry on an earlier
+          walk.
+
+        :rtype:
+          An iterator over transactions.
+        """
+        return self._iter_pages('/reserve/transactions', page_size, prefetch, start)
+
     def get_reserve_transaction(self, transaction):
         """
         Returns a public transaction from the Reservechain. These transactions are 100% anonymous.
+        When the client has a reserve_mirror holding the transaction, or a transaction_cache
+        holding it completed, no request is made. Concurrent requests for the same
+        transaction are sent only once.
 
         :rtype:
           An array with the transaction.
         """
-        return self._get('/reserve/transactions/{}'.format(transaction))
+        data = self._stored_reserve_transaction(transaction)
+        if data is not None:
+            return data
+        return self._request_reserve_transaction(transaction)
+
+    def get_reserve_transactions_many(self, transactions, max_workers=8):
+        """
+        Returns several transactions from the Reservechain, requesting the ones not held
+        locally concurrently, see get_contacts_many.
 
-    def get_transactions(self):
+        :rtype:
+          A hash of the transactions by id, in the order of the ids.
+        """
+        return self._get_many(self._request_reserve_transaction, transactions, max_workers,
+                              self._stored_reserve_transaction)
+
+    def get_transactions(self, stream=False):
         """
         Requests a list of transactions associated with the current user.
 
+        :param Boolean stream Decode the response incrementally and return an iterator
+          over its elements instead of a list.
+
         :rtype:
           An array of hashes containing all the current user's transactions.
         """
+        if stream:
+            return self._get_stream('/me/transactions')
         return self._get('/me/transactions')
 
+    def iter_transactions(self, page_size=50, prefetch=False, start=0):
+        """
+        Iterates over the transactions associated with the current user, fetching them
+        one page at a time.
+
+        :param Integer page_size The number of transactions requested per page.
+
+        :param Boolean/Integer prefetch Request the next page, or this many pages, while the
+          current one is consumed.
+
+        :param Integer start Index of the first transaction returned, to carry on an earlier
+          walk.
+
+        :rtype:
+          An iterator over the current user's transactions.
+        """
+        return self._iter_pages('/me/transactions', page_size, prefetch, start)
+
     def prepare_txn(self, card, to, amount, denom):
         """
         Developers can optionally prepare a transaction in order to preview a transaction
@@ -320,13 +596,18 @@ class Uphold(object):
         """
         Returns current market rates used by the Uphold platform when conducting
         exchanges. These rates do not include the commission Uphold applies to
-        exchanges.
+        exchanges. When the client was given a ticker_cache, rates are served from it.
 
         :param String ticker (optional) A specific currency to retrieve quotes for.
 
         :rtype:
           An array of market rates indexed by currency.
         """
+        if self.ticker_cache is not None:
+            return self.ticker_cache.get(t, self._get_ticker)
+        return self._get_ticker(t)
+
+    def _get_ticker(self, t):
         if t:
             uri = '/ticker/' + t
         else:
@@ -393,82 +674,432 @@ class Uphold(object):
         else:
             self.limit = self.remaining = self.reset = ""
         
-    def _post(self, uri, params):
+    def _check_response(self, status, headers):
         """
+        Raises the SDK exceptions for responses that need the caller's attention.
         """
-        url = 'https://' + self.host + self._build_url(uri)
-
-        try:
-            if self.pat:
-                self._debug("Using PAT")
-                response = self.session.post(url, data=params, headers=self.headers, auth=(self.pat, 'X-OAuth-Basic'))
-            elif self.username:
-                self._debug("Using Basic Auth")
-                self.session.auth = ( self.username, self.password )
-                if self.otp:
-                    self._debug("Using verification code: " + self.otp)
-                    self.headers['X-Bitreserve-OTP'] = self.otp
-                self._debug(self.headers)
-                response = self.session.post(url, data=params, headers=self.headers)
-            else:
-                response = self.session.post(url, data=params, headers=self.headers)
+        if 'X-Bitreserve-OTP' in headers:
+            self._debug("OTP Required!")
+            raise VerificationRequired("OTP Required")
+        elif status == 429:
+            self._debug("Rate Limit Error!")
+            raise RateLimitError(headers)
+
+    def _post(self, uri, params, headers=None):
+        """
+        """
+        return self._request('POST', uri, params, headers)
 
-            self._update_rate_limit( response.headers )
+    def _get(self, uri, headers=None):
+        """
+        """
+        return self._request('GET', uri, headers=headers)
 
-            if 'X-Bitreserve-OTP' in response.headers:
-                self._debug("OTP Required!")
-                raise VerificationRequired("OTP Required")
-            elif response.status_code == 429:
-                self._debug("Rate Limit Error!")
-                raise RateLimitError(response.headers)
+    def _parse_content_range(self, header):
+        """
+        Parses a Content-Range header of the form "items 0-49/1234" into the
+        (first, last, total) tuple. total is None when the server sends "*".
+        """
+        match = re.match(r'items\s+(\d+)-(\d+)/(\d+|\*)', header or '')
+        if not match:
+            return None
+        first, last, total = match.groups()
+        return int(first), int(last), None if total == '*' else int(total)
 
-        except requests.exceptions.SSLError as e:
-            # Handle incorrect certificate error.
-            self._debug("Failed certificate check: " + str(e))
-            exit()
+    def _get_page(self, uri, start, end):
+        """
+        Requests the items start..end (inclusive) of a list endpoint.
 
-        data = json.loads(response.text)
-        if 'X-Bitreserve-OTP' in self.headers:
-            del self.headers['X-Bitreserve-OTP']
+        :rtype:
+          A tuple of the list of items and the (first, last, total) range the server
+          returned, see _parse_content_range. The range is None when the endpoint did
+          not paginate the response.
+        """
+        response = self._send('GET', uri, headers={'Range': 'items={}-{}'.format(start, end)})
+        if response.status_code == 416:
+            # Requested range starts past the last item.
+            return [], None
+        data = self._page_items(uri, response.status_code, response.content)
+        return data, self._parse_content_range(response.headers.get('Content-Range'))
+
+    def _page_items(self, uri, status, body):
+        """
+        Decodes the body of a page, raising APIError with the status and decoded body
+        when it is an error rather than a list of items.
+        """
+        try:
+            data = self.json_backend.loads(body)
+        except ValueError:
+            data = body
+        if not 200 <= status < 300 or not isinstance(data, list):
+            raise APIError({'uri': uri, 'status': status, 'body': data})
         return data
 
-    def _get(self, uri):
-        """
+    def _next_page(self, page, page_size):
         """
-        url = 'https://' + self.host + self._build_url(uri)
+        Works out where the page after this one starts from the range the server
+        actually returned, which may be shorter than the one requested.
 
-        # You're ready to make verified HTTPS requests.
+        :rtype:
+          A tuple of the index of the first item of the next page, or None after the
+          last page, and the page size to request from then on.
+        """
+        items, content_range = page
+        if not items or content_range is None:
+            return None, page_size
+        first, last, total = content_range
+        returned = last - first + 1
+        if total is None:
+            # Without a total, a short page is the last one.
+            return (last + 1 if returned >= page_size else None), page_size
+        if last + 1 >= total:
+            return None, page_size
+        # The server caps the page size: ask for no more than it returns.
+        return last + 1, min(page_size, returned)
+
+    def _iter_pages(self, uri, page_size=50, prefetch=False, start=0):
+        """
+        Walks a list endpoint page by page using Range headers, yielding one item at
+        a time, from the item at index start. When prefetch is set the next page (or
+        the next prefetch pages, given a number) is requested in the background while
+        the current one is consumed. Nothing more is fetched once the caller stops
+        iterating.
+        """
+        ahead = int(prefetch)
+        if ahead:
+            from collections import deque
+            from concurrent.futures import ThreadPoolExecutor
+            # (first item, future) of the pages requested ahead, in order.
+            pending = deque()
+        executor = ThreadPoolExecutor(max_workers=ahead) if ahead else None
         try:
-            if self.pat:
-                self._debug("Using PAT")
-                response = self.session.get(url, headers=self.headers, auth=(self.pat, 'X-OAuth-Basic'))
-            elif self.username:
-                self._debug("Using Basic Auth")
-                self.session.auth = ( self.username, self.password )
-                if self.otp:
-                    self._debug("Using verification code: " + self.otp)
-                    self.headers['X-Bitreserve-OTP'] = self.otp
-                self._debug(self.headers)
-                response = self.session.get(url, headers=self.headers)
-            else:
-                response = self.session.get(url, headers=self.headers)
-
-            self._update_rate_limit( response.headers )
+            page = self._get_page(uri, start, start + page_size - 1)
+            while True:
+                start, page_size = self._next_page(page, page_size)
+                if start is not None and executor is not None:
+                    if pending and pending[0][0] != start:
+                        # Requested before the server turned out to return shorter pages.
+                        for first, future in pending:
+                            future.cancel()
+                        pending.clear()
+                    requested = pending[-1][0] + page_size if pending else start
+                    total = page[1][2]
+                    while len(pending) < ahead and (total is None or requested < total):
+                        pending.append((requested, executor.submit(bind(self._get_page), uri, requested,
+                                                                   requested + page_size - 1)))
+                        requested += page_size
+                for item in page[0]:
+                    yield item
+                if start is None:
+                    return
+                if executor is not None and pending:
+                    page = pending.popleft()[1].result()
+                else:
+                    page = self._get_page(uri, start, start + page_size - 1)
+        finally:
+            if executor is not None:
+                for first, future in pending:
+                    future.cancel()
+                executor.shutdown(wait=False)
+
+    def _get_stream(self, uri, chunk_size=65536):
+        """
+        Requests a list endpoint and yields its elements as they are decoded from the
+        body, without ever holding the whole body in memory.
+        """
+        response = self._send('GET', uri, stream=True)
+        try:
+            for item in iter_json_array(response.iter_content(chunk_size)):
+                yield item
+        finally:
+            response.close()
 
-            if 'X-Bitreserve-OTP' in response.headers:
-                self._debug("OTP Required!")
-                raise VerificationRequired("OTP Required")
-            elif response.status_code == 429:
-                self._debug("Rate Limit Error!")
-                raise RateLimitError(response.headers)
+    def _request(self, method, uri, params=None, headers=None):
+        """
+        Issues an authenticated request against the API and returns the decoded body.
+        """
+        if self.http_cache is not None:
+            return self._cached_request(method, uri, params, headers)
+        response = self._send(method, uri, params, headers)
+        return self.json_backend.loads(response.content)
 
-        except requests.exceptions.SSLError as e:
-            # Handle incorrect certificate error.
-            self._debug("Failed certificate check: " + str(e))
-            exit()
+    def _cached_request(self, method, uri, params=None, headers=None):
+        """
+        Issues a request through the HTTP cache: GETs are conditional and answered from
+        the cache on 304, writes invalidate what they touch.
+        """
+        cache = self.http_cache
+        scope = self._cache_scope()
+        if cache.is_write(method, uri):
+            try:
+                response = self._send(method, uri, params, headers)
+            finally:
+                cache.invalidate(scope, uri)
+            return self.json_backend.loads(response.content)
+        entry = cache.lookup(scope, uri)
+        if entry is not None:
+            headers = dict(headers or {}, **entry.validators())
+        response = self._send(method, uri, params, headers)
+        if response.status_code == 304 and entry is not None:
+            return cache.revalidated(entry, self.json_backend.loads)
+        return cache.save(scope, uri, response.status_code, response.headers, response.content,
+                          self.json_backend.loads)
+
+    def _get_coalesced(self, uri):
+        """
+        A GET request shared with the identical ones in flight from other threads.
+        """
+        key = (self.base_url, self.pat, self.username, self.password, uri)
+        return self.single_flight.call(key, self._get, uri)
+
+    def _get_many(self, get, ids, max_workers, stored=None):
+        results = dict((id, None) for id in ids)
+        missing = []
+        for id in results:
+            data = stored(id) if stored is not None else None
+            if data is None:
+                missing.append(id)
+            else:
+                results[id] = data
+        if len(missing) <= 1:
+            for id in missing:
+                results[id] = get(id)
+            return results
+        from concurrent.futures import ThreadPoolExecutor
+        executor = ThreadPoolExecutor(max_workers=min(len(missing), self._fan_out(max_workers)))
+        try:
+            for id, data in zip(missing, executor.map(bind(get), missing)):
+                results[id] = data
+        finally:
+            executor.shutdown(wait=False)
+        return results
 
-        data = json.loads(response.text)
-        if 'X-Bitreserve-OTP' in self.headers:
-            del self.headers['X-Bitreserve-OTP']
+    def _request_reserve_transaction(self, transaction):
+        """
+        Requests a Reservechain transaction without looking in the mirror or cache first.
+        """
+        data = self._get_coalesced('/reserve/transactions/{}'.format(transaction))
+        self._store_reserve_transaction(transaction, data)
         return data
 
+    def _stored_reserve_transaction(self, transaction):
+        if self.reserve_mirror is not None:
+            data = self.reserve_mirror.transaction(transaction)
+            # A transaction still in progress is fetched again, and the mirror updated.
+            if data is not None and data.get('status') in TERMINAL_STATUSES:
+                return data
+        if self.transaction_cache is not None:
+            return self.transaction_cache.get(transaction)
+        return None
+
+    def _store_reserve_transaction(self, transaction, data):
+        if data.get('id') != transaction:
+            return
+        if self.reserve_mirror is not None:
+            self.reserve_mirror.store_transaction(data)
+        if self.transaction_cache is not None:
+            self.transaction_cache.put(data)
+
+    def _cache_scope(self):
+        return self.http_cache.scope(self.base_url, self.pat, self.username, self.password)
+
+    def _send(self, method, uri, params=None, headers=None, stream=False):
+        """
+        Issues an authenticated request against the API and returns the response. GETs
+        are hedged when the client has a hedge policy.
+        """
+        if self.hedge is not None and method == 'GET' and not stream:
+            return self._send_hedged(uri, headers)
+        return self._send_once(method, uri, params, headers, stream)
+
+    def _send_hedged(self, uri, headers=None):
+        """
+        Sends a GET, and a second copy of it when the first is slower than the hedge
+        policy allows. The first successful response wins, the other one is closed.
+        """
+        from concurrent.futures import FIRST_COMPLETED, wait
+        from .instrumentation import endpoint_template
+        policy = self.hedge
+        endpoint = endpoint_template(uri)
+        delay = policy.delay(endpoint)
+        left = check(uri)
+        if delay is None or (left is not None and delay >= left):
+            # No hedge could be sent: don't bother with the thread pool.
+            return self._send_timed(policy, endpoint, uri, headers)
+
+        send = bind(self._send_timed)
+        calls = [policy.executor.submit(send, policy, endpoint, uri, headers)]
+        done, pending = wait(calls, timeout=delay)
+        if not done and policy.allow(self.remaining):
+            calls.append(policy.executor.submit(send, policy, endpoint, uri, headers))
+        winner = error = None
+        pending = list(calls)
+        while pending and winner is None:
+            left = time_left()
+            done, not_done = wait(pending, timeout=None if left is None else max(0, left),
+                                  return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                pending.remove(future)
+                if future.exception() is None:
+                    winner = winner or future
+                else:
+                    error = error or future.exception()
+        for future in calls:
+            if future is not winner:
+                future.add_done_callback(_close_response)
+        if winner is not None:
+            if winner is not calls[0]:
+                policy.won()
+            return winner.result()
+        if error is not None:
+            raise error
+        raise DeadlineExceeded(uri)
+
+    def _send_timed(self, policy, endpoint, uri, headers):
+        started = time.perf_counter()
+        response = self._send_once('GET', uri, headers=headers)
+        policy.record(endpoint, time.perf_counter() - started)
+        return response
+
+    def _send_once(self, method, uri, params=None, headers=None, stream=False):
+        """
+        Sends a request, retrying it when it is rate limited, within the time left by
+        the current deadline, if any.
+        """
+        url = self.base_url + self._build_url(uri)
+        send = getattr(self.session, method.lower())
+
+        request_headers = self._request_headers(headers)
+        auth = self._auth()
+        limiter = self._get_rate_limiter()
+        attempt = 0
+
+        while True:
+            if limiter is not None:
+                limiter.acquire()
+            left = check(uri)
+
+            # You're ready to make verified HTTPS requests.
+            try:
+                response = self._transmit(send, method, uri, url, attempt, data=params, headers=request_headers,
+                                          auth=auth, stream=stream, timeout=cap_timeout(self.transport.timeout, left))
+                self._update_rate_limit( response.headers )
+
+            except self.transport.SSLError as e:
+                # Handle incorrect certificate error.
+                self._debug("Failed certificate check: " + str(e))
+                exit()
+
+            except self.transport.Timeout:
+                # The timeout was cut to the budget, and the connection is dropped.
+                if left is not None and time_left() < 0.01:
+                    raise DeadlineExceeded(uri)
+                raise
+
+            if limiter is not None:
+                limiter.update(response.headers)
+                delay = None
+                if response.status_code == 429 and attempt < limiter.max_retries:
+                    delay = limiter.retry_delay(attempt, response.headers)
+                    left = time_left()
+                    if left is not None and delay >= left:
+                        # No time left to retry: the caller gets the RateLimitError.
+                        delay = None
+                if delay is not None:
+                    self._debug("Rate limited, retrying in {:.1f}s".format(delay))
+                    response.close()
+                    limiter.sleep(delay)
+                    attempt += 1
+                    continue
+
+            self._check_response( response.status_code, response.headers )
+            return response
+
+    def _transmit(self, send, method, uri, url, attempt, **kwargs):
+        """
+        Sends one HTTP request, reporting it to the instrumentation hooks if any.
+        """
+        instrumentation = self.instrumentation
+        if instrumentation is None:
+            return send(url, **kwargs)
+        info = instrumentation.request_started(method, uri, url, attempt)
+        timings, token = start_connection_timings()
+        try:
+            response = send(url, **kwargs)
+        except Exception as e:
+            stop_connection_timings(token)
+            instrumentation.request_finished(info, error=e, timings=timings)
+            raise
+        stop_connection_timings(token)
+        if kwargs.get('stream'):
+            size = response.headers.get('Content-Length')
+            size = int(size) if size and size.isdigit() else None
+        else:
+            size = len(response.content)
+        instrumentation.request_finished(info, status=response.status_code, headers=response.headers, bytes=size,
+                                         timings=timings)
+        return response
+
+    def _fan_out(self, max_workers):
+        # Don't start more requests at once than the rate limit has room for.
+        try:
+            remaining = int(self.remaining)
+        except (AttributeError, TypeError, ValueError):
+            return max_workers
+        return max(1, min(max_workers, remaining))
+
+    def _assemble_snapshot(self, cards, results):
+        snapshot = {'cards': [], 'complete': True}
+        for card in cards:
+            entry = {'id': card['id'], 'card': card, 'transactions': None, 'errors': {}}
+            for kind in ('card', 'transactions'):
+                if (card['id'], kind) not in results:
+                    continue
+                value, error = results[(card['id'], kind)]
+                if error is not None:
+                    entry['errors'][kind] = error
+                    snapshot['complete'] = False
+                else:
+                    entry[kind] = value
+            snapshot['cards'].append(entry)
+        return snapshot
+
+    def _get_rate_limiter(self):
+        if self.rate_limiter is True:
+            return RateLimiter.for_credentials(self.host, self.pat or self.username)
+        return self.rate_limiter or None
+
+    def _auth(self):
+        if self.pat:
+            self._debug("Using PAT")
+            return (self.pat, 'X-OAuth-Basic')
+        elif self.username:
+            self._debug("Using Basic Auth")
+            return (self.username, self.password)
+        return None
+
+    def _request_headers(self, headers=None):
+        """
+        Builds the headers of a single request. Nothing is stored on the client, so one
+        client can be used by many threads at once.
+        """
+        request_headers = dict(self.headers)
+        if headers:
+            # Header names are case insensitive: 'Content-Type' replaces 'Content-type'.
+            names = set(name.lower() for name in headers)
+            request_headers = dict((name, value) for name, value in request_headers.items()
+                                   if name.lower() not in names)
+            request_headers.update(headers)
+        if self.username and not self.pat and self.otp:
+            self._debug("Using verification code: " + self.otp)
+            request_headers['X-Bitreserve-OTP'] = self.otp
+        self._debug(request_headers)
+        return request_headers
+
+
+def _close_response(future):
+    # The losing copy of a hedged request: release its connection as soon as it ends.
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
@@ -0,0 +1,422 @@
+"""
+Uphold Python SDK - transaction watcher
+
+TransactionWatcher reports new transactions, and status changes of recent ones, on any
+number of cards without re-downloading their history. Each poll only reads the newest
+page of a card's transactions, and stops as soon as it reaches transactions it has
+already seen. Cards with activity are polled every min_interval seconds; idle ones back
+off towards max_interval. One scheduler thread drives every card within max_rate polls
+per second.
+
+    watcher = TransactionWatcher(api, cards=card_ids, on_event=handle)
+    watcher.start()
+    for event in watcher.events():
+        print(event.type, event.card, event.transaction['id'], event.transaction['status'])
+
+When Uphold can push notifications, serve_webhooks() starts a local receiver whose
+deliveries feed the same event stream; polling then only acts as a safety net.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import asyncio
+import hashlib
+import heapq
+import hmac
+import json
+import queue
+import random
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .multiget import TERMINAL_STATUSES
+
+# type is 'new' or 'status'; previous_status is set for status changes.
+TransactionEvent = namedtuple('TransactionEvent', ['type', 'card', 'transaction', 'previous_status', 'source'])
+
+_STOP = object()
+
+
+class _CardState(object):
+    def __init__(self, card, interval):
+        self.card = card
+        self.interval = interval
+        self.newest = None
+        self.known = {}
+        self.primed = False
+        self.pushed = False
+
+
+class TransactionWatcher(object):
+    """
+    Watches cards for new transactions and status changes.
+    """
+
+    def __init__(self, api, cards=(), on_event=None, page_size=10, min_interval=2.0, max_interval=60.0,
+                 backoff=1.5, max_rate=5.0, max_workers=4, emit_existing=False, clock=time.time):
+        """
+        :param Uphold api The client used to poll (not an AsyncUphold).
+
+        :param Iterable cards The ids of the cards to watch.
+
+        :param Callable on_event (optional) Called with each TransactionEvent.
+
+        :param Integer page_size Transactions requested per poll. A poll reads further
+          pages only when a whole page is new.
+
+        :param Float min_interval Seconds between polls of a card with recent activity.
+
+        :param Float max_interval Seconds between polls of an idle card.
+
+        :param Float backoff Factor applied to a card's interval after a quiet poll.
+
+        :param Float max_rate Maximum polls per second across all cards, so that the
+          watcher stays within the rate limit it shares with the rest of the application.
+
+        :param Integer max_workers Maximum number of polls in flight.
+
+        :param Boolean emit_existing Report the transactions found by the first poll of a
+          card as new, instead of taking them as the starting point.
+        """
+        self.api = api
+        self.page_size = page_size
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_rate = max_rate
+        self.max_workers = max_workers
+        self.emit_existing = emit_existing
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._cards = {}
+        self._schedule = []
+        self._sequence = 0
+        self._callbacks = [on_event] if on_event is not None else []
+        self._subscribers = []
+        self._thread = None
+        self._executor = None
+        self._running = False
+        self.errors = 0
+        for card in cards:
+            self.add_card(card)
+
+    def add_card(self, card):
+        with self._lock:
+            if card not in self._cards:
+                self._cards[card] = _CardState(card, self.min_interval)
+                self._push_schedule(self._clock(), card)
+                self._wakeup.notify()
+
+    def remove_card(self, card):
+        with self._lock:
+            self._cards.pop(card, None)
+
+    def on_event(self, callback):
+        self._callbacks.append(callback)
+        return callback
+
+    def start(self):
+        """
+        Starts polling in a background thread.
+        """
+        with self._lock:
+            if self._running:
+                return self
+            self._running = True
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops polling and ends the event iterators.
+        """
+        with self._lock:
+            self._running = False
+            self._wakeup.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        for subscriber in list(self._subscribers):
+            subscriber(_STOP)
+
+    def events(self):
+        """
+        Iterates over the events from now on, until stop() is called.
+        """
+        events = queue.Queue()
+        self._subscribers.append(events.put)
+        return self._drain(events)
+
+    async def aevents(self):
+        """
+        The asynchronous flavour of events(), for use with "async for".
+        """
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+
+        def put(event):
+            loop.call_soon_threadsafe(events.put_nowait, event)
+        self._subscribers.append(put)
+        try:
+            while True:
+                event = await events.get()
+                if event is _STOP:
+                    return
+                yield event
+        finally:
+            self._subscribers.remove(put)
+
+    def poll(self, card):
+        """
+        Polls one card now.
+
+        :rtype:
+          The list of events found, which have also been emitted.
+        """
+        with self._lock:
+            state = self._cards.get(card)
+        if state is None:
+            return []
+        transactions = []
+        entries = self.api.iter_card_transactions(card, page_size=self.page_size)
+        try:
+            for transaction in entries:
+                transactions.append(transaction)
+                created_at = transaction.get('createdAt') or ''
+                # Past the first page, stop at the first transaction already seen. The
+                # first poll of a card only reads one page.
+                if len(transactions) >= self.page_size and (not state.newest or created_at <= state.newest):
+                    break
+        finally:
+            close = getattr(entries, 'close', None)
+            if close is not None:
+                close()
+        return self._apply(state, transactions, 'poll')
+
+    def ingest(self, card, transaction):
+        """
+        Feeds a transaction obtained elsewhere, such as from a webhook, into the watcher.
+        It is reported unless polling already did, and vice versa.
+        """
+        with self._lock:
+            state = self._cards.get(card)
+            if state is None:
+                state = self._cards[card] = _CardState(card, self.min_interval)
+                state.primed = True
+            state.pushed = True
+        return self._apply(state, [transaction], 'webhook', partial=True)
+
+    def serve_webhooks(self, host='127.0.0.1', port=0, path='/', secret=None,
+                       signature_header='X-Signature'):
+        """
+        Starts a local HTTP receiver for push notifications, see WebhookReceiver. Cards
+        that receive notifications are then polled at max_interval only.
+        """
+        return WebhookReceiver(self, host, port, path, secret, signature_header).start()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'cards': len(self._cards),
+                'active': sum(1 for s in self._cards.values() if s.interval <= self.min_interval),
+                'errors': self.errors,
+            }
+
+    """
+    HELPER FUNCTIONS
+    """
+    def _drain(self, events):
+        try:
+            while True:
+                event = events.get()
+                if event is _STOP:
+                    return
+                yield event
+        finally:
+            self._subscribers.remove(events.put)
+
+    def _apply(self, state, transactions, source, partial=False):
+        events = []
+        with self._lock:
+            newest = state.newest
+            for transaction in transactions:
+                id = transaction.get('id')
+                status = transaction.get('status')
+                created_at = transaction.get('createdAt') or ''
+                if id in state.known:
+                    if status and status != state.known[id]:
+                        events.append(TransactionEvent('status', state.card, transaction, state.known[id], source))
+                elif not newest or created_at >= newest:
+                    # A pushed transaction is news even before the first poll of its card.
+                    if state.primed or self.emit_existing or partial:
+                        events.append(TransactionEvent('new', state.card, transaction, None, source))
+                else:
+                    # Older than anything seen before: it was there all along.
+                    continue
+                state.known[id] = status
+                if created_at > (state.newest or ''):
+                    state.newest = created_at
+            if not partial:
+                state.primed = True
+                # Only transactions still on the newest page can change under our eyes.
+                seen = set(t.get('id') for t in transactions)
+                state.known = dict((id, status) for id, status in state.known.items()
+                                   if id in seen or status not in TERMINAL_STATUSES)
+            if events:
+                state.interval = self.min_interval
+            elif not partial:
+                state.interval = min(self.max_interval, state.interval * self.backoff)
+        for event in events:
+            self._emit(event)
+        return events
+
+    def _emit(self, event):
+        for callback in list(self._callbacks):
+            callback(event)
+        for subscriber in list(self._subscribers):
+            subscriber(event)
+
+    def _push_schedule(self, when, card):
+        self._sequence += 1
+        heapq.heappush(self._schedule, (when, self._sequence, card))
+
+    def _next_interval(self, state):
+        interval = self.max_interval if state.pushed else state.interval
+        # Spread the polls so that cards added together don't stay in lockstep.
+        return interval * random.uniform(0.9, 1.1)
+
+    def _run(self):
+        last_dispatch = 0.0
+        in_flight = threading.Semaphore(self.max_workers)
+        while True:
+            with self._lock:
+                while self._running:
+                    if self._schedule:
+                        now = self._clock()
+                        wait = self._schedule[0][0] - now
+                        if self.max_rate:
+                            wait = max(wait, last_dispatch + 1.0 / self.max_rate - now)
+                        if wait <= 0:
+                            break
+                    else:
+                        wait = None
+                    self._wakeup.wait(wait)
+                if not self._running:
+                    return
+                when, sequence, card = heapq.heappop(self._schedule)
+                if card not in self._cards:
+                    continue
+            in_flight.acquire()
+            last_dispatch = self._clock()
+            self._executor.submit(self._poll_and_reschedule, card, in_flight)
+
+    def _poll_and_reschedule(self, card, in_flight):
+        try:
+            self.poll(card)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+        finally:
+            in_flight.release()
+            with self._lock:
+                state = self._cards.get(card)
+                if state is not None:
+                    self._push_schedule(self._clock() + self._next_interval(state), card)
+                    self._wakeup.notify()
+
+
+class WebhookReceiver(object):
+    """
+    A local HTTP endpoint receiving transaction notifications as JSON POSTs and feeding
+    them to a TransactionWatcher. The body is a transaction, optionally wrapped as
+    {"card": ..., "transaction": {...}}; without a card, the destination card and then
+    the origin card are used.
+
+    With a secret, deliveries must carry the hex HMAC-SHA256 of their body in the
+    signature header, and others are refused.
+    """
+
+    def __init__(self, watcher, host='127.0.0.1', port=0, path='/', secret=None, signature_header='X-Signature'):
+        self.watcher = watcher
+        self.path = path
+        self.secret = secret.encode('utf-8') if isinstance(secret, str) else secret
+        self.signature_header = signature_header
+        receiver = self
+
+        class Handler(_WebhookHandler):
+            pass
+        Handler.receiver = receiver
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return 'http://{}:{}{}'.format(host, port, self.path)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, kwargs={'poll_interval': 0.1})
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def deliver(self, body, signature=None):
+        """
+        Handles one delivery.
+
+        :rtype:
+          The HTTP status to answer with.
+        """
+        if self.secret is not None:
+            expected = hmac.new(self.secret, body, hashlib.sha256).hexdigest()
+            if not signature or not hmac.compare_digest(expected, signature):
+                return 401
+        try:
+            payload = json.loads(body.decode('utf-8'))
+        except ValueError:
+            return 400
+        transaction = payload.get('transaction', payload) if isinstance(payload, dict) else None
+        if not isinstance(transaction, dict) or 'id' not in transaction:
+            return 400
+        card = payload.get('card') or (transaction.get('destination') or {}).get('CardId') or \
+            (transaction.get('origin') or {}).get('CardId')
+        if not card:
+            return 400
+        self.watcher.ingest(card, transaction)
+        return 204
+
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    receiver = None
+
+    def do_POST(self):
+        if self.path.split('?', 1)[0] != self.receiver.path:
+            return self._answer(404)
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self._answer(self.receiver.deliver(body, self.headers.get(self.receiver.signature_header)))
+
+    def _answer(self, status):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass